@@ -13,6 +13,9 @@ import glob
 import traceback
 import urllib.request
 import re
+import time
+import uuid
+import threading
 
 print("[DEBUG] Loading builder.py module...")
 
@@ -30,12 +33,50 @@ torch = None  # Will be lazy-loaded if needed
 
 router = APIRouter(prefix="/api/builder", tags=["Builder"])
 
-from aikore.config import INSTANCES_DIR
+from aikore.config import INSTANCES_DIR, CACHE_DIR
+from aikore.core.build_queue import BuildQueue, BuildJob
+from aikore.core import build_resources
+from aikore.core.compiler_cache import CompilerCache
+from aikore.core.git_mirror import GitMirrorStore
+from aikore.core.builder_envs import BuilderEnvRegistry
+from aikore.core.priority import low_priority_prefix, lower_current_thread_priority
+from aikore.core.disk_usage import disk_index
+from aikore.core.cache_manager import package_cache_env
 
 # --- CONFIGURATION ---
 WHEELS_DIR = os.path.join(INSTANCES_DIR, ".wheels")
 MANIFEST_FILE = os.path.join(WHEELS_DIR, "manifest.json")
 
+# Build jobs: one workspace per job, persisted logs and job registry
+BUILD_TMP_DIR = os.path.join(WHEELS_DIR, "build_tmp")
+BUILD_LOGS_DIR = os.path.join(WHEELS_DIR, "build_logs")
+BUILD_JOBS_FILE = os.path.join(WHEELS_DIR, "build_jobs.json")
+# Peak memory observed per preset, used to refine the parallelism of later builds
+BUILD_STATS_FILE = os.path.join(WHEELS_DIR, "build_stats.json")
+# Upper bound of the builds a single matrix request may queue
+MATRIX_MAX_JOBS = 32
+try:
+    BUILDER_MAX_CONCURRENT = max(1, int(os.environ.get("AIKORE_BUILDER_MAX_CONCURRENT", "1")))
+except ValueError:
+    BUILDER_MAX_CONCURRENT = 1
+
+# Persistent compiler cache: 'auto' (ccache, then sccache), 'ccache', 'sccache' or 'off'
+COMPILER_CACHE_MODE = os.environ.get("AIKORE_BUILDER_COMPILER_CACHE", "auto").lower()
+COMPILER_CACHE_MAXSIZE = os.environ.get("AIKORE_BUILDER_COMPILER_CACHE_SIZE", "20G")
+
+# Bare mirrors of the preset git sources, updated incrementally before each build
+GIT_MIRRORS_DIR = os.path.join(CACHE_DIR, "git-mirrors")
+
+# Registry of builder envs (versions + toolchain), validated by the env fingerprint
+BUILDER_ENVS_FILE = os.path.join(WHEELS_DIR, "builder_envs.json")
+# Build tools every builder env must provide
+BUILDER_TOOLCHAIN = ["cmake", "scikit-build-core"]
+# Warm pool: builder env specs provisioned in the background at idle priority, and never
+# removed by the stale env cleanup. Read from AIKORE_BUILDER_WARM_ENVS
+# ("3.12/cu130/2.10.0,3.11/cu128/2.7.1") and from a JSON list of
+# {"python_ver", "cuda_ver", "torch_ver"} objects in builder_warm_envs.json.
+BUILDER_WARM_ENVS_FILE = os.path.join(WHEELS_DIR, "builder_warm_envs.json")
+
 # Environment management
 CONDA_EXE = os.environ.get("CONDA_EXE", shutil.which("conda") or "/home/abc/miniconda3/bin/conda")
 CONDA_BASE_DIR = os.environ.get("CONDA_BASE_DIR", "/home/abc/miniconda3")
@@ -50,13 +91,17 @@ os.makedirs(WHEELS_DIR, exist_ok=True)
 # automatically from that index. Hardcoded maps were always stale on new releases.
 
 # --- PRESETS DEFINITION ---
+# Sources are cloned into ./source_code by the builder (through the git mirror cache)
+# before cmd_template runs; "submodules": True also fetches submodules recursively.
+# mem_per_job_mb: initial estimate of the RAM taken by one parallel compile job.
+# It only seeds the parallelism planner; observed peaks replace it over time.
 PRESETS = {
     "sageattention": {
         "label": "SageAttention (FlashAttention Alternative)",
         "git_url": "https://github.com/thu-ml/SageAttention.git",
         "description": "Optimized attention mechanism. Requires CUDA.",
+        "mem_per_job_mb": 4096,
         "cmd_template": (
-            "git clone {git_url} source_code && "
             "cd source_code && "
             "export FORCE_CUDA=1 && "
             "export TORCH_CUDA_ARCH_LIST='{arch}' && "
@@ -69,10 +114,9 @@ PRESETS = {
         "label": "FlashAttention-2 (Dao-AILab)",
         "git_url": "https://github.com/Dao-AILab/flash-attention.git",
         "description": "Fast and memory-efficient exact attention.",
+        "mem_per_job_mb": 8192,
         "cmd_template": (
-            "git clone {git_url} source_code && "
             "cd source_code && "
-            "export MAX_JOBS=2 && "
             "export TORCH_CUDA_ARCH_LIST='{arch}' && "
             "{python} -m pip wheel --no-build-isolation . -w {output_dir} && "
             "cd .. && "
@@ -83,8 +127,8 @@ PRESETS = {
         "label": "BitsAndBytes (Quantization)",
         "git_url": "https://github.com/TimDettmers/bitsandbytes.git",
         "description": "8-bit optimizers and matrix multiplication.",
+        "mem_per_job_mb": 2048,
         "cmd_template": (
-            "git clone {git_url} source_code && "
             "cd source_code && "
             "export TORCH_CUDA_ARCH_LIST='{arch}' && "
             "{python} -m pip wheel --no-build-isolation . -w {output_dir} && "
@@ -96,8 +140,9 @@ PRESETS = {
         "label": "Diso (Gaussian Splatting Utility)",
         "git_url": "https://github.com/SarahWeiii/diso",
         "description": "Utility for Trellis / 3D Gaussian Splatting.",
+        "mem_per_job_mb": 2048,
+        "submodules": True,
         "cmd_template": (
-            "git clone {git_url} source_code --recurse-submodules && "
             "cd source_code && "
             "export TORCH_CUDA_ARCH_LIST='{arch}' && "
             "{python} -m pip wheel --no-build-isolation . -w {output_dir} && "
@@ -109,8 +154,8 @@ PRESETS = {
         "label": "Nvdiffrast (NVIDIA Differentiable Rasterization)",
         "git_url": "https://github.com/NVlabs/nvdiffrast.git",
         "description": "High-performance differentiable rendering.",
+        "mem_per_job_mb": 2048,
         "cmd_template": (
-            "git clone {git_url} source_code && "
             "cd source_code && "
             "export TORCH_CUDA_ARCH_LIST='{arch}' && "
             "{python} -m pip wheel --no-build-isolation . -w {output_dir} && "
@@ -122,11 +167,10 @@ PRESETS = {
         "label": "XFormers (Memory-efficient Attention)",
         "git_url": "https://github.com/facebookresearch/xformers.git",
         "description": "Hackable and optimized Transformers building blocks.",
+        "mem_per_job_mb": 6144,
+        "submodules": True,
         "cmd_template": (
-            "git clone {git_url} source_code && "
             "cd source_code && "
-            "git submodule update --init --recursive && "
-            "export MAX_JOBS=1 && "
             "export TORCH_CUDA_ARCH_LIST='{arch}' && "
             "{python} -m pip wheel --no-build-isolation . -w {output_dir} && "
             "cd .. && "
@@ -137,8 +181,8 @@ PRESETS = {
         "label": "Kaolin (NVIDIA 3D Deep Learning) - 5090 Fork",
         "git_url": "https://github.com/HarrisonPrism/kaolin_5090.git",
         "description": "A PyTorch Library for Accelerating 3D Deep Learning Research.",
+        "mem_per_job_mb": 3072,
         "cmd_template": (
-            "git clone {git_url} source_code && "
             "cd source_code && "
             "export IGNORE_TORCH_VER=1 && "
             "export TORCH_CUDA_ARCH_LIST='{arch}' && "
@@ -151,8 +195,9 @@ PRESETS = {
         "label": "Diff-Gaussian-Rasterization (Mip-Splatting)",
         "git_url": "https://github.com/autonomousvision/mip-splatting",
         "description": "Rasterization engine for 3D Gaussian Splatting.",
+        "mem_per_job_mb": 2048,
+        "submodules": True,
         "cmd_template": (
-            "git clone {git_url} source_code --recurse-submodules && "
             "cd source_code/submodules/diff-gaussian-rasterization && "
             "export TORCH_CUDA_ARCH_LIST='{arch}' && "
             "{python} -m pip wheel --no-build-isolation . -w {output_dir} && "
@@ -164,8 +209,9 @@ PRESETS = {
         "label": "Vox2Seq (TRELLIS Extension)",
         "git_url": "https://github.com/microsoft/TRELLIS",
         "description": "Voxel to Sequence extension for TRELLIS 3D generation.",
+        "mem_per_job_mb": 2048,
+        "submodules": True,
         "cmd_template": (
-            "git clone {git_url} source_code --recurse-submodules && "
             "cd source_code/extensions/vox2seq && "
             "export TORCH_CUDA_ARCH_LIST='{arch}' && "
             "{python} -m pip wheel --no-build-isolation . -w {output_dir} && "
@@ -177,11 +223,12 @@ PRESETS = {
         "label": "Open3D (CUDA & PyTorch Ops)",
         "git_url": "https://github.com/isl-org/Open3D.git",
         "description": "3D data processing library. Compiled with CUDA and PyTorch ops (Headless). Very heavy build.",
+        "mem_per_job_mb": 3072,
+        "submodules": True,
         "cmd_template": (
-            "git clone {git_url} source_code --recurse-submodules && "
             "cd source_code && "
             "mkdir build && cd build && "
-            "export ARCH_NUM=$(echo {arch} | tr -d '.') && "
+            "export ARCH_NUM=$(echo '{arch}' | tr -d '.' | tr ' ' ';') && "
             "export PT_ABI=$({python} -c \"import torch; print('ON' if torch._C._GLIBCXX_USE_CXX11_ABI else 'OFF')\") && "
             "cmake -DCMAKE_BUILD_TYPE=Release "
             "-DCMAKE_PREFIX_PATH=$CONDA_PREFIX "
@@ -193,9 +240,9 @@ PRESETS = {
             "-DENABLE_HEADLESS_RENDERING=ON "
             "-DGLIBCXX_USE_CXX11_ABI=${{PT_ABI}} "
             "-DPython3_EXECUTABLE=$(which python) "
-            "-DCMAKE_CUDA_ARCHITECTURES=${{ARCH_NUM}} "
+            "-DCMAKE_CUDA_ARCHITECTURES=\"${{ARCH_NUM}}\" "
             ".. && "
-            "make -j4 pip-package && "
+            "make -j${{CMAKE_BUILD_PARALLEL_LEVEL}} pip-package && "
             "cp lib/python_package/pip_package/*.whl {output_dir}/ && "
             "cd ../../ && "
             "rm -rf source_code"
@@ -205,6 +252,7 @@ PRESETS = {
         "label": "Custom Git Repository",
         "git_url": "", 
         "description": "Build a wheel from any Git repo containing setup.py or pyproject.toml.",
+        "mem_per_job_mb": 3072,
         "cmd_template": (
             "export TORCH_CUDA_ARCH_LIST='{arch}' && "
             "{python} -m pip wheel {git_url} --wheel-dir={output_dir} --no-deps --no-build-isolation"
@@ -214,9 +262,21 @@ PRESETS = {
 
 class BuildRequest(BaseModel):
     preset: str
+    arch: str
     git_url: Optional[str] = None
-    cuda_arch: str
-    force_rebuild: bool = False
+    python_ver: str = "3.12"
+    cuda_ver: str = "cu130"
+    torch_ver: str = "2.5.1"
+
+class MatrixBuildRequest(BaseModel):
+    preset: str
+    archs: List[str]
+    torch_vers: List[str]
+    python_vers: List[str] = ["3.12"]
+    cuda_ver: str = "cu130"
+    git_url: Optional[str] = None
+    # One wheel per (python, torch) covering every arch, instead of one wheel per arch
+    fat_wheel: bool = False
 
 class WheelMetadata(BaseModel):
     filename: str
@@ -236,6 +296,12 @@ _manifest_lock = asyncio.Lock()
 # --- PYTHON VERSION CACHE LOCK ---
 _cache_lock = asyncio.Lock()
 
+builder_envs = BuilderEnvRegistry(BUILDER_ENVS_FILE)
+
+# --- BUILDER ENVIRONMENT LOCKS ---
+# Concurrent jobs targeting the same Conda env must not create/install into it at the same time.
+_env_locks = {}
+
 # --- BUILDER ENVIRONMENT CLEANUP ---
 # Environnements Conda inutilisés depuis plus de X jours sont automatiquement supprimés
 _BUILDER_ENV_MAX_AGE_DAYS = 7
@@ -246,6 +312,15 @@ def _get_conda_envs_dir() -> str:
     return os.path.join(os.path.dirname(CONDA_BASE_DIR), "envs")
 
 
+def get_builder_env_dirs() -> list:
+    """Directories that may hold builder envs (see _find_env_prefix)."""
+    dirs = []
+    for envs_dir in (os.path.join(CONDA_BASE_DIR, "envs"), _get_conda_envs_dir()):
+        if envs_dir not in dirs:
+            dirs.append(envs_dir)
+    return dirs
+
+
 def _mark_env_used(env_name: str):
     """
     Touch a .last_used marker file in the conda environment directory.
@@ -265,7 +340,7 @@ def cleanup_stale_builder_envs():
     """
     Scans all builder Conda environments and removes those whose .last_used
     marker is older than _BUILDER_ENV_MAX_AGE_DAYS days.
-    Called on application startup.
+    Runs in the background (see start_builder_env_cleanup); sizes come from the disk index.
     """
     envs_dir = _get_conda_envs_dir()
     if not os.path.isdir(envs_dir):
@@ -276,8 +351,10 @@ def cleanup_stale_builder_envs():
     removed_count = 0
     total_size_mb = 0
 
+    pinned = {spec["env_name"] for spec in _load_warm_specs()}
+
     for entry in os.listdir(envs_dir):
-        if not entry.startswith("builder_py"):
+        if not entry.startswith("builder_py") or entry in pinned:
             continue
         env_path = os.path.join(envs_dir, entry)
         if not os.path.isdir(env_path):
@@ -297,25 +374,37 @@ def cleanup_stale_builder_envs():
 
         if age > max_age_seconds:
             try:
-                dir_size = sum(
-                    os.path.getsize(os.path.join(dirpath, f))
-                    for dirpath, _, filenames in os.walk(env_path)
-                    for f in filenames
-                ) if os.path.isdir(env_path) else 0
+                usage = disk_index.get_usage(env_path)
+                dir_size = usage["bytes"] if usage else 0
+                size_text = f"~{round(dir_size/(1024*1024))}MB" if usage else "size not indexed yet"
 
                 shutil.rmtree(env_path, ignore_errors=True)
+                builder_envs.remove(entry)
                 removed_count += 1
                 total_size_mb += round(dir_size / (1024 * 1024), 1)
-                print(f"[Builder-Cleanup] Removed stale env '{entry}' (unused for {int(age/86400)}d, ~{round(dir_size/(1024*1024))}MB)")
+                print(f"[Builder-Cleanup] Removed stale env '{entry}' (unused for {int(age/86400)}d, {size_text})")
             except Exception as e:
                 print(f"[Builder-Cleanup] Failed to remove '{entry}': {e}")
 
     if removed_count > 0:
+        disk_index.request_scan()
         print(f"[Builder-Cleanup] Cleanup complete: removed {removed_count} stale environment(s) ({total_size_mb} MB freed).")
     else:
         print(f"[Builder-Cleanup] No stale builder environments to clean.")
 
 
+def start_builder_env_cleanup():
+    """Runs cleanup_stale_builder_envs() in a background thread at idle priority. Called from the app lifespan."""
+    def _worker():
+        lower_current_thread_priority()
+        try:
+            cleanup_stale_builder_envs()
+        except Exception as e:
+            print(f"[Builder-Cleanup] [Warning] Builder environment cleanup failed: {e}")
+
+    threading.Thread(target=_worker, name="builder-env-cleanup", daemon=True).start()
+
+
 # --- HELPERS ---
 
 def get_manifest():
@@ -342,37 +431,38 @@ async def remove_from_manifest(filename):
             with open(MANIFEST_FILE, 'w') as f:
                 json.dump(data, f, indent=4)
 
-async def stream_subprocess(cmd, cwd, websocket, env_vars=None):
-    """Helper to run a command and stream output to websocket."""
+async def stream_subprocess(cmd, cwd, job: BuildJob, env_vars=None):
+    """Helper to run a command and stream its output to the job log."""
     print(f"[DEBUG] Executing command in {cwd}: {cmd}")
     
     # Merge current environment with custom vars and force unbuffered output
     full_env = os.environ.copy()
     full_env["PYTHONUNBUFFERED"] = "1"
+    full_env.update(package_cache_env())
     if env_vars:
         full_env.update(env_vars)
         
+    # A dedicated session lets a cancellation kill the whole compiler process tree
     process = await asyncio.create_subprocess_shell(
         cmd,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.STDOUT,
         cwd=cwd,
         env=full_env,
-        executable='/bin/bash'
+        executable='/bin/bash',
+        start_new_session=True
     )
+    job.process = process
     
-    while True:
-        line = await process.stdout.readline()
-        if not line:
-            break
-        try:
-            decoded_line = line.decode('utf-8', errors='replace')
-            await websocket.send_text(decoded_line)
-        except Exception as e:
-            print(f"[DEBUG] Error sending log line: {e}")
-            break
-    
-    return await process.wait()
+    try:
+        while True:
+            line = await process.stdout.readline()
+            if not line:
+                break
+            job.log(line.decode('utf-8', errors='replace'))
+        return await process.wait()
+    finally:
+        job.process = None
 
 # --- ENDPOINTS ---
 
@@ -402,7 +492,8 @@ def get_builder_info():
         "presets": PRESETS,
         "detected_arch": detected_arch,
         "gpu_name": gpu_name,
-        "python_path": sys.executable
+        "python_path": sys.executable,
+        "warm_envs": list(_warm_pool_status.values())
     }
     
 # --- NEW: Cache for python versions ---
@@ -618,211 +709,523 @@ async def delete_wheel(filename: str):
         return {"ok": True}
     raise HTTPException(status_code=404, detail="File not found")
 
-@router.websocket("/build")
-async def build_websocket(websocket: WebSocket):
-    print("[DEBUG] WebSocket connection request received.")
-    await websocket.accept()
-    print("[DEBUG] WebSocket accepted.")
+# --- BUILD JOBS ---
+
+def _builder_env_name(python_ver, cuda_ver, torch_ver) -> str:
+    """Validates a (python, cuda, torch) combination and returns its builder env name. Raises ValueError."""
+    if not isinstance(python_ver, str) or not re.match(r'^\d+\.\d+$', python_ver):
+        raise ValueError("Invalid python_ver format. Expected 'X.Y'.")
+    if not isinstance(cuda_ver, str) or not re.match(r'^cu\d+$', cuda_ver):
+        raise ValueError("Invalid cuda_ver format. Expected 'cuXXX'.")
+    if not isinstance(torch_ver, str) or not re.match(r'^\d+\.\d+\.\d+$', torch_ver):
+        raise ValueError("Invalid torch_ver format. Expected 'X.Y.Z'.")
+
+    # Environment name includes torch version now to distinguish them
+    safe_torch_ver = torch_ver.replace(".", "")
+    env_name = f"builder_py{python_ver.replace('.','')}_{cuda_ver}_pt{safe_torch_ver}"
     
-    try:
-        # 1. Receive Configuration
-        data = await websocket.receive_json()
-        print(f"[DEBUG] Received build config: {data}")
-        
-        preset_key = data.get("preset")
-        target_arch = data.get("arch")
-        custom_url = data.get("git_url")
-        python_ver = data.get("python_ver", "3.12")
-        cuda_ver = data.get("cuda_ver", "cu130")
-        # Extract requested torch version
-        requested_torch_ver = data.get("torch_ver", "2.5.1")
-
-        # --- SECURITY: Validate individual fields immediately ---
-        if not isinstance(python_ver, str) or not re.match(r'^\d+\.\d+$', python_ver):
-            await websocket.send_text("\x1b[31m[ERROR] Invalid python_ver format. Expected 'X.Y'.\x1b[0m\r\n")
-            await websocket.close()
-            return
-        if not isinstance(cuda_ver, str) or not re.match(r'^cu\d+$', cuda_ver):
-            await websocket.send_text("\x1b[31m[ERROR] Invalid cuda_ver format. Expected 'cuXXX'.\x1b[0m\r\n")
-            await websocket.close()
-            return
-        if not isinstance(requested_torch_ver, str) or not re.match(r'^\d+\.\d+\.\d+$', requested_torch_ver):
-            await websocket.send_text("\x1b[31m[ERROR] Invalid torch_ver format. Expected 'X.Y.Z'.\x1b[0m\r\n")
-            await websocket.close()
-            return
-        
-        if preset_key not in PRESETS:
-            print("[DEBUG] Invalid preset.")
-            await websocket.send_text("\x1b[31m[ERROR] Invalid preset selected.\x1b[0m\r\n")
-            await websocket.close()
-            return
+    # --- SECURITY: Validate env_name to prevent shell injection ---
+    if not re.match(r'^[a-zA-Z0-9_-]+$', env_name):
+        raise ValueError(f"Invalid environment name '{env_name}'. Only alphanumeric characters, hyphens and underscores are allowed.")
+    return env_name
 
-        preset = PRESETS[preset_key]
-        git_url = custom_url if preset_key == "custom" else preset["git_url"]
-        
-        # --- NEW: Auto-fix git URLs for pip wheel ---
-        if preset_key == "custom" and git_url:
-            # If it's a standard web URL, not already git+, and not explicitly an archive
-            if git_url.startswith("http") and not git_url.startswith("git+") and not git_url.endswith((".whl", ".zip", ".tar.gz")):
-                git_url = "git+" + git_url
-        
-        # Environment name includes torch version now to distinguish them
-        safe_torch_ver = requested_torch_ver.replace(".", "")
-        env_name = f"builder_py{python_ver.replace('.','')}_{cuda_ver}_pt{safe_torch_ver}"
-        
-        # --- SECURITY: Validate env_name to prevent shell injection ---
-        if not re.match(r'^[a-zA-Z0-9_-]+$', env_name):
-            await websocket.send_text(f"\x1b[31m[ERROR] Invalid environment name '{env_name}'. Only alphanumeric characters, hyphens and underscores are allowed.\x1b[0m\r\n")
-            await websocket.close()
-            return
-        
-        # Log immediately to confirm connection
-        await websocket.send_text(f"\x1b[34m[INFO] Initializing build process...\x1b[0m\r\n")
-        await websocket.send_text(f"\x1b[34m[INFO] Target Environment: {env_name}\x1b[0m\r\n")
-        await websocket.send_text(f"\x1b[34m[INFO] Requested Config: Torch {requested_torch_ver} | {cuda_ver}\x1b[0m\r\n")
+def _validate_build_config(data: dict) -> dict:
+    """
+    Validates a raw build request (websocket payload or REST body) and
+    returns the normalized job configuration. Raises ValueError on invalid input.
+    """
+    preset_key = data.get("preset")
+    target_arch = data.get("arch")
+    custom_url = data.get("git_url")
+    python_ver = data.get("python_ver", "3.12")
+    cuda_ver = data.get("cuda_ver", "cu130")
+    # Extract requested torch version
+    requested_torch_ver = data.get("torch_ver", "2.5.1")
+
+    # --- SECURITY: Validate individual fields immediately ---
+    env_name = _builder_env_name(python_ver, cuda_ver, requested_torch_ver)
+    # Several space-separated archs build a single multi-arch ("fat") wheel
+    if not isinstance(target_arch, str) or not re.match(r'^\d+\.\d+( \d+\.\d+)*$', target_arch):
+        raise ValueError("Invalid arch format. Expected 'X.Y' or 'X.Y X.Y ...'.")
+    if preset_key not in PRESETS:
+        raise ValueError("Invalid preset selected.")
+
+    preset = PRESETS[preset_key]
+    git_url = custom_url if preset_key == "custom" else preset["git_url"]
+    
+    # --- NEW: Auto-fix git URLs for pip wheel ---
+    if preset_key == "custom" and git_url:
+        # If it's a standard web URL, not already git+, and not explicitly an archive
+        if git_url.startswith("http") and not git_url.startswith("git+") and not git_url.endswith((".whl", ".zip", ".tar.gz")):
+            git_url = "git+" + git_url
+
+    return {
+        "preset": preset_key,
+        "arch": target_arch,
+        "git_url": git_url,
+        "python_ver": python_ver,
+        "cuda_ver": cuda_ver,
+        "torch_ver": requested_torch_ver,
+        "env_name": env_name,
+        "build_group": data.get("build_group"),
+    }
+
+def _find_env_prefix(env_name: str) -> str | None:
+    """Returns the prefix of a builder env, or None if it does not exist."""
+    for envs_dir in (os.path.join(CONDA_BASE_DIR, "envs"), _get_conda_envs_dir()):
+        prefix = os.path.join(envs_dir, env_name)
+        if os.path.isdir(os.path.join(prefix, "conda-meta")):
+            return prefix
+    return None
+
+def _missing_build_tools(entry: dict) -> list:
+    packages = entry.get("packages", {})
+    return [tool for tool in BUILDER_TOOLCHAIN if tool not in packages]
+
+async def _prepare_builder_env(job: BuildJob, env_name: str, python_ver: str, cuda_ver: str, requested_torch_ver: str, cmd_prefix: str = "") -> dict:
+    """
+    Creates the builder Conda env if needed and makes sure torch and build tools are installed.
+    Returns the env registry entry. A registered env that did not change on disk is used as-is.
+    cmd_prefix is prepended to the install commands (e.g. low_priority_prefix() for the warm pool).
+    """
+    job.log(f"\x1b[30;1m[CHECK] Verifying Conda environment...\x1b[0m\r\n")
+
+    entry = builder_envs.lookup(env_name)
+    if entry and entry.get("torch_version") and not _missing_build_tools(entry):
+        job.log(f"\x1b[32m[INFO] Environment {env_name} is registered and unchanged (torch {entry['torch_version']}).\x1b[0m\r\n")
+        return entry
 
-        # 2. Environment Setup
-        await websocket.send_text(f"\x1b[30;1m[CHECK] Verifying Conda environment...\x1b[0m\r\n")
+    prefix = _find_env_prefix(env_name)
+    if prefix is None:
+        job.log(f"\x1b[33m[INFO] Environment not found. Creating {env_name}...\x1b[0m\r\n")
+        job.log(f"\x1b[33m[WARN] This involves downloading Python and PyTorch (~2GB). Please wait.\x1b[0m\r\n")
         
-        env_exists_cmd = f"{CONDA_EXE} info --envs | /usr/bin/grep {env_name}"
+        # Create Env Command
+        create_cmd = f"{cmd_prefix}{CONDA_EXE} create -n {env_name} python={python_ver} pip wheel setuptools packaging ninja -y"
+        if await stream_subprocess(create_cmd, job.workspace, job) != 0:
+            raise Exception("Failed to create Conda environment.")
+        prefix = _find_env_prefix(env_name)
+        if prefix is None:
+            raise Exception(f"Conda environment {env_name} was created but could not be located.")
+
+    # A previous build may have created the env but failed during torch installation.
+    entry = await asyncio.to_thread(builder_envs.refresh, env_name, prefix, python_ver, cuda_ver)
+    if entry is None:
+        raise Exception(f"Could not inspect builder environment {env_name}.")
+
+    if not entry.get("torch_version"):
+        job.log(f"\x1b[33m[INFO] PyTorch not found in environment. Installing...\x1b[0m\r\n")
+        # Install torch (pinned version) + torchvision + torchaudio (no version pin).
+        # Using --index-url ensures pip resolves compatible versions
+        # directly from the PyTorch wheel index.
+        torch_pkg = f"torch=={requested_torch_ver} torchvision torchaudio"
+
+        job.log(f"\x1b[34m[INFO] Installing {torch_pkg}...\x1b[0m\r\n")
+        index_url = f"https://download.pytorch.org/whl/{cuda_ver}"
+        install_cmd = f"source {CONDA_BASE_DIR}/bin/activate {env_name} && {cmd_prefix}pip install {torch_pkg} --index-url {index_url}"
         
-        proc = await asyncio.create_subprocess_shell(
-            env_exists_cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            executable='/bin/bash'
+        if await stream_subprocess(install_cmd, job.workspace, job) != 0:
+            raise Exception("Failed to install PyTorch in builder environment.")
+
+    # --- Ensure modern build tools are present (fixes bitsandbytes and others) ---
+    missing_tools = _missing_build_tools(entry)
+    if missing_tools:
+        job.log(f"\x1b[34m[INFO] Installing build tools ({', '.join(missing_tools)})...\x1b[0m\r\n")
+        build_tools_cmd = f"source {CONDA_BASE_DIR}/bin/activate {env_name} && {cmd_prefix}pip install {' '.join(missing_tools)}"
+        if await stream_subprocess(build_tools_cmd, job.workspace, job) != 0:
+            job.log(f"\x1b[33m[WARN] Failed to install build tools. Build might fail.\x1b[0m\r\n")
+
+    if not entry.get("torch_version") or missing_tools:
+        entry = await asyncio.to_thread(builder_envs.refresh, env_name, prefix, python_ver, cuda_ver) or entry
+    return entry
+
+async def _run_build_job(job: BuildJob) -> bool:
+    """
+    Runs a full build (env setup, compilation, manifest update) for a queued job.
+    Returns True on success. Output goes to the job log, not to a websocket.
+    """
+    config = job.config
+    preset_key = config["preset"]
+    preset = PRESETS[preset_key]
+    target_arch = config["arch"]
+    git_url = config["git_url"]
+    python_ver = config["python_ver"]
+    cuda_ver = config["cuda_ver"]
+    requested_torch_ver = config["torch_ver"]
+    env_name = config["env_name"]
+
+    # Log immediately to confirm the job started
+    job.log(f"\x1b[34m[INFO] Initializing build process...\x1b[0m\r\n")
+    job.log(f"\x1b[34m[INFO] Target Environment: {env_name}\x1b[0m\r\n")
+    job.log(f"\x1b[34m[INFO] Requested Config: Torch {requested_torch_ver} | {cuda_ver}\x1b[0m\r\n")
+
+    # 2. Environment Setup (serialized per env: parallel jobs may share it)
+    env_lock = _env_locks.setdefault(env_name, asyncio.Lock())
+    async with env_lock:
+        env_entry = await _prepare_builder_env(job, env_name, python_ver, cuda_ver, requested_torch_ver)
+
+    # --- Mark environment as used for cache management ---
+    # Ceci permet au cleanup de savoir que l'environnement est actif
+    _mark_env_used(env_name)
+
+    # Exact torch version installed (from the registry, torch itself is never imported)
+    detected_torch_ver = env_entry.get("torch_version") or "Unknown"
+    job.log(f"\x1b[32m[INFO] Confirmed PyTorch Version: {detected_torch_ver}\x1b[0m\r\n")
+
+    # 3. Prepare Build (the job workspace is unique and created by the queue)
+    build_tmp_dir = job.workspace
+
+    # Sources: incremental fetch into the mirror store, then a local --shared clone
+    mirror_stats = None
+    if preset_key != "custom":
+        mirror_stats = await git_mirrors.clone(git_url, os.path.join(build_tmp_dir, "source_code"), job.log, submodules=preset.get("submodules", False))
+        job.log(
+            f"\x1b[34m[INFO] Sources ready ({mirror_stats['repositories']} repositories): "
+            f"{mirror_stats['fetched_bytes'] / (1024 * 1024):.1f} MB fetched, "
+            f"{mirror_stats['reused_bytes'] / (1024 * 1024):.1f} MB reused from local mirrors.\x1b[0m\r\n"
         )
-        await proc.wait()
+
+    # Template substitution
+    raw_cmd = preset["cmd_template"].format(
+        git_url=git_url,
+        arch=target_arch,
+        output_dir=build_tmp_dir, 
+        python="python -u" 
+    )
+
+    final_cmd = f"source {CONDA_BASE_DIR}/bin/activate {env_name} && {raw_cmd}"
+
+    job.log(f"\x1b[34m[INFO] Starting compilation for {preset['label']}...\x1b[0m\r\n")
+    job.log(f"\x1b[30;1m[CMD] {final_cmd}\x1b[0m\r\n\r\n")
+
+    # 4. Parallelism: sized from free cores/RAM, shared with the other running builds
+    running_builds = sum(1 for j in build_queue.list() if j.status == "running")
+    mem_per_job_mb = build_stats.mem_per_job_mb(preset_key, preset.get("mem_per_job_mb", build_resources.DEFAULT_MEM_PER_JOB_MB))
+    plan = build_resources.plan_parallelism(mem_per_job_mb, running_builds)
+    job.log(
+        f"\x1b[34m[INFO] Parallelism: MAX_JOBS={plan['max_jobs']} NVCC_THREADS={plan['nvcc_threads']} "
+        f"({plan['cpus']} CPUs, {plan['available_memory_mb']} MB free, ~{mem_per_job_mb} MB/job, "
+        f"{plan['concurrent_builds']} running build(s))\x1b[0m\r\n"
+    )
+
+    build_env = build_resources.parallelism_env(plan)
+    build_env.update(compiler_cache.build_env(build_tmp_dir))
+    if compiler_cache.enabled:
+        job.log(f"\x1b[34m[INFO] Compiler cache: {compiler_cache.tool} ({compiler_cache.cache_dir}, max {compiler_cache.max_size})\x1b[0m\r\n")
+    cache_before = await asyncio.to_thread(compiler_cache.stats)
+
+    # 5. Execution (peak RSS of the whole compiler tree is sampled for the stats)
+    sampler = build_resources.PeakRssSampler(lambda: job.process.pid if job.process else None)
+    sampler.start()
+    started = time.time()
+    try:
+        return_code = await stream_subprocess(final_cmd, build_tmp_dir, job, env_vars=build_env)
+    finally:
+        peak_rss_mb = await sampler.stop()
+    job.log(f"\x1b[30;1m[INFO] Peak build memory: {peak_rss_mb} MB\x1b[0m\r\n")
+
+    # Counters are global to the cache: overlapping builds are counted together
+    cache_stats = compiler_cache.diff_stats(cache_before, await asyncio.to_thread(compiler_cache.stats))
+    if cache_stats:
+        rate = f"{cache_stats['hit_rate'] * 100:.0f}%" if cache_stats["hit_rate"] is not None else "n/a"
+        job.log(f"\x1b[34m[INFO] Compiler cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses (hit rate {rate})\x1b[0m\r\n")
+
+    # 6. Rename & Manifest (the queue removes the workspace afterwards)
+    if return_code != 0:
+        job.log(f"\r\n\x1b[31m[FAILURE] Build failed with exit code {return_code}.\x1b[0m\r\n")
+        return False
+
+    job.log(f"\r\n\x1b[32m[SUCCESS] Build completed successfully.\x1b[0m\r\n")
+    # Only complete builds are representative of the real peak
+    if peak_rss_mb:
+        build_stats.record(preset_key, peak_rss_mb, plan["max_jobs"], time.time() - started)
+    
+    # Look for wheels ONLY in the job workspace (ensures we get the one we just built)
+    list_of_files = glob.glob(os.path.join(build_tmp_dir, "*.whl"))
+    
+    if list_of_files:
+        # There should usually be only one, but take the latest just in case
+        generated_file_path = max(list_of_files, key=os.path.getctime)
+        original_filename = os.path.basename(generated_file_path)
         
-        env_needs_creation = proc.returncode != 0
+        # --- RENAMING LOGIC ---
+        # Example: package-1.0-cp312...whl -> package-1.0-cp312...+arch8.9.whl
+        name_part, ext = os.path.splitext(original_filename)
         
-        if env_needs_creation:
-            await websocket.send_text(f"\x1b[33m[INFO] Environment not found. Creating {env_name}...\x1b[0m\r\n")
-            await websocket.send_text(f"\x1b[33m[WARN] This involves downloading Python and PyTorch (~2GB). Please wait.\x1b[0m\r\n")
-            
-            # Create Env Command
-            create_cmd = f"{CONDA_EXE} create -n {env_name} python={python_ver} pip wheel setuptools packaging ninja -y"
-            if await stream_subprocess(create_cmd, WHEELS_DIR, websocket) != 0:
-                raise Exception("Failed to create Conda environment.")
+        # Add architecture suffix to filename (multi-arch wheels: +arch8.9_9.0)
+        final_filename = f"{name_part}+arch{target_arch.replace(' ', '_')}{ext}"
+        final_path = os.path.join(WHEELS_DIR, final_filename)
         
-        # ALWAYS verify that torch is actually installed in the environment.
-        # A previous build may have created the env but failed during torch installation.
-        torch_check_cmd = f"source {CONDA_BASE_DIR}/bin/activate {env_name} && python -c 'import torch; print(torch.__version__)'"
-        proc = await asyncio.create_subprocess_shell(
-            torch_check_cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            executable='/bin/bash'
-        )
-        torch_check_output, torch_check_stderr = await proc.communicate()
-        torch_is_installed = proc.returncode == 0 and bool(torch_check_output.strip())
+        # Move from the workspace to the global store
+        shutil.move(generated_file_path, final_path)
         
-        if not torch_is_installed:
-            await websocket.send_text(f"\x1b[33m[INFO] PyTorch not found in environment. Installing...\x1b[0m\r\n")
-            # Install torch (pinned version) + torchvision + torchaudio (no version pin).
-            # Using --index-url ensures pip resolves compatible versions
-            # directly from the PyTorch wheel index.
-            torch_pkg = f"torch=={requested_torch_ver} torchvision torchaudio"
-
-            await websocket.send_text(f"\x1b[34m[INFO] Installing {torch_pkg}...\x1b[0m\r\n")
-            index_url = f"https://download.pytorch.org/whl/{cuda_ver}"
-            install_cmd = f"source {CONDA_BASE_DIR}/bin/activate {env_name} && pip install {torch_pkg} --index-url {index_url} --no-cache-dir"
-            
-            if await stream_subprocess(install_cmd, WHEELS_DIR, websocket) != 0:
-                raise Exception("Failed to install PyTorch in builder environment.")
-
-        # --- NEW: Ensure modern build tools are present (fixes bitsandbytes and others) ---
-        # Exécuté systématiquement, même si l'environnement existait déjà.
-        await websocket.send_text(f"\x1b[34m[INFO] Verifying modern build tools (cmake, scikit-build-core)...\x1b[0m\r\n")
-        build_tools_cmd = f"source {CONDA_BASE_DIR}/bin/activate {env_name} && pip install cmake scikit-build-core"
-        if await stream_subprocess(build_tools_cmd, WHEELS_DIR, websocket) != 0:
-            await websocket.send_text(f"\x1b[33m[WARN] Failed to update build tools. Build might fail.\x1b[0m\r\n")
-
-        # --- Mark environment as used for cache management ---
-        # Ceci permet au cleanup de savoir que l'environnement est actif
+        await update_manifest(final_filename, {
+            "cuda_arch": target_arch,
+            "source_preset": preset_key,
+            "git_url": git_url,
+            "python_ver": python_ver,
+            "cuda_ver": cuda_ver,
+            "torch_ver": detected_torch_ver,
+            "build_job": job.id,
+            "build_group": config.get("build_group"),
+            "compiler_cache": cache_stats,
+            "source_mirror": mirror_stats
+        })
+        job.outputs.append(final_filename)
+        job.log(f"\x1b[32m[INFO] Saved as: {final_filename}\x1b[0m\r\n")
+    return True
+
+build_stats = build_resources.BuildStats(BUILD_STATS_FILE)
+git_mirrors = GitMirrorStore(GIT_MIRRORS_DIR)
+compiler_cache = CompilerCache(os.path.join(CACHE_DIR, "compiler"), COMPILER_CACHE_MODE, COMPILER_CACHE_MAXSIZE)
+
+build_queue = BuildQueue(
+    state_file=BUILD_JOBS_FILE,
+    logs_dir=BUILD_LOGS_DIR,
+    workspaces_dir=BUILD_TMP_DIR,
+    runner=_run_build_job,
+    max_concurrent=BUILDER_MAX_CONCURRENT,
+)
+
+def start_build_queue():
+    """Re-schedules builds left queued by a previous run. Called from the app lifespan."""
+    build_queue.resume()
+
+# --- WARM ENV POOL ---
+
+_warm_pool_status = {}
+# Strong reference to the provisioning task (the event loop only keeps weak ones)
+_warm_pool_task = None
+
+def _load_warm_specs() -> list:
+    """Returns the configured warm env specs, each with its env_name. Invalid specs are skipped."""
+    raw_specs = []
+    for item in os.environ.get("AIKORE_BUILDER_WARM_ENVS", "").split(","):
+        parts = item.strip().split("/")
+        if len(parts) == 3:
+            raw_specs.append({"python_ver": parts[0], "cuda_ver": parts[1], "torch_ver": parts[2]})
+        elif item.strip():
+            print(f"[Builder-Warm] Ignoring malformed spec '{item.strip()}' (expected python/cuda/torch).")
+    try:
+        with open(BUILDER_WARM_ENVS_FILE, 'r') as f:
+            raw_specs.extend(json.load(f))
+    except FileNotFoundError:
+        pass
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"[Builder-Warm] Could not read {BUILDER_WARM_ENVS_FILE}: {e}")
+
+    specs = {}
+    for raw in raw_specs:
+        try:
+            spec = {"python_ver": raw.get("python_ver"), "cuda_ver": raw.get("cuda_ver"), "torch_ver": raw.get("torch_ver")}
+            spec["env_name"] = _builder_env_name(spec["python_ver"], spec["cuda_ver"], spec["torch_ver"])
+        except (ValueError, AttributeError) as e:
+            print(f"[Builder-Warm] Ignoring invalid spec {raw}: {e}")
+            continue
+        specs[spec["env_name"]] = spec
+    return list(specs.values())
+
+async def _provision_warm_env(spec: dict):
+    env_name = spec["env_name"]
+    status = _warm_pool_status[env_name]
+    # A detached job gives the provisioning a log file and a workspace, like a build
+    job = BuildJob(
+        job_id=f"warm-{env_name}",
+        config=spec,
+        log_path=os.path.join(BUILD_LOGS_DIR, f"warm-{env_name}.log"),
+        workspace=os.path.join(BUILD_TMP_DIR, f"warm-{env_name}"),
+    )
+    open(job.log_path, 'w').close()
+    os.makedirs(job.workspace, exist_ok=True)
+    try:
+        async with _env_locks.setdefault(env_name, asyncio.Lock()):
+            status["status"] = "provisioning"
+            entry = await _prepare_builder_env(job, env_name, spec["python_ver"], spec["cuda_ver"], spec["torch_ver"], cmd_prefix=low_priority_prefix())
         _mark_env_used(env_name)
+        status.update({"status": "ready", "torch_version": entry.get("torch_version"), "error": None})
+        print(f"[Builder-Warm] Environment '{env_name}' is ready.")
+    except Exception as e:
+        status.update({"status": "failed", "error": str(e)})
+        print(f"[Builder-Warm] Failed to provision '{env_name}': {e}")
+    finally:
+        shutil.rmtree(job.workspace, ignore_errors=True)
 
-        # 2.5 DETECT TORCH VERSION (NEW)
-        # We query the environment to find out exactly what version was installed
-        detect_cmd = f"source {CONDA_BASE_DIR}/bin/activate {env_name} && python -c 'import torch; print(torch.__version__)'"
-        proc = await asyncio.create_subprocess_shell(
-            detect_cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            executable='/bin/bash'
-        )
-        stdout, stderr = await proc.communicate()
-        detected_torch_ver = stdout.decode().strip()
-        
-        if not detected_torch_ver:
-            detected_torch_ver = "Unknown"
-        else:
-            await websocket.send_text(f"\x1b[32m[INFO] Confirmed PyTorch Version: {detected_torch_ver}\x1b[0m\r\n")
-
-        # 3. Prepare Build
-        build_tmp_dir = os.path.join(WHEELS_DIR, "build_tmp")
-        if os.path.exists(build_tmp_dir):
-            shutil.rmtree(build_tmp_dir)
-        os.makedirs(build_tmp_dir)
-
-        # Template substitution
-        raw_cmd = preset["cmd_template"].format(
-            git_url=git_url,
-            arch=target_arch,
-            output_dir=build_tmp_dir, 
-            python="python -u" 
-        )
+async def _run_warm_pool(specs: list):
+    # One env at a time: provisioning is background work and must stay gentle
+    for spec in specs:
+        await _provision_warm_env(spec)
 
-        final_cmd = f"source {CONDA_BASE_DIR}/bin/activate {env_name} && {raw_cmd}"
+def _on_warm_pool_done(task: asyncio.Task):
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error:
+        print(f"[Builder-Warm] Warm pool provisioning failed: {error!r}")
+
+def start_warm_pool():
+    """Provisions the warm builder envs in the background. Called from the app lifespan."""
+    global _warm_pool_task
+    specs = _load_warm_specs()
+    for spec in specs:
+        _warm_pool_status[spec["env_name"]] = {
+            "env_name": spec["env_name"],
+            "python_ver": spec["python_ver"],
+            "cuda_ver": spec["cuda_ver"],
+            "torch_ver": spec["torch_ver"],
+            "status": "pending",
+            "torch_version": None,
+            "error": None,
+        }
+    if specs:
+        print(f"[Builder-Warm] Provisioning {len(specs)} warm builder environment(s) in the background.")
+        _warm_pool_task = asyncio.create_task(_run_warm_pool(specs))
+        _warm_pool_task.add_done_callback(_on_warm_pool_done)
+
+@router.post("/jobs")
+async def submit_build_job(request: BuildRequest):
+    """Queues a build and returns the job. Follow its log via /jobs/{id}/log or the /build websocket."""
+    try:
+        config = _validate_build_config(request.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return build_queue.submit(config).to_dict()
 
-        await websocket.send_text(f"\x1b[34m[INFO] Starting compilation for {preset['label']}...\x1b[0m\r\n")
-        await websocket.send_text(f"\x1b[30;1m[CMD] {final_cmd}\x1b[0m\r\n\r\n")
+@router.post("/matrix")
+async def submit_build_matrix(request: MatrixBuildRequest):
+    """
+    Queues one build per (python, torch, arch) combination, or per (python, torch) with
+    fat_wheel, as a single build group. Jobs run in parallel up to the queue concurrency
+    and share the builder envs, the compiler cache and the git mirrors.
+    """
+    archs = list(dict.fromkeys(a.strip() for a in request.archs if a.strip()))
+    torch_vers = list(dict.fromkeys(request.torch_vers))
+    python_vers = list(dict.fromkeys(request.python_vers))
+    if not archs or not torch_vers or not python_vers:
+        raise HTTPException(status_code=400, detail="archs, torch_vers and python_vers must not be empty.")
+
+    arch_variants = [" ".join(archs)] if request.fat_wheel else archs
+    combinations = [(p, t, a) for p in python_vers for t in torch_vers for a in arch_variants]
+    if len(combinations) > MATRIX_MAX_JOBS:
+        raise HTTPException(status_code=400, detail=f"Matrix too large ({len(combinations)} builds, max {MATRIX_MAX_JOBS}).")
+
+    group_id = f"grp-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    # Validate everything before queuing anything
+    configs = []
+    for python_ver, torch_ver, arch in combinations:
+        try:
+            configs.append(_validate_build_config({
+                "preset": request.preset,
+                "arch": arch,
+                "git_url": request.git_url,
+                "python_ver": python_ver,
+                "cuda_ver": request.cuda_ver,
+                "torch_ver": torch_ver,
+                "build_group": group_id,
+            }))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{python_ver}/{torch_ver}/{arch}: {e}")
+
+    jobs = [build_queue.submit(config) for config in configs]
+    return {"build_group": group_id, "jobs": [job.to_dict() for job in jobs]}
+
+@router.get("/groups/{group_id}")
+def get_build_group(group_id: str):
+    """Status and outputs of every job of a build group."""
+    jobs = [job for job in build_queue.list() if job.config.get("build_group") == group_id]
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Build group not found")
+    statuses = [job.status for job in jobs]
+    return {
+        "build_group": group_id,
+        "finished": all(job.finished for job in jobs),
+        "counts": {status: statuses.count(status) for status in set(statuses)},
+        "outputs": [output for job in jobs for output in job.outputs],
+        "jobs": [job.to_dict() for job in jobs],
+    }
 
-        # 4. Execution
-        return_code = await stream_subprocess(final_cmd, build_tmp_dir, websocket)
+@router.get("/jobs")
+def list_build_jobs():
+    return [job.to_dict() for job in build_queue.list()]
+
+@router.get("/jobs/{job_id}")
+def get_build_job(job_id: str):
+    job = build_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Build job not found")
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}/log")
+def get_build_job_log(job_id: str, offset: int = 0):
+    """Returns the job log from a byte offset, with the same shape as the instance logs endpoint."""
+    job = build_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Build job not found")
+
+    content = ""
+    size = offset
+    try:
+        current_size = os.path.getsize(job.log_path)
+        if current_size > offset:
+            with open(job.log_path, 'r', encoding='utf-8', errors='ignore') as f:
+                f.seek(offset)
+                content = f.read()
+            size = current_size
+    except FileNotFoundError:
+        pass
+
+    return {"content": content, "size": size, "status": job.status}
+
+@router.delete("/jobs/{job_id}")
+def cancel_build_job(job_id: str):
+    job = build_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Build job not found")
+    if not build_queue.cancel(job_id):
+        raise HTTPException(status_code=400, detail=f"Build job is already '{job.status}'.")
+    return {"ok": True}
+
+async def _attach_websocket(websocket: WebSocket, job: BuildJob, offset: int = 0):
+    """Streams a job log to a websocket. Disconnecting only detaches; the build keeps running."""
+    try:
+        async for text in build_queue.stream(job, offset):
+            await websocket.send_text(text)
+    except (WebSocketDisconnect, RuntimeError):
+        print(f"[DEBUG] Client detached from build job {job.id}.")
 
-        # 5. Cleanup, Rename & Manifest
-        if return_code == 0:
-            await websocket.send_text(f"\r\n\x1b[32m[SUCCESS] Build completed successfully.\x1b[0m\r\n")
-            
-            # Look for wheels ONLY in the temp directory (ensures we get the one we just built)
-            list_of_files = glob.glob(os.path.join(build_tmp_dir, "*.whl"))
-            
-            if list_of_files:
-                # There should usually be only one, but take the latest just in case
-                generated_file_path = max(list_of_files, key=os.path.getctime)
-                original_filename = os.path.basename(generated_file_path)
-                
-                # --- RENAMING LOGIC ---
-                # Example: package-1.0-cp312...whl -> package-1.0-cp312...+arch8.9.whl
-                name_part, ext = os.path.splitext(original_filename)
-                
-                # Add architecture suffix to filename
-                final_filename = f"{name_part}+arch{target_arch}{ext}"
-                final_path = os.path.join(WHEELS_DIR, final_filename)
-                
-                # Move from tmp to final
-                shutil.move(generated_file_path, final_path)
-                
-                await update_manifest(final_filename, {
-                    "cuda_arch": target_arch,
-                    "source_preset": preset_key,
-                    "git_url": git_url,
-                    "python_ver": python_ver,
-                    "cuda_ver": cuda_ver,
-                    "torch_ver": detected_torch_ver
-                })
-                await websocket.send_text(f"\x1b[32m[INFO] Saved as: {final_filename}\x1b[0m\r\n")
+@router.websocket("/build")
+async def build_websocket(websocket: WebSocket):
+    """
+    Submits a build and attaches to its log.
+    Sending {"job_id": ..., "offset": N} instead of a build config re-attaches to an existing job.
+    """
+    print("[DEBUG] WebSocket connection request received.")
+    await websocket.accept()
+    print("[DEBUG] WebSocket accepted.")
+    
+    try:
+        # 1. Receive Configuration
+        data = await websocket.receive_json()
+        print(f"[DEBUG] Received build config: {data}")
+
+        if data.get("job_id"):
+            job = build_queue.get(str(data["job_id"]))
+            if not job:
+                await websocket.send_text("\x1b[31m[ERROR] Build job not found.\x1b[0m\r\n")
+                return
+            offset = data.get("offset", 0)
         else:
-            await websocket.send_text(f"\r\n\x1b[31m[FAILURE] Build failed with exit code {return_code}.\x1b[0m\r\n")
-            
-        # Clean up temp dir (guaranteed even on exception)
-        try:
-            if os.path.exists(build_tmp_dir):
-                shutil.rmtree(build_tmp_dir, ignore_errors=True)
-        except Exception:
-            pass
+            try:
+                config = _validate_build_config(data)
+            except ValueError as e:
+                await websocket.send_text(f"\x1b[31m[ERROR] {e}\x1b[0m\r\n")
+                return
+            job = build_queue.submit(config)
+            offset = 0
+
+        await _attach_websocket(websocket, job, offset if isinstance(offset, int) else 0)
 
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         print(f"[DEBUG] Exception in build_websocket: {e}")
         traceback.print_exc()
@@ -832,15 +1235,24 @@ async def build_websocket(websocket: WebSocket):
         except:
             pass
     finally:
-        # Ensure temp dir is always cleaned up even if exception handler didn't run
-        build_tmp_dir = os.path.join(WHEELS_DIR, "build_tmp")
+        print("[DEBUG] Closing WebSocket.")
         try:
-            if os.path.exists(build_tmp_dir):
-                shutil.rmtree(build_tmp_dir, ignore_errors=True)
-        except Exception:
+            await websocket.close()
+        except:
             pass
-        print("[DEBUG] Closing WebSocket.")
+
+@router.websocket("/build/{job_id}")
+async def build_job_websocket(websocket: WebSocket, job_id: str, offset: int = 0):
+    """Attaches to an existing build job log, replaying it from a byte offset."""
+    await websocket.accept()
+    job = build_queue.get(job_id)
+    try:
+        if not job:
+            await websocket.send_text("\x1b[31m[ERROR] Build job not found.\x1b[0m\r\n")
+            return
+        await _attach_websocket(websocket, job, offset)
+    finally:
         try:
             await websocket.close()
         except:
-            pass
\ No newline at end of file
+            pass
@@ -1,10 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Body, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Body, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from typing import List
 import os
 import shutil
-import stat  # NEW: Needed for permission handling
 import asyncio
 import psutil
 import json
@@ -15,8 +14,15 @@ from pydantic import BaseModel
 from ..database import crud, models
 from ..database.session import SessionLocal, get_db
 from ..schemas import instance as schemas
-from ..core import process_manager
+from ..core import process_manager, env_probe, wheel_compat, disk_usage, env_snapshots
+from ..core.disk_usage import disk_index
+from ..core.priority import lower_current_thread_priority
+from ..core.trashcan import trashcan, throttled_rmtree
+from ..core.jobs import jobs
+from ..core.cache_manager import cache_manager
+from ..core.prewarm import prewarm_manager
 from ..core.process_manager import INSTANCES_DIR, BLUEPRINTS_DIR, CUSTOM_BLUEPRINTS_DIR, _find_free_port, _find_free_display
+from .builder import get_manifest
 
 # --- CONSTANTS ---
 GLOBAL_WHEELS_DIR = os.path.join(INSTANCES_DIR, ".wheels")
@@ -33,12 +39,17 @@ router = APIRouter(
 class FileContent(BaseModel):
     content: str
 
+class VenvCommand(BaseModel):
+    command: str
+
 # NEW: Wheel Management Schemas
 class InstanceWheel(BaseModel):
     filename: str
     size_mb: float
     installed: bool # Present in instance/wheels/
-    
+    compatibility: str = "unknown" # compatible | partial | unknown | incompatible
+    compat_issues: List[str] = []
+
 class WheelsSyncRequest(BaseModel):
     filenames: List[str] # List of filenames to KEEP/INSTALL
 
@@ -160,7 +171,6 @@ def create_new_instance(instance: schemas.InstanceCreate, db: Session = Depends(
 def copy_instance(
     instance_id: int,
     instance_copy: schemas.InstanceCopy,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -178,9 +188,9 @@ def copy_instance(
             new_name=instance_copy.new_name
         )
         
-        # 2. Launch the heavy work in background
+        # 2. Launch the heavy work as a background job
         # We pass IDs only, NOT the db session, to avoid DetachedInstanceError
-        background_tasks.add_task(crud.process_background_copy, new_instance.id, instance_id)
+        jobs.submit("instance_copy", {"new_instance_id": new_instance.id, "source_instance_id": instance_id}, instance_id=new_instance.id)
         
         return new_instance
         
@@ -270,6 +280,7 @@ def update_instance_details(
     # --- Apply changes ---
     original_name = db_instance.name
     final_update_data = update_data.copy()
+    persistent_deps_job = False
 
     # 1. Name Change
     if "name" in update_data and update_data["name"] != original_name:
@@ -365,13 +376,10 @@ def update_instance_details(
             if not db_instance.persistent_display:
                 final_update_data['persistent_display'] = _find_free_display()
                 
-            # Install dependencies if switching to persistent for the first time
+            # Install dependencies if switching to persistent for the first time.
+            # Runs as a job (streamed log, cancellable); it restarts the instance itself once done.
             if not db_instance.persistent_mode:
-                temp_instance_for_cmd = schemas.Instance.model_validate(db_instance)
-                temp_instance_for_cmd.name = update_data.get("name", original_name)
-                success, output = process_manager.run_command_in_instance_venv(temp_instance_for_cmd, "pip install websockify numpy")
-                if not success:
-                     print(f"WARNING: Failed to install persistent mode dependencies for '{db_instance.name}': {output}")
+                persistent_deps_job = True
 
         else: # Normal Mode
             # Public port goes to Application
@@ -389,7 +397,13 @@ def update_instance_details(
     updated_instance = crud.update_instance(db, instance_id=db_instance.id, instance_update=final_instance_update)
     db.refresh(updated_instance)
 
-    if was_running:
+    if persistent_deps_job:
+        jobs.submit("venv_command", {
+            "instance_id": updated_instance.id,
+            "command": "pip install websockify numpy",
+            "start_after": was_running
+        }, instance_id=updated_instance.id)
+    elif was_running:
         print(f"Restarting instance '{updated_instance.name}' after disruptive update.")
         try:
             process_manager.start_instance_process(db=db, instance=updated_instance)
@@ -398,18 +412,15 @@ def update_instance_details(
 
     return updated_instance
 
-@router.post("/instances/{instance_id}/rebuild", response_model=schemas.Instance, tags=["Instance Actions"])
+@router.post("/instances/{instance_id}/rebuild", tags=["Instance Actions"])
 def rebuild_instance_environment(instance_id: int, db: Session = Depends(get_db)):
     db_instance = crud.get_instance(db, instance_id=instance_id)
     if not db_instance:
         raise HTTPException(status_code=404, detail="Instance not found")
     
-    try:
-        process_manager.rebuild_instance_env(db=db, instance=db_instance)
-        # The process manager handles status updates, so we just return the instance
-        return db_instance
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to rebuild instance environment: {str(e)}")
+    # Stopping and restarting can take a while: run it as a job and return immediately
+    job_id = jobs.submit("instance_rebuild", {"instance_id": db_instance.id}, instance_id=db_instance.id)
+    return {"ok": True, "job_id": job_id}
 
 @router.post("/instances/{instance_id}/start", response_model=schemas.Instance, tags=["Instance Actions"])
 def start_instance(instance_id: int, db: Session = Depends(get_db)):
@@ -418,6 +429,9 @@ def start_instance(instance_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Instance not found")
     if db_instance.status != "stopped":
         raise HTTPException(status_code=400, detail=f"Instance cannot be started from status '{db_instance.status}'")
+    owner_id = db_instance.parent_instance_id or db_instance.id
+    if any(jobs.list(status=status, kind="env_rollback", instance_id=owner_id, limit=1) for status in ("queued", "running")):
+        raise HTTPException(status_code=409, detail="An environment rollback is in progress for this instance.")
 
     # --- SELF-HEALING (CORRECTION AUTO) ---
     # Si une instance est en mode persistant mais n'a pas de ports définis, on les alloue maintenant.
@@ -445,12 +459,122 @@ def start_instance(instance_id: int, db: Session = Depends(get_db)):
         process_manager.start_instance_process(db=db, instance=db_instance)
         # The process manager handles status updates, so we just return the instance
         return db_instance
+    except disk_usage.DiskQuotaExceeded as e:
+        raise HTTPException(status_code=507, detail=str(e))
     except Exception as e:
         # If start fails catastrophically, revert status and raise error
         db_instance.status = "stopped"
         db.commit()
         raise HTTPException(status_code=500, detail=f"Failed to start instance: {str(e)}")
 
+@router.post("/instances/{instance_id}/venv-command", tags=["Instance Actions"])
+def run_instance_venv_command(instance_id: int, request: VenvCommand, db: Session = Depends(get_db)):
+    """
+    Runs a shell command (pip/conda...) inside the instance environment as a background job.
+    Returns immediately; follow the output with /api/jobs/{job_id}/stream.
+    """
+    db_instance = crud.get_instance(db, instance_id=instance_id)
+    if not db_instance:
+        raise HTTPException(status_code=404, detail="Instance not found")
+    if db_instance.parent_instance_id is not None:
+        raise HTTPException(status_code=400, detail="Satellite instances share their parent's environment. Run the command on the parent.")
+    if not request.command.strip():
+        raise HTTPException(status_code=400, detail="Command cannot be empty.")
+    job_id = jobs.submit("venv_command", {"instance_id": db_instance.id, "command": request.command}, instance_id=db_instance.id)
+    return {"job_id": job_id}
+
+# --- ENVIRONMENT SNAPSHOTS (see core/env_snapshots.py) ---
+
+def _get_env_owner_or_error(db: Session, instance_id: int) -> tuple:
+    """Returns (instance, instance_conf_dir, env_path) for a non-satellite instance with an env."""
+    db_instance = crud.get_instance(db, instance_id=instance_id)
+    if not db_instance:
+        raise HTTPException(status_code=404, detail="Instance not found")
+    if db_instance.parent_instance_id is not None:
+        raise HTTPException(status_code=400, detail="Satellite instances share their parent's environment. Use the parent instance.")
+    instance_conf_dir, env_path = process_manager.get_instance_env_path(db_instance)
+    if not env_path:
+        raise HTTPException(status_code=400, detail=f"Instance '{db_instance.name}' has no managed environment.")
+    return db_instance, instance_conf_dir, env_path
+
+@router.get("/instances/{instance_id}/snapshots", tags=["Instance Actions"])
+def list_env_snapshots(instance_id: int, db: Session = Depends(get_db)):
+    """Lists the package snapshots of the instance env, oldest first."""
+    _, instance_conf_dir, _ = _get_env_owner_or_error(db, instance_id)
+    return env_snapshots.list_snapshots(instance_conf_dir)
+
+@router.post("/instances/{instance_id}/snapshots", tags=["Instance Actions"])
+def create_env_snapshot(instance_id: int, db: Session = Depends(get_db)):
+    """Snapshots and archives the instance env now, as a background job."""
+    db_instance, _, _ = _get_env_owner_or_error(db, instance_id)
+    job_id = jobs.submit("env_snapshot", {"instance_id": db_instance.id, "reason": "manual", "force": True}, instance_id=db_instance.id)
+    return {"job_id": job_id}
+
+@router.get("/instances/{instance_id}/snapshots/diff", tags=["Instance Actions"])
+def diff_env_snapshots(instance_id: int, from_id: str, to_id: str | None = None, db: Session = Depends(get_db)):
+    """Diffs the packages of two snapshots. Without to_id, compares with the current env."""
+    _, instance_conf_dir, env_path = _get_env_owner_or_error(db, instance_id)
+    old = env_snapshots.load_snapshot(instance_conf_dir, from_id)
+    if not old:
+        raise HTTPException(status_code=404, detail=f"Snapshot '{from_id}' not found.")
+    if to_id:
+        new = env_snapshots.load_snapshot(instance_conf_dir, to_id)
+        if not new:
+            raise HTTPException(status_code=404, detail=f"Snapshot '{to_id}' not found.")
+        new_packages = new["packages"]
+    else:
+        new_packages = env_snapshots.read_packages(env_path)
+    return {"from": from_id, "to": to_id or "current", **env_snapshots.diff_packages(old["packages"], new_packages)}
+
+@router.post("/instances/{instance_id}/snapshots/{snapshot_id}/rollback", tags=["Instance Actions"])
+def rollback_env_snapshot(instance_id: int, snapshot_id: str, db: Session = Depends(get_db)):
+    """Restores the instance env from a snapshot archive, as a background job. The instance must be stopped."""
+    db_instance, instance_conf_dir, _ = _get_env_owner_or_error(db, instance_id)
+    if db_instance.status != "stopped":
+        raise HTTPException(status_code=400, detail="Stop the instance before rolling back its environment.")
+    snapshot = next((s for s in env_snapshots.list_snapshots(instance_conf_dir) if s["id"] == snapshot_id), None)
+    if not snapshot:
+        raise HTTPException(status_code=404, detail=f"Snapshot '{snapshot_id}' not found.")
+    if not snapshot["restorable"]:
+        raise HTTPException(status_code=409, detail=f"Snapshot '{snapshot_id}' has no archive; only its package list was kept.")
+    job_id = jobs.submit("env_rollback", {"instance_id": db_instance.id, "snapshot_id": snapshot_id}, instance_id=db_instance.id)
+    return {"job_id": job_id}
+
+@router.delete("/instances/{instance_id}/snapshots/{snapshot_id}", tags=["Instance Actions"])
+def delete_env_snapshot(instance_id: int, snapshot_id: str, db: Session = Depends(get_db)):
+    _, instance_conf_dir, _ = _get_env_owner_or_error(db, instance_id)
+    try:
+        env_snapshots.delete_snapshot(instance_conf_dir, snapshot_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Snapshot '{snapshot_id}' not found.")
+    return {"ok": True}
+
+@router.get("/instances/{instance_id}/disk-usage", tags=["Instance Actions"])
+def get_instance_disk_usage(instance_id: int, db: Session = Depends(get_db)):
+    """
+    Disk usage of an instance split into env, repos, models, logs, other and outputs,
+    with its quota state. Served from the background index (sizes are None until indexed).
+    """
+    db_instance = crud.get_instance(db, instance_id=instance_id)
+    if not db_instance:
+        raise HTTPException(status_code=404, detail="Instance not found")
+    return process_manager.get_instance_disk_usage(db, db_instance)
+
+@router.get("/instances/{instance_id}/prewarm", tags=["Instance Actions"])
+def get_instance_prewarm(instance_id: int, db: Session = Depends(get_db)):
+    """
+    Pre-warm state of an instance and how much of its model files (recently used or
+    declared by the blueprint) is currently in the page cache.
+    """
+    db_instance = crud.get_instance(db, instance_id=instance_id)
+    if not db_instance:
+        raise HTTPException(status_code=404, detail="Instance not found")
+    owner = db_instance
+    if db_instance.parent_instance_id is not None:
+        owner = crud.get_instance(db, instance_id=db_instance.parent_instance_id) or db_instance
+    instance_conf_dir = os.path.join(INSTANCES_DIR, owner.name)
+    return prewarm_manager.report(db_instance.id, instance_conf_dir, process_manager.get_prewarm_patterns(owner, instance_conf_dir))
+
 @router.post("/instances/{instance_id}/stop", response_model=schemas.Instance, tags=["Instance Actions"])
 def stop_instance(instance_id: int, db: Session = Depends(get_db)):
     db_instance = crud.get_instance(db, instance_id=instance_id)
@@ -492,59 +616,123 @@ def version_check(instance_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Failed to run version check: {str(e)}")
 
 # --- HELPER FUNCTION FOR BACKGROUND DELETION ---
-def _on_rm_error(func, path, exc):
-    """
-    Error handler for shutil.rmtree (Python 3.12+ signature).
-    If the error is due to read-only access, change the file mode and retry.
-    """
-    try:
-        # Check if the file is read-only
-        if not os.access(path, os.W_OK):
-            os.chmod(path, stat.S_IWUSR)
-            func(path)
-        else:
-            # Re-raise the original exception if it wasn't a permission issue
-            raise exc
-    except Exception as e:
-        print(f"[Deletion-Error] Failed to force delete '{path}': {e}")
-
-def _background_file_deletion(instance_name: str, mode: str, overwrite: bool):
+def _background_file_deletion(instance_name: str, mode: str, overwrite: bool, instance_row: dict | None = None):
     """
     Deletes or moves instance files in the background to avoid blocking the API response.
+    Both modes only rename directories; actual deletion is done by the trashcan purger
+    thread at idle I/O priority.
     """
     instance_dir = os.path.join(INSTANCES_DIR, instance_name)
-    TRASH_DIR = os.path.join(os.path.dirname(INSTANCES_DIR), "trashcan")
-    trash_path = os.path.join(TRASH_DIR, instance_name)
+    trash_path = trashcan.entry_path(instance_name)
 
     try:
         if mode == "permanent":
             if os.path.isdir(instance_dir):
                 print(f"[Background-Delete] Permanently deleting '{instance_name}'...")
-                # Use the new robust error handler
-                shutil.rmtree(instance_dir, onexc=_on_rm_error)
+                try:
+                    trashcan.schedule_purge(instance_dir)
+                except OSError:
+                    # Not on the trashcan filesystem: delete in place, still throttled and at idle priority
+                    lower_current_thread_priority()
+                    throttled_rmtree(instance_dir)
         elif mode == "trash":
             if os.path.isdir(instance_dir):
-                os.makedirs(TRASH_DIR, exist_ok=True)
                 if os.path.exists(trash_path) and overwrite:
                     print(f"[Background-Delete] Overwriting trashcan entry for '{instance_name}'...")
-                    shutil.rmtree(trash_path, onexc=_on_rm_error)
+                    trashcan.purge(instance_name)
                 
                 # Check again if destination exists
                 if not os.path.exists(trash_path):
                      print(f"[Background-Delete] Moving '{instance_name}' to trashcan...")
-                     shutil.move(instance_dir, TRASH_DIR)
+                     trashcan.move_to_trash(instance_dir, instance_name, instance_row)
         
+        disk_index.request_scan()
         print(f"[Background-Delete] Cleanup for '{instance_name}' completed.")
         
     except Exception as e:
         print(f"[Background-Delete-ERROR] Failed to process files for '{instance_name}': {e}")
+        raise
+
+
+# --- BACKGROUND JOB HANDLERS (see core/jobs.py) ---
+
+def _delete_job(job, params: dict):
+    lower_current_thread_priority()
+    job.progress(0.0, f"Removing files of '{params['instance_name']}'...", force=True)
+    # Last point where a cancel is honored: the deletion itself is a single rename
+    job.check_cancelled()
+    _background_file_deletion(params["instance_name"], params["mode"], params["overwrite"], params.get("instance_row"))
+
+def _copy_job(job, params: dict):
+    lower_current_thread_priority()
+    crud.process_background_copy(params["new_instance_id"], params["source_instance_id"], job=job)
+
+def _rebuild_job(job, params: dict):
+    with SessionLocal() as db:
+        db_instance = crud.get_instance(db, instance_id=params["instance_id"])
+        if not db_instance:
+            raise ValueError(f"Instance {params['instance_id']} not found.")
+        job.progress(0.0, f"Rebuilding environment of '{db_instance.name}'...", force=True)
+        process_manager.rebuild_instance_env(db=db, instance=db_instance)
+
+def _venv_command_job(job, params: dict):
+    with SessionLocal() as db:
+        db_instance = crud.get_instance(db, instance_id=params["instance_id"])
+        if not db_instance:
+            raise ValueError(f"Instance {params['instance_id']} not found.")
+        command, cwd = process_manager.build_venv_command(db_instance, params["command"])
+        job.progress(0.0, f"Running '{params['command']}' in '{db_instance.name}'...", force=True)
+        job.log(f"$ {params['command']}")
+        try:
+            result = job.run(command, log_output=True, cwd=cwd)
+            cache_manager.record_install_log(jobs.read_log(job.job_id)[0])
+        finally:
+            if params.get("start_after"):
+                db.refresh(db_instance)
+                if db_instance.status == "stopped":
+                    print(f"Restarting instance '{db_instance.name}' after disruptive update.")
+                    process_manager.start_instance_process(db=db, instance=db_instance)
+        if result.returncode != 0:
+            raise RuntimeError(f"Command exited with code {result.returncode}.")
+
+def _env_snapshot_job(job, params: dict):
+    lower_current_thread_priority()
+    with SessionLocal() as db:
+        db_instance = crud.get_instance(db, instance_id=params["instance_id"])
+        if not db_instance:
+            raise ValueError(f"Instance {params['instance_id']} not found.")
+        instance_conf_dir, env_path = process_manager.get_instance_env_path(db_instance)
+    if not env_path:
+        return
+    job.progress(0.0, "Recording environment snapshot...", force=True)
+    snapshot = env_snapshots.take_snapshot(instance_conf_dir, env_path, reason=params.get("reason", "start"),
+                                           force=params.get("force", False), job=job)
+    job.progress(1.0, f"Snapshot '{snapshot['id']}' recorded." if snapshot else "Environment unchanged since the last snapshot.", force=True)
+
+def _env_rollback_job(job, params: dict):
+    with SessionLocal() as db:
+        db_instance = crud.get_instance(db, instance_id=params["instance_id"])
+        if not db_instance:
+            raise ValueError(f"Instance {params['instance_id']} not found.")
+        if db_instance.status != "stopped":
+            raise RuntimeError("The instance must be stopped to roll back its environment.")
+        instance_conf_dir, env_path = process_manager.get_instance_env_path(db_instance)
+    job.progress(0.0, f"Restoring snapshot '{params['snapshot_id']}'...", force=True)
+    env_snapshots.restore_snapshot(instance_conf_dir, env_path, params["snapshot_id"], job=job)
+
+jobs.register("instance_delete", _delete_job, max_concurrent=2)
+jobs.register("venv_command", _venv_command_job, max_concurrent=2)
+jobs.register("instance_copy", _copy_job, max_concurrent=1,
+              on_interrupted=lambda params: crud.mark_interrupted_copy(params["new_instance_id"]))
+jobs.register("instance_rebuild", _rebuild_job, max_concurrent=2)
+jobs.register("env_snapshot", _env_snapshot_job, max_concurrent=1)
+jobs.register("env_rollback", _env_rollback_job, max_concurrent=1)
 
 
 @router.delete("/instances/{instance_id}", status_code=200, tags=["Instance Actions"])
 def delete_instance(
     instance_id: int, 
     options: DeleteOptions, 
-    background_tasks: BackgroundTasks, # <--- Added for background processing
     db: Session = Depends(get_db)
 ):
     db_instance = crud.get_instance(db, instance_id=instance_id)
@@ -562,8 +750,9 @@ def delete_instance(
         )
 
     instance_name = db_instance.name
-    TRASH_DIR = os.path.join(os.path.dirname(INSTANCES_DIR), "trashcan")
-    trash_path = os.path.join(TRASH_DIR, instance_name)
+    trash_path = trashcan.entry_path(instance_name)
+    # Saved with the trashcan entry so that a restore can recreate the instance
+    instance_row = {column.name: getattr(db_instance, column.name) for column in models.Instance.__table__.columns}
 
     # Pre-check for trash conflicts to return error immediately (if not overwriting)
     if options.mode == "trash" and not options.overwrite and os.path.exists(trash_path) and os.path.isdir(os.path.join(INSTANCES_DIR, instance_name)):
@@ -575,10 +764,12 @@ def delete_instance(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database deletion failed: {e}")
 
-    # 2. SCHEDULE FILE OPS IN BACKGROUND (No blocking)
-    background_tasks.add_task(_background_file_deletion, instance_name, options.mode, options.overwrite)
+    # 2. SCHEDULE FILE OPS AS A BACKGROUND JOB (No blocking)
+    job_id = jobs.submit("instance_delete", {
+        "instance_name": instance_name, "mode": options.mode, "overwrite": options.overwrite, "instance_row": instance_row
+    }, instance_id=instance_id)
     
-    return {"ok": True, "detail": "Instance deleted successfully."}
+    return {"ok": True, "detail": "Instance deleted successfully.", "job_id": job_id}
 
 @router.get("/instances/{instance_id}/logs", tags=["Instance Actions"])
 def get_instance_logs(
@@ -778,10 +969,40 @@ def _clean_wheel_name(filename: str) -> str:
     to restore PEP 425 compatibility for pip.
     Example: sage..._x86_64+arch8.9.whl -> sage..._x86_64.whl
     """
-    return re.sub(r'\+arch[\d\.]+(?=\.whl)', '', filename)
+    return re.sub(r'\+arch[\d\._]+(?=\.whl)', '', filename)
+
+def _get_instance_env_probe(db: Session, db_instance: models.Instance) -> dict | None:
+    """
+    Returns the cached env probe (python tag, torch and CUDA versions) of an instance.
+    Satellites share their parent's environment, so the parent is probed instead.
+    """
+    instance_file_path, _ = get_instance_file_path(db, db_instance)
+    effective_conf_dir = os.path.dirname(instance_file_path)
+    metadata = process_manager._get_instance_venv_metadata(db_instance, effective_conf_dir)
+    venv_path = metadata.get('venv_path')
+    if not venv_path:
+        return None
+    env_path = os.path.normpath(os.path.join(effective_conf_dir, venv_path))
+    cache_path = os.path.join(effective_conf_dir, env_probe.PROBE_CACHE_FILENAME)
+    return env_probe.probe_env(env_path, cache_path)
+
+def _evaluate_global_wheels(db: Session, db_instance: models.Instance) -> dict:
+    """
+    Evaluates every global wheel against the instance environment and GPUs.
+    Returns a dict mapping global filenames to their evaluation.
+    """
+    manifest = get_manifest()
+    env = _get_instance_env_probe(db, db_instance)
+    gpu_archs = wheel_compat.get_gpu_archs(db_instance.gpu_ids)
+
+    evaluations = {}
+    for p in glob.glob(os.path.join(GLOBAL_WHEELS_DIR, "*.whl")):
+        fname = os.path.basename(p)
+        evaluations[fname] = wheel_compat.evaluate_wheel(fname, manifest.get(fname, {}), env, gpu_archs)
+    return evaluations
 
 @router.get("/instances/{instance_id}/wheels", response_model=List[InstanceWheel], tags=["Instance Assets"])
-def get_instance_wheels(instance_id: int, db: Session = Depends(get_db)):
+def get_instance_wheels(instance_id: int, compatible_only: bool = False, db: Session = Depends(get_db)):
     db_instance = crud.get_instance(db, instance_id=instance_id)
     if not db_instance:
         raise HTTPException(status_code=404, detail="Instance not found")
@@ -790,8 +1011,8 @@ def get_instance_wheels(instance_id: int, db: Session = Depends(get_db)):
     instance_dir = os.path.join(INSTANCES_DIR, db_instance.name)
     local_wheels_dir = os.path.join(instance_dir, "wheels")
     
-    # 1. List Global Wheels (Source of Truth - with suffix)
-    global_files = glob.glob(os.path.join(GLOBAL_WHEELS_DIR, "*.whl"))
+    # 1. List Global Wheels (Source of Truth - with suffix) and their compatibility
+    evaluations = _evaluate_global_wheels(db, db_instance)
     
     # 2. List Local Wheels (Current State - cleaned names)
     local_filenames = set()
@@ -800,8 +1021,8 @@ def get_instance_wheels(instance_id: int, db: Session = Depends(get_db)):
 
     result = []
     
-    for p in global_files:
-        fname = os.path.basename(p) # This has +arch suffix
+    for fname, evaluation in evaluations.items():
+        p = os.path.join(GLOBAL_WHEELS_DIR, fname) # fname has the +arch suffix
         try:
             size_mb = round(os.path.getsize(p) / (1024 * 1024), 2)
         except OSError:
@@ -810,15 +1031,21 @@ def get_instance_wheels(instance_id: int, db: Session = Depends(get_db)):
         # Check if the CLEAN version exists locally
         clean_name = _clean_wheel_name(fname)
         is_installed = clean_name in local_filenames
+
+        # Installed wheels are always listed so that incompatible ones can be removed
+        if compatible_only and not is_installed and evaluation["compatibility"] == "incompatible":
+            continue
             
         result.append({
             "filename": fname,
             "size_mb": size_mb,
-            "installed": is_installed
+            "installed": is_installed,
+            "compatibility": evaluation["compatibility"],
+            "compat_issues": evaluation["issues"]
         })
         
-    # Sort: Installed first, then by name
-    result.sort(key=lambda x: (not x['installed'], x['filename']))
+    # Sort: Installed first, then by compatibility rank, then by name
+    result.sort(key=lambda x: (not x['installed'], wheel_compat.COMPAT_RANK.get(x['compatibility'], 99), x['filename']))
     return result
 
 @router.post("/instances/{instance_id}/wheels", tags=["Instance Assets"])
@@ -854,24 +1081,82 @@ def sync_instance_wheels(
         # Security check
         if ".." in fname or "/" in fname or "\\" in fname:
             continue
+        _copy_global_wheel(fname, local_wheels_dir)
             
-        src_path = os.path.join(GLOBAL_WHEELS_DIR, fname)
-        
-        # Determine clean destination name
-        clean_name = _clean_wheel_name(fname)
-        dst_path = os.path.join(local_wheels_dir, clean_name)
-        
-        if os.path.exists(src_path):
-            if not os.path.exists(dst_path):
-                try:
-                    shutil.copy2(src_path, dst_path)
-                except OSError as e:
-                     raise HTTPException(status_code=500, detail=f"Failed to copy {fname}: {e}")
-            else:
-                # File exists locally. Should we update it?
-                # Simple logic: if global is newer/different size?
-                # For now, assume immutable unless deleted. 
-                # To force update, user can uncheck -> apply -> check -> apply.
-                pass
-            
-    return {"ok": True, "detail": "Wheels synchronized successfully."}
\ No newline at end of file
+    return {"ok": True, "detail": "Wheels synchronized successfully."}
+
+def _copy_global_wheel(fname: str, local_wheels_dir: str) -> bool:
+    """
+    Copies a global wheel into an instance wheels dir under its clean (PEP 427) name.
+    Returns True if a file was copied, False if it was missing or already present.
+    """
+    src_path = os.path.join(GLOBAL_WHEELS_DIR, fname)
+    dst_path = os.path.join(local_wheels_dir, _clean_wheel_name(fname))
+
+    if not os.path.exists(src_path) or os.path.exists(dst_path):
+        # Local files are assumed immutable unless deleted.
+        # To force update, user can uncheck -> apply -> check -> apply.
+        return False
+    try:
+        shutil.copy2(src_path, dst_path)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to copy {fname}: {e}")
+    return True
+
+@router.post("/instances/{instance_id}/wheels/sync-compatible", tags=["Instance Assets"])
+def sync_compatible_instance_wheels(instance_id: int, db: Session = Depends(get_db)):
+    """
+    Installs every global wheel that is fully compatible with the instance in one call.
+    When several compatible wheels exist for the same project, the most recently built
+    one wins and replaces any other local wheel of that project. Wheels that are
+    incompatible, only partially compatible or cannot be evaluated are skipped.
+    """
+    db_instance = crud.get_instance(db, instance_id=instance_id)
+    if not db_instance:
+        raise HTTPException(status_code=404, detail="Instance not found")
+
+    local_wheels_dir = os.path.join(INSTANCES_DIR, db_instance.name, "wheels")
+    os.makedirs(local_wheels_dir, exist_ok=True)
+
+    evaluations = _evaluate_global_wheels(db, db_instance)
+
+    # 1. Pick the newest compatible wheel per project
+    selected = {}
+    skipped = []
+    for fname, evaluation in evaluations.items():
+        parsed = wheel_compat.parse_wheel_filename(fname)
+        if not parsed or evaluation["compatibility"] != "compatible":
+            skipped.append({"filename": fname, "compatibility": evaluation["compatibility"], "issues": evaluation["issues"]})
+            continue
+        mtime = os.path.getmtime(os.path.join(GLOBAL_WHEELS_DIR, fname))
+        current = selected.get(parsed["project"])
+        if current is None or mtime > current[1]:
+            if current is not None:
+                skipped.append({"filename": current[0], "compatibility": "compatible", "issues": ["A newer compatible build of this project was selected."]})
+            selected[parsed["project"]] = (fname, mtime)
+        else:
+            skipped.append({"filename": fname, "compatibility": "compatible", "issues": ["A newer compatible build of this project was selected."]})
+
+    # 2. Replace other local wheels of the selected projects, then copy
+    selected_clean_names = {_clean_wheel_name(fname) for fname, _ in selected.values()}
+    removed = []
+    for fpath in glob.glob(os.path.join(local_wheels_dir, "*.whl")):
+        local_fname = os.path.basename(fpath)
+        parsed = wheel_compat.parse_wheel_filename(local_fname)
+        if parsed and parsed["project"] in selected and local_fname not in selected_clean_names:
+            try:
+                os.remove(fpath)
+                removed.append(local_fname)
+            except OSError as e:
+                print(f"[Wheels-Sync] Failed to remove {local_fname}: {e}")
+
+    copied = [fname for fname, _ in selected.values() if _copy_global_wheel(fname, local_wheels_dir)]
+
+    print(f"[Wheels-Sync] '{db_instance.name}': {len(copied)} compatible wheel(s) copied, {len(removed)} replaced, {len(skipped)} skipped.")
+    return {
+        "ok": True,
+        "copied": copied,
+        "already_installed": [fname for fname, _ in selected.values() if fname not in copied],
+        "removed": removed,
+        "skipped": skipped
+    }
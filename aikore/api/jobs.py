@@ -0,0 +1,93 @@
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+import asyncio
+
+from ..core.jobs import jobs
+
+router = APIRouter(
+    prefix="/api/jobs",
+    tags=["Jobs"]
+)
+
+
+@router.get("/")
+def list_jobs(status: str | None = None, kind: str | None = None, instance_id: int | None = None, limit: int = 100):
+    """Lists background jobs, most recent first."""
+    return jobs.list(status=status, kind=kind, instance_id=instance_id, limit=min(max(limit, 1), 1000))
+
+
+@router.get("/{job_id}")
+def get_job(job_id: int):
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/{job_id}/log")
+def get_job_log(job_id: int, offset: int = 0):
+    """Returns the job log from a byte offset, with the same shape as the instance logs endpoint."""
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    content, size = jobs.read_log(job_id, offset)
+    return {"content": content, "size": size, "status": job["status"]}
+
+
+@router.websocket("/{job_id}/stream")
+async def stream_job_log(websocket: WebSocket, job_id: int, offset: int = 0):
+    """
+    Streams the job log as it is written, replaying it from a byte offset, then sends
+    the final job state as JSON. Sending {"action": "cancel"} cancels the job.
+    """
+    await websocket.accept()
+    job = jobs.get(job_id)
+    if not job:
+        await websocket.send_json({"error": "Job not found"})
+        await websocket.close()
+        return
+
+    async def _listen_for_cancel():
+        while True:
+            message = await websocket.receive_json()
+            if isinstance(message, dict) and message.get("action") == "cancel":
+                jobs.cancel(job_id)
+
+    listener = asyncio.create_task(_listen_for_cancel())
+    log_stream = jobs.stream(job_id, offset)
+    try:
+        while True:
+            # Waits for the next chunk or for the listener, which only ends when the client went away
+            next_chunk = asyncio.ensure_future(log_stream.__anext__())
+            await asyncio.wait({next_chunk, listener}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_chunk.done():
+                next_chunk.cancel()
+                await asyncio.gather(next_chunk, return_exceptions=True)
+                break
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                await websocket.send_json(jobs.get(job_id))
+                break
+            await websocket.send_text(chunk)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        listener.cancel()
+        # Retrieves the listener's exception (WebSocketDisconnect) or cancellation
+        await asyncio.gather(listener, return_exceptions=True)
+        await log_stream.aclose()
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+
+@router.delete("/{job_id}")
+def cancel_job(job_id: int):
+    """Cancels a queued or running job."""
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is not active (status: '{job['status']}').")
+    return {"ok": True, "detail": f"Cancellation of job {job_id} requested."}
@@ -0,0 +1,74 @@
+from fastapi import APIRouter, HTTPException
+
+from ..core import model_dedup, model_index
+from ..core.jobs import jobs
+
+router = APIRouter(
+    prefix="/api/models",
+    tags=["Models"]
+)
+
+
+# --- INVENTORY (see core/model_index.py) ---
+
+def _index_job(job, params: dict):
+    job.progress(0.0, "Indexing model files...", force=True)
+    index = model_index.build_index(job)
+    job.progress(1.0, f"{len(index['models'])} model files indexed.", force=True)
+
+jobs.register("model_index", _index_job, max_concurrent=1)
+
+
+@router.get("/")
+def list_models(architecture: str | None = None, dtype: str | None = None, instance: str | None = None,
+                search: str | None = None, min_size_gb: float = 0):
+    """
+    Lists the indexed models, largest first. Filters: architecture hint and path
+    substrings, exact dtype, and the name of an instance that references the model.
+    """
+    return model_index.list_models(architecture=architecture, dtype=dtype, instance=instance,
+                                   search=search, min_size_bytes=int(min_size_gb * 1024 ** 3))
+
+
+@router.post("/index")
+def rebuild_model_index():
+    """Rebuilds the model index as a background job (only new or modified files are parsed)."""
+    if any(jobs.list(status=status, kind="model_index", limit=1) for status in ("queued", "running")):
+        raise HTTPException(status_code=409, detail="The model index is already being rebuilt.")
+    return {"job_id": jobs.submit("model_index")}
+
+
+# --- DEDUPLICATION (see core/model_dedup.py) ---
+
+def _dedup_job(job, params: dict):
+    dry_run = params.get("dry_run", True)
+    job.progress(0.0, "Scanning model files...", force=True)
+    report = model_dedup.run(job, dry_run=dry_run)
+    reclaimable_gb = report["reclaimable_bytes"] / 1024 ** 3
+    if dry_run:
+        job.progress(1.0, f"{len(report['groups'])} duplicate groups, {reclaimable_gb:.2f} GB reclaimable.", force=True)
+    else:
+        result = report["result"]
+        job.progress(1.0, f"Replaced {result['replaced']} duplicates, reclaimed {result['reclaimed_bytes'] / 1024 ** 3:.2f} GB.", force=True)
+
+jobs.register("model_dedup", _dedup_job, max_concurrent=1)
+
+
+@router.post("/dedup")
+def start_model_dedup(dry_run: bool = True):
+    """
+    Scans the model files under /config for duplicates as a background job. Unless
+    dry_run, duplicates are replaced by reflinks (or hardlinks) of a single copy.
+    """
+    if any(jobs.list(status=status, kind="model_dedup", limit=1) for status in ("queued", "running")):
+        raise HTTPException(status_code=409, detail="A model deduplication is already queued or running.")
+    return {"job_id": jobs.submit("model_dedup", {"dry_run": dry_run})}
+
+
+@router.get("/dedup")
+def get_model_dedup_report():
+    """Returns the report of the last deduplication scan."""
+    report = model_dedup.load_report()
+    if report is None:
+        raise HTTPException(status_code=404, detail="No deduplication scan has been run yet.")
+    return report
@@ -14,6 +14,10 @@ from sqlalchemy.orm import Session
 import re
 
 from ..core.process_manager import BLUEPRINTS_DIR, CUSTOM_BLUEPRINTS_DIR
+from ..core.disk_usage import disk_index
+from ..core.cache_manager import cache_manager
+from ..config import INSTANCES_DIR, OUTPUTS_DIR
+from .builder import get_builder_env_dirs
 from ..database import crud
 from ..database.session import SessionLocal, get_db
 
@@ -118,6 +122,48 @@ def get_system_info():
         info["gpu_count"] = 0
     return info
 
+def _get_disk_usage() -> dict:
+    """
+    Disk usage from the background index (never walks the disk). Sizes are None
+    for directories the indexer has not reached yet.
+    """
+    def _bytes(path):
+        usage = disk_index.get_usage(path)
+        return usage["bytes"] if usage else None
+
+    builder_envs = {}
+    for envs_dir in get_builder_env_dirs():
+        for name in disk_index.list_children(envs_dir):
+            if name.startswith("builder_py"):
+                builder_envs[name] = _bytes(os.path.join(envs_dir, name))
+
+    return {
+        "instances": {name: _bytes(os.path.join(INSTANCES_DIR, name)) for name in disk_index.list_children(INSTANCES_DIR)},
+        "builder_envs": builder_envs,
+        "outputs": _bytes(OUTPUTS_DIR),
+        "scanned_at": disk_index.last_scan
+    }
+
+@router.get("/disk-usage")
+def get_disk_usage():
+    """
+    Retrieves per-instance, per-builder-env and outputs disk usage from the background index.
+    """
+    return _get_disk_usage()
+
+@router.get("/caches")
+def get_cache_stats():
+    """
+    Size, cap, hit/miss counters and evictions of the managed caches (package downloads...).
+    Sizes are measured by the hourly eviction pass.
+    """
+    return cache_manager.stats()
+
+@router.post("/caches/gc")
+def run_cache_gc():
+    """Runs an LRU eviction pass now. Returns the bytes evicted per cache."""
+    return {"evicted_bytes": cache_manager.gc()}
+
 @router.get("/stats")
 def get_system_stats():
     """
@@ -134,7 +180,8 @@ def get_system_stats():
             "used": psutil.virtual_memory().used,
             "percent": psutil.virtual_memory().percent
         },
-        "gpus": []
+        "gpus": [],
+        "disk": _get_disk_usage()
     }
 
     try:
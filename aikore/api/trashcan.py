@@ -0,0 +1,89 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.orm import Session
+import os
+
+from ..database import crud, models
+from ..database.session import get_db
+from ..core.trashcan import trashcan
+from ..core.process_manager import INSTANCES_DIR
+from .instances import _allocate_ports
+
+router = APIRouter(
+    prefix="/api/trashcan",
+    tags=["Trashcan"]
+)
+
+# Columns that describe the runtime state of an instance, not its configuration
+_RUNTIME_COLUMNS = {"id", "status", "pid", "port", "persistent_port", "persistent_display"}
+
+
+def _get_entry_or_404(name: str) -> str:
+    safe_name = os.path.basename(name)  # Prevent directory traversal
+    if not safe_name or safe_name.startswith(".") or not os.path.isdir(trashcan.entry_path(safe_name)):
+        raise HTTPException(status_code=404, detail=f"'{name}' not found in trashcan.")
+    return safe_name
+
+
+@router.get("/")
+def list_trashcan():
+    """Lists trashcan entries, oldest first, with their size from the disk index."""
+    return trashcan.list()
+
+
+@router.post("/{name}/restore")
+def restore_trashcan_entry(name: str, db: Session = Depends(get_db)):
+    """
+    Moves an entry back to the instances directory (a rename) and recreates its
+    database row from the metadata saved at deletion time. Ports are reallocated.
+    """
+    safe_name = _get_entry_or_404(name)
+    metadata = trashcan.read_metadata(safe_name)
+    instance_row = (metadata or {}).get("instance")
+    if not instance_row:
+        raise HTTPException(status_code=409, detail=f"'{safe_name}' has no saved instance metadata and cannot be restored automatically.")
+    if crud.get_instance_by_name(db, name=safe_name):
+        raise HTTPException(status_code=409, detail=f"An instance named '{safe_name}' already exists.")
+    instance_dir = os.path.join(INSTANCES_DIR, safe_name)
+    if os.path.exists(instance_dir):
+        raise HTTPException(status_code=409, detail=f"Directory '{safe_name}' already exists in the instances folder.")
+
+    columns = {column.name for column in models.Instance.__table__.columns}
+    fields = {k: v for k, v in instance_row.items() if k in columns and k not in _RUNTIME_COLUMNS}
+    if fields.get("parent_instance_id") and not crud.get_instance(db, instance_id=fields["parent_instance_id"]):
+        fields["parent_instance_id"] = None
+
+    alloc = _allocate_ports(db, bool(fields.get("persistent_mode")), None)
+    try:
+        trashcan.restore_files(safe_name, instance_dir)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to move '{safe_name}' out of the trashcan: {e}")
+
+    db_instance = models.Instance(
+        **fields,
+        status="stopped",
+        port=alloc["port"],
+        persistent_port=alloc["persistent_port"],
+        persistent_display=alloc["persistent_display"]
+    )
+    db.add(db_instance)
+    db.commit()
+    db.refresh(db_instance)
+    print(f"[Trashcan] Restored instance '{safe_name}' (new ID: {db_instance.id}).")
+    return {"ok": True, "instance_id": db_instance.id}
+
+
+@router.delete("/{name}")
+def purge_trashcan_entry(name: str):
+    """Deletes an entry for good (in the background, at idle I/O priority)."""
+    safe_name = _get_entry_or_404(name)
+    try:
+        trashcan.purge(safe_name)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to purge '{safe_name}': {e}")
+    return {"ok": True, "detail": f"'{safe_name}' scheduled for deletion."}
+
+
+@router.post("/gc")
+def run_trashcan_gc():
+    """Applies the retention policy now."""
+    return {"purged": trashcan.gc()}
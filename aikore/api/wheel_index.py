@@ -0,0 +1,225 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse
+from urllib.parse import quote
+import os
+import re
+import html
+import json
+import glob
+import hashlib
+import threading
+
+from aikore.core import wheel_compat
+from .builder import WHEELS_DIR, get_manifest
+
+# PEP 503 "simple" repository over the global wheel store, so pip can resolve the
+# compiled wheels directly (--extra-index-url) instead of copying them into instances.
+#
+#   /api/wheels/simple/                     all wheels
+#   /api/wheels/arch/{arch}/simple/         only wheels built for {arch} ('8.9', or '8.6_8.9'
+#                                           when every listed arch must be covered)
+#   /api/wheels/stack/{stack}/simple/       only wheels built against the torch major.minor and
+#                                           CUDA major of {stack} ('torch2.7-cu12', or 'torch2.7')
+#   /api/wheels/arch/{arch}/{stack}/simple/ both filters (the URL given to instances)
+#
+# Stored files carry a '+archX.Y' suffix that is not a valid wheel name for pip, so links
+# point at /api/wheels/files/<stored name>/<clean name>: pip sees the clean name, the
+# server serves the stored file (FileResponse, Range requests supported).
+router = APIRouter(prefix="/api/wheels", tags=["Wheel Index"])
+
+# sha256 of each wheel, keyed by filename and invalidated by size/mtime changes
+HASHES_FILE = os.path.join(WHEELS_DIR, ".wheel_hashes.json")
+_hashes_lock = threading.Lock()
+
+_ARCH_SCOPE_RE = re.compile(r'^\d+\.\d+(_\d+\.\d+)*$')
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _get_wheel_hashes(filenames: list) -> dict:
+    """Returns {filename: sha256}, hashing only new or modified wheels."""
+    with _hashes_lock:
+        try:
+            with open(HASHES_FILE, 'r') as f:
+                cache = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            cache = {}
+
+        result, changed = {}, False
+        for fname in filenames:
+            try:
+                st = os.stat(os.path.join(WHEELS_DIR, fname))
+            except OSError:
+                continue
+            entry = cache.get(fname)
+            if not entry or entry.get("size") != st.st_size or entry.get("mtime_ns") != st.st_mtime_ns:
+                entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": _file_sha256(os.path.join(WHEELS_DIR, fname))}
+                cache[fname] = entry
+                changed = True
+            result[fname] = entry["sha256"]
+
+        # Forget wheels that were deleted from the store
+        for fname in list(cache):
+            if not os.path.exists(os.path.join(WHEELS_DIR, fname)):
+                del cache[fname]
+                changed = True
+
+        if changed:
+            try:
+                with open(HASHES_FILE, 'w') as f:
+                    json.dump(cache, f, indent=4)
+            except OSError as e:
+                print(f"[Wheel-Index] Could not save wheel hashes: {e}")
+        return result
+
+
+def _build_index(arch_scope: str | None = None, stack_scope: str | None = None) -> dict:
+    """
+    Groups the store by normalized project name: {project: [{'stored', 'clean'}]}.
+    When several stored variants share a clean filename, the most specific one
+    for the requested (or local) GPU architectures wins. With a stack scope, wheels
+    built against another torch major.minor or CUDA major (the ABI checks of
+    wheel_compat.evaluate_wheel) are left out.
+    """
+    manifest = get_manifest()
+    required_archs = wheel_compat.parse_arch_list(arch_scope.replace("_", " ")) if arch_scope else wheel_compat.get_gpu_archs()
+    scope_env = wheel_compat.parse_stack_scope(stack_scope) if stack_scope else None
+
+    variants = {}
+    for path in glob.glob(os.path.join(WHEELS_DIR, "*.whl")):
+        fname = os.path.basename(path)
+        parsed = wheel_compat.parse_wheel_filename(fname)
+        if not parsed:
+            continue
+        archs = parsed["archs"] or wheel_compat.parse_arch_list(manifest.get(fname, {}).get("cuda_arch"))
+        covers = not archs or all(a in archs for a in required_archs)
+        if arch_scope and not covers:
+            continue
+        if scope_env and not wheel_compat.is_stack_compatible(manifest.get(fname, {}), scope_env):
+            continue
+        clean = wheel_compat.clean_wheel_filename(fname)
+        rank = (covers, -len(archs) if archs else -999, os.path.getmtime(path))
+        current = variants.get(clean)
+        if current is None or rank > current["rank"]:
+            variants[clean] = {"project": parsed["project"], "stored": fname, "clean": clean, "rank": rank}
+
+    index = {}
+    for entry in variants.values():
+        index.setdefault(entry["project"], []).append({"stored": entry["stored"], "clean": entry["clean"]})
+    for files in index.values():
+        files.sort(key=lambda e: e["clean"])
+    return index
+
+
+def _render_root(index: dict) -> HTMLResponse:
+    links = "\n".join(f'    <a href="{quote(project)}/">{html.escape(project)}</a><br/>' for project in sorted(index))
+    return HTMLResponse(
+        "<!DOCTYPE html>\n<html>\n  <head>\n    <meta name=\"pypi:repository-version\" content=\"1.0\">\n"
+        f"    <title>AiKore wheel index</title>\n  </head>\n  <body>\n{links}\n  </body>\n</html>\n"
+    )
+
+
+def _render_project(project: str, index: dict) -> HTMLResponse:
+    if project not in index:
+        raise HTTPException(status_code=404, detail=f"Project '{project}' not found in the wheel store.")
+    files = index[project]
+    hashes = _get_wheel_hashes([e["stored"] for e in files])
+    links = []
+    for entry in files:
+        href = f"/api/wheels/files/{quote(entry['stored'])}/{quote(entry['clean'])}"
+        if entry["stored"] in hashes:
+            href += f"#sha256={hashes[entry['stored']]}"
+        links.append(f'    <a href="{href}">{html.escape(entry["clean"])}</a><br/>')
+    return HTMLResponse(
+        "<!DOCTYPE html>\n<html>\n  <head>\n    <meta name=\"pypi:repository-version\" content=\"1.0\">\n"
+        f"    <title>Links for {html.escape(project)}</title>\n  </head>\n  <body>\n"
+        f"    <h1>Links for {html.escape(project)}</h1>\n" + "\n".join(links) + "\n  </body>\n</html>\n"
+    )
+
+
+def _validate_arch_scope(arch: str):
+    if not _ARCH_SCOPE_RE.match(arch):
+        raise HTTPException(status_code=400, detail="Invalid arch. Expected 'X.Y' or 'X.Y_X.Y'.")
+
+
+def _validate_stack_scope(stack: str):
+    if not wheel_compat.parse_stack_scope(stack):
+        raise HTTPException(status_code=400, detail="Invalid stack. Expected 'torchX.Y-cuN' or 'torchX.Y'.")
+
+
+def _scoped_project(base_url: str, project: str, arch: str | None = None, stack: str | None = None):
+    normalized = wheel_compat.normalize_project_name(project)
+    if normalized != project:
+        return RedirectResponse(url=f"{base_url}{quote(normalized)}/", status_code=301)
+    return _render_project(project, _build_index(arch, stack))
+
+
+# --- ENDPOINTS ---
+
+@router.get("/simple/", response_class=HTMLResponse)
+def simple_root():
+    return _render_root(_build_index())
+
+
+@router.get("/simple/{project}/", response_class=HTMLResponse)
+def simple_project(project: str):
+    normalized = wheel_compat.normalize_project_name(project)
+    if normalized != project:
+        return RedirectResponse(url=f"/api/wheels/simple/{quote(normalized)}/", status_code=301)
+    return _render_project(project, _build_index())
+
+
+@router.get("/arch/{arch}/simple/", response_class=HTMLResponse)
+def arch_simple_root(arch: str):
+    _validate_arch_scope(arch)
+    return _render_root(_build_index(arch))
+
+
+@router.get("/arch/{arch}/simple/{project}/", response_class=HTMLResponse)
+def arch_simple_project(arch: str, project: str):
+    _validate_arch_scope(arch)
+    normalized = wheel_compat.normalize_project_name(project)
+    if normalized != project:
+        return RedirectResponse(url=f"/api/wheels/arch/{arch}/simple/{quote(normalized)}/", status_code=301)
+    return _render_project(project, _build_index(arch))
+
+
+@router.get("/stack/{stack}/simple/", response_class=HTMLResponse)
+def stack_simple_root(stack: str):
+    _validate_stack_scope(stack)
+    return _render_root(_build_index(stack_scope=stack))
+
+
+@router.get("/stack/{stack}/simple/{project}/", response_class=HTMLResponse)
+def stack_simple_project(stack: str, project: str):
+    _validate_stack_scope(stack)
+    return _scoped_project(f"/api/wheels/stack/{stack}/simple/", project, stack=stack)
+
+
+@router.get("/arch/{arch}/{stack}/simple/", response_class=HTMLResponse)
+def arch_stack_simple_root(arch: str, stack: str):
+    _validate_arch_scope(arch)
+    _validate_stack_scope(stack)
+    return _render_root(_build_index(arch, stack))
+
+
+@router.get("/arch/{arch}/{stack}/simple/{project}/", response_class=HTMLResponse)
+def arch_stack_simple_project(arch: str, stack: str, project: str):
+    _validate_arch_scope(arch)
+    _validate_stack_scope(stack)
+    return _scoped_project(f"/api/wheels/arch/{arch}/{stack}/simple/", project, arch, stack)
+
+
+@router.get("/files/{stored_name}/{clean_name}")
+def download_indexed_wheel(stored_name: str, clean_name: str):
+    safe_name = os.path.basename(stored_name)  # Prevent directory traversal
+    path = os.path.join(WHEELS_DIR, safe_name)
+    if not safe_name.endswith(".whl") or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Wheel not found")
+    return FileResponse(path, filename=os.path.basename(clean_name), media_type="application/octet-stream")
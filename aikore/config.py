@@ -7,4 +7,10 @@ INSTANCES_DIR = "/config/instances"
 OUTPUTS_DIR = "/config/outputs"
 BLUEPRINTS_DIR = "/opt/sd-install/blueprints"
 CUSTOM_BLUEPRINTS_DIR = "/config/custom_blueprints"
-SCRIPTS_DIR = "/opt/sd-install/scripts"
\ No newline at end of file
+SCRIPTS_DIR = "/opt/sd-install/scripts"
+VERSIONS_ENV_FILE = "/opt/sd-install/versions.env"
+FUNCTIONS_SH_FILE = "/opt/sd-install/functions.sh"
+CACHE_DIR = "/config/cache"
+TRASH_DIR = "/config/trashcan"
+JOB_LOGS_DIR = "/config/job_logs"
+TMP_DIR = "/config/tmp"
@@ -0,0 +1,258 @@
+"""
+Persistent job queue for the Module Builder.
+
+Each build is a queued job with its own workspace and a log file on disk. Jobs run
+as asyncio tasks owned by the queue, not by the websocket that submitted them, so a
+closed browser tab no longer kills a long compile. Any number of clients can attach
+to a job's log and replay it from an arbitrary byte offset.
+"""
+import os
+import json
+import uuid
+import codecs
+import signal
+import shutil
+import asyncio
+import traceback
+from datetime import datetime
+
+# Statuses a job can no longer leave.
+FINISHED_STATUSES = ("success", "failed", "cancelled", "interrupted")
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class BuildJob:
+    """A single builder job: its configuration, lifecycle state and log file."""
+
+    def __init__(self, job_id: str, config: dict, log_path: str, workspace: str, status: str = "queued",
+                 created_at: str | None = None, started_at: str | None = None, finished_at: str | None = None,
+                 error: str | None = None, outputs: list | None = None):
+        self.id = job_id
+        self.config = config
+        self.log_path = log_path
+        self.workspace = workspace
+        self.status = status
+        self.created_at = created_at or datetime.now().isoformat(timespec="seconds")
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.error = error
+        self.outputs = outputs or []
+        # Runtime-only state
+        self.process = None
+        self.cancel_requested = False
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "config": self.config,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "outputs": self.outputs,
+            "log_path": self.log_path,
+            "workspace": self.workspace,
+            "log_size": os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BuildJob":
+        return cls(
+            job_id=data["id"],
+            config=data.get("config", {}),
+            log_path=data["log_path"],
+            workspace=data["workspace"],
+            status=data.get("status", "interrupted"),
+            created_at=data.get("created_at"),
+            started_at=data.get("started_at"),
+            finished_at=data.get("finished_at"),
+            error=data.get("error"),
+            outputs=data.get("outputs"),
+        )
+
+    def log(self, text: str):
+        """Appends text to the job log and wakes up every attached stream."""
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(text)
+        self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+class BuildQueue:
+    """
+    Runs BuildJobs through a runner coroutine with a bounded concurrency.
+    The job registry is persisted as JSON so that history and logs survive restarts.
+    """
+
+    def __init__(self, state_file: str, logs_dir: str, workspaces_dir: str, runner, max_concurrent: int = 1, history_size: int = 50):
+        self.state_file = state_file
+        self.logs_dir = logs_dir
+        self.workspaces_dir = workspaces_dir
+        self.runner = runner
+        self.max_concurrent = max(1, max_concurrent)
+        self.history_size = history_size
+        self.jobs = {}
+        self._tasks = {}
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        os.makedirs(self.logs_dir, exist_ok=True)
+        os.makedirs(self.workspaces_dir, exist_ok=True)
+        self._load()
+
+    # --- Persistence ---
+
+    def _load(self):
+        """Loads the registry. Jobs that were running when AiKore stopped are marked interrupted."""
+        try:
+            with open(self.state_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            data = []
+        for entry in data:
+            try:
+                job = BuildJob.from_dict(entry)
+            except KeyError:
+                continue
+            if job.status == "running":
+                job.status = "interrupted"
+                job.error = "AiKore stopped while this build was running."
+                job.finished_at = job.finished_at or datetime.now().isoformat(timespec="seconds")
+                shutil.rmtree(job.workspace, ignore_errors=True)
+            self.jobs[job.id] = job
+        self._save()
+
+    def _save(self):
+        entries = [job.to_dict() for job in self.jobs.values()]
+        tmp_path = f"{self.state_file}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f, indent=4)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            print(f"[Build-Queue] Could not persist job registry: {e}")
+
+    def _prune_history(self):
+        """Forgets the oldest finished jobs (and their logs) beyond history_size."""
+        finished = [job for job in self.jobs.values() if job.finished]
+        for job in finished[:max(0, len(finished) - self.history_size)]:
+            try:
+                os.remove(job.log_path)
+            except OSError:
+                pass
+            del self.jobs[job.id]
+
+    # --- Public interface ---
+
+    def resume(self):
+        """Schedules jobs left queued by a previous run. Must be called with a running event loop."""
+        for job in self.jobs.values():
+            if job.status == "queued" and job.id not in self._tasks:
+                self._tasks[job.id] = asyncio.create_task(self._run(job))
+
+    def submit(self, config: dict) -> BuildJob:
+        """Creates a job and schedules it. Must be called with a running event loop."""
+        job_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        job = BuildJob(
+            job_id=job_id,
+            config=config,
+            log_path=os.path.join(self.logs_dir, f"{job_id}.log"),
+            workspace=os.path.join(self.workspaces_dir, job_id),
+        )
+        self.jobs[job.id] = job
+        self._prune_history()
+        self._save()
+        position = sum(1 for j in self.jobs.values() if j.status == "queued")
+        job.log(f"\x1b[34m[INFO] Build job {job.id} queued (position {position}, max {self.max_concurrent} concurrent build(s)).\x1b[0m\r\n")
+        self._tasks[job.id] = asyncio.create_task(self._run(job))
+        return job
+
+    def get(self, job_id: str) -> BuildJob | None:
+        return self.jobs.get(job_id)
+
+    def list(self) -> list:
+        return sorted(self.jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a queued or running job. Returns False if the job is unknown or already finished."""
+        job = self.jobs.get(job_id)
+        if not job or job.finished:
+            return False
+        job.cancel_requested = True
+        job.log("\r\n\x1b[33m[WARN] Cancellation requested.\x1b[0m\r\n")
+        if job.process is not None and job.process.returncode is None:
+            try:
+                os.killpg(os.getpgid(job.process.pid), signal.SIGTERM)
+            except (ProcessLookupError, PermissionError):
+                pass
+        return True
+
+    async def stream(self, job: BuildJob, offset: int = 0):
+        """
+        Yields the job log as text, starting at a byte offset, until the job finishes.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        offset = max(0, offset)
+        while True:
+            changed = job._changed
+            chunk = b""
+            try:
+                with open(job.log_path, 'rb') as f:
+                    f.seek(offset)
+                    chunk = f.read(_STREAM_CHUNK_SIZE)
+            except FileNotFoundError:
+                pass
+            if chunk:
+                offset += len(chunk)
+                yield decoder.decode(chunk)
+                continue
+            if job.finished:
+                break
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                pass
+
+    # --- Execution ---
+
+    async def _run(self, job: BuildJob):
+        try:
+            async with self._semaphore:
+                if job.cancel_requested:
+                    self._finish(job, "cancelled")
+                    return
+                job.status = "running"
+                job.started_at = datetime.now().isoformat(timespec="seconds")
+                self._save()
+                os.makedirs(job.workspace, exist_ok=True)
+                try:
+                    success = await self.runner(job)
+                    if job.cancel_requested:
+                        self._finish(job, "cancelled")
+                    else:
+                        self._finish(job, "success" if success else "failed")
+                except Exception as e:
+                    print(f"[Build-Queue] Job {job.id} crashed: {e}")
+                    traceback.print_exc()
+                    job.log(f"\r\n\x1b[31m[CRITICAL ERROR] {str(e)}\x1b[0m\r\n")
+                    self._finish(job, "cancelled" if job.cancel_requested else "failed", error=str(e))
+                finally:
+                    shutil.rmtree(job.workspace, ignore_errors=True)
+        finally:
+            self._tasks.pop(job.id, None)
+
+    def _finish(self, job: BuildJob, status: str, error: str | None = None):
+        job.status = status
+        job.error = error or job.error
+        job.process = None
+        job.finished_at = datetime.now().isoformat(timespec="seconds")
+        self._save()
+        job._notify()
+        print(f"[Build-Queue] Job {job.id} finished with status '{status}'.")
@@ -0,0 +1,178 @@
+"""
+CPU/RAM-aware parallelism for builder compiles.
+
+CUDA extension builds are memory-bound: every nvcc/cicc process can take several GB,
+so the safe number of parallel compile jobs depends on free RAM far more than on the
+core count. The builder computes MAX_JOBS / CMAKE_BUILD_PARALLEL_LEVEL / NVCC_THREADS
+for each build from the cores and memory actually available to the container, split
+between concurrently running builds, and a per-preset memory-per-job estimate.
+
+The estimate starts from the preset default and is refined from the peak RSS observed
+during past builds (persisted in a small JSON stats file).
+"""
+import os
+import json
+import asyncio
+
+import psutil
+
+DEFAULT_MEM_PER_JOB_MB = 2048
+# Fraction of the available memory a build may plan for (page cache, the instances, ...)
+MEMORY_HEADROOM = 0.85
+# Safety margin applied to the observed per-job peak
+OBSERVED_MARGIN = 1.2
+MAX_NVCC_THREADS = 4
+# Number of recent observations kept per preset
+STATS_HISTORY = 5
+SAMPLE_INTERVAL = 2.0
+
+
+def _read_int(path: str) -> int | None:
+    try:
+        with open(path, 'r') as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None
+
+
+def available_cpus() -> int:
+    """CPUs usable by AiKore: affinity mask, capped by a cgroup v2 CPU quota if any."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max", 'r') as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def available_memory_mb() -> int:
+    """Memory available for new processes, capped by the cgroup v2 memory limit if any."""
+    available = psutil.virtual_memory().available
+    limit = _read_int("/sys/fs/cgroup/memory.max")
+    current = _read_int("/sys/fs/cgroup/memory.current")
+    if limit is not None and current is not None:
+        available = min(available, max(0, limit - current))
+    return int(available / (1024 * 1024))
+
+
+class BuildStats:
+    """Peak memory observations per preset, persisted as JSON."""
+
+    def __init__(self, stats_file: str):
+        self.stats_file = stats_file
+
+    def _load(self) -> dict:
+        try:
+            with open(self.stats_file, 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def mem_per_job_mb(self, preset_key: str, default_mb: int) -> int:
+        """Learned memory per compile job (max of recent observations plus a margin), or the preset default."""
+        observations = self._load().get(preset_key, {}).get("observations", [])
+        per_job = [o["peak_rss_mb"] / max(1, o["max_jobs"]) for o in observations if o.get("peak_rss_mb")]
+        if not per_job:
+            return default_mb
+        return max(256, int(max(per_job) * OBSERVED_MARGIN))
+
+    def record(self, preset_key: str, peak_rss_mb: int, max_jobs: int, duration_s: float):
+        stats = self._load()
+        entry = stats.setdefault(preset_key, {"observations": []})
+        entry["observations"].append({"peak_rss_mb": peak_rss_mb, "max_jobs": max_jobs, "duration_s": round(duration_s, 1)})
+        entry["observations"] = entry["observations"][-STATS_HISTORY:]
+        tmp_path = f"{self.stats_file}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(stats, f, indent=4)
+            os.replace(tmp_path, self.stats_file)
+        except OSError as e:
+            print(f"[Build-Resources] Could not save build stats: {e}")
+
+
+def plan_parallelism(mem_per_job_mb: int, concurrent_builds: int = 1) -> dict:
+    """
+    Computes the compile parallelism for one build.
+    CPUs and memory are shared evenly between the builds currently running.
+    """
+    share = max(1, concurrent_builds)
+    cpus = available_cpus()
+    memory_mb = available_memory_mb()
+
+    cpu_budget = max(1, cpus // share)
+    mem_budget_mb = memory_mb * MEMORY_HEADROOM / share
+    max_jobs = max(1, min(cpu_budget, int(mem_budget_mb // max(1, mem_per_job_mb))))
+    # nvcc --threads compiles several archs of one file in parallel; only spend spare cores on it.
+    nvcc_threads = max(1, min(MAX_NVCC_THREADS, cpu_budget // max_jobs))
+
+    return {
+        "max_jobs": max_jobs,
+        "nvcc_threads": nvcc_threads,
+        "cpus": cpus,
+        "available_memory_mb": memory_mb,
+        "mem_per_job_mb": mem_per_job_mb,
+        "concurrent_builds": share,
+    }
+
+
+def parallelism_env(plan: dict) -> dict:
+    """Environment variables understood by torch.utils.cpp_extension, setuptools, CMake and ninja builds."""
+    return {
+        "MAX_JOBS": str(plan["max_jobs"]),
+        "CMAKE_BUILD_PARALLEL_LEVEL": str(plan["max_jobs"]),
+        "NVCC_THREADS": str(plan["nvcc_threads"]),
+    }
+
+
+def process_tree_rss(pid: int) -> int:
+    """Sum of the RSS of a process and all its descendants, in bytes."""
+    try:
+        parent = psutil.Process(pid)
+        procs = [parent] + parent.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return 0
+    total = 0
+    for proc in procs:
+        try:
+            total += proc.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return total
+
+
+class PeakRssSampler:
+    """Samples the RSS of a process tree in the background and keeps the peak."""
+
+    def __init__(self, get_pid, interval: float = SAMPLE_INTERVAL):
+        self.get_pid = get_pid
+        self.interval = interval
+        self.peak_bytes = 0
+        self._task = None
+
+    async def _loop(self):
+        while True:
+            pid = self.get_pid()
+            if pid:
+                rss = await asyncio.to_thread(process_tree_rss, pid)
+                self.peak_bytes = max(self.peak_bytes, rss)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> int:
+        """Stops sampling and returns the peak RSS in MB."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        return int(self.peak_bytes / (1024 * 1024))
@@ -0,0 +1,83 @@
+"""
+Registry of the Module Builder Conda environments.
+
+Preparing a build used to cost a `conda info --envs` call and two `import torch`
+runs, even on an env that was already complete. The registry records, per env,
+its prefix, the python/torch/cuda versions and the installed build toolchain,
+together with the env fingerprint (see env_probe.env_fingerprint). As long as the
+fingerprint matches, the entry is trusted and no process needs to be started.
+"""
+import os
+import json
+import threading
+from datetime import datetime
+
+from aikore.core import env_probe
+
+
+class BuilderEnvRegistry:
+    """JSON-backed {env_name: entry} registry, validated against the env fingerprint."""
+
+    def __init__(self, registry_file: str):
+        self.registry_file = registry_file
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.registry_file, 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, data: dict):
+        tmp_path = f"{self.registry_file}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=4)
+            os.replace(tmp_path, self.registry_file)
+        except OSError as e:
+            print(f"[Builder-Envs] Could not save env registry: {e}")
+
+    def lookup(self, env_name: str) -> dict | None:
+        """Returns the entry of an env if it still matches the env on disk, else None."""
+        entry = self._load().get(env_name)
+        if not entry:
+            return None
+        fingerprint = env_probe.env_fingerprint(entry.get("prefix", ""))
+        if fingerprint is None or fingerprint != entry.get("fingerprint"):
+            return None
+        return entry
+
+    def refresh(self, env_name: str, prefix: str, python_ver: str, cuda_ver: str) -> dict | None:
+        """
+        Re-reads an env (one interpreter start, torch is not imported) and stores the result.
+        Returns the new entry, or None if the env cannot be probed.
+        """
+        probe = env_probe.probe_env(prefix, None)
+        if probe is None:
+            return None
+        entry = {
+            "prefix": prefix,
+            "python_ver": python_ver,
+            "cuda_ver": cuda_ver,
+            "python_version": probe.get("python_version"),
+            "torch_version": probe.get("torch_version"),
+            "torch_cuda_version": probe.get("cuda_version"),
+            "packages": env_probe.installed_distributions(prefix),
+            "fingerprint": env_probe.env_fingerprint(prefix),
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        with self._lock:
+            data = self._load()
+            data[env_name] = entry
+            self._save(data)
+        return entry
+
+    def remove(self, env_name: str):
+        with self._lock:
+            data = self._load()
+            if data.pop(env_name, None) is not None:
+                self._save(data)
+
+    def list(self) -> dict:
+        return self._load()
@@ -0,0 +1,269 @@
+"""
+Size-capped caches under /config/cache with LRU eviction.
+
+A cache is one or more directories whose entries can be deleted at any time: the next
+user simply downloads or rebuilds what is missing. Entries are the files or the
+directories found at a given depth below each directory (depth None: every file).
+An entry was last used at the newest atime/mtime of its files; atime resolution
+depends on the mount options (relatime: about a day), which is plenty for LRU. Entries
+used within the last MIN_ENTRY_AGE seconds are never evicted, so that a running
+install does not lose what it just downloaded.
+
+A single idle-priority thread enforces the caps hourly. Hits and misses reported by
+the installers (see record_install_log) and evictions are kept in cache_stats.json.
+
+The package cache is the first user: pip, uv and conda downloads of every instance,
+builder env and venv command share PACKAGE_CACHE_DIR, so a rebuild is mostly local I/O.
+The kernel cache is the second: Triton kernels, torch.compile (inductor) artifacts,
+JIT-built torch extensions and the CUDA driver's PTX cache are shared by the instances
+of the same (torch, CUDA, GPU arch) stack, so a second instance skips the compilations.
+  AIKORE_PACKAGE_CACHE_MAX_GB   size cap of the package cache (default 50, 0 = no limit)
+  AIKORE_KERNEL_CACHE_MAX_GB    size cap of the kernel cache (default 20, 0 = no limit)
+"""
+import os
+import re
+import json
+import time
+import shutil
+import threading
+
+from aikore.config import CACHE_DIR
+from aikore.core.priority import lower_current_thread_priority
+
+STATS_FILE = os.path.join(CACHE_DIR, "cache_stats.json")
+GC_INTERVAL = 3600
+MIN_ENTRY_AGE = 3600
+
+PACKAGE_CACHE_DIR = os.path.join(CACHE_DIR, "packages")
+PIP_CACHE_DIR = os.path.join(PACKAGE_CACHE_DIR, "pip")
+UV_CACHE_DIR = os.path.join(PACKAGE_CACHE_DIR, "uv")
+CONDA_PKGS_DIR = os.path.join(PACKAGE_CACHE_DIR, "conda-pkgs")
+PACKAGE_CACHE_MAX_BYTES = int(float(os.environ.get("AIKORE_PACKAGE_CACHE_MAX_GB", "50")) * 1024 ** 3)
+
+KERNEL_CACHE_DIR = os.path.join(CACHE_DIR, "kernels")
+KERNEL_CACHE_MAX_BYTES = int(float(os.environ.get("AIKORE_KERNEL_CACHE_MAX_GB", "20")) * 1024 ** 3)
+# Largest value the CUDA driver accepts (its default, 256 MB, is too small for big models)
+CUDA_CACHE_MAXSIZE = 4 * 1024 ** 3
+
+# pip reports each requirement it takes from its cache or downloads
+_PIP_HIT_RE = re.compile(r"^\s*Using cached \S+", re.M)
+_PIP_MISS_RE = re.compile(r"^\s*Downloading \S+", re.M)
+
+
+def package_cache_env() -> dict:
+    """Environment variables pointing pip, uv and conda at the shared package cache."""
+    return {
+        "PIP_CACHE_DIR": PIP_CACHE_DIR,
+        "UV_CACHE_DIR": UV_CACHE_DIR,
+        "CONDA_PKGS_DIRS": CONDA_PKGS_DIR,
+    }
+
+
+def kernel_cache_env(stack_key: str) -> dict:
+    """Environment variables pointing the torch, Triton and CUDA compile caches at the shared dir of a stack."""
+    root = os.path.join(KERNEL_CACHE_DIR, stack_key)
+    return {
+        "TRITON_CACHE_DIR": os.path.join(root, "triton"),
+        "TORCHINDUCTOR_CACHE_DIR": os.path.join(root, "inductor"),
+        "TORCH_EXTENSIONS_DIR": os.path.join(root, "torch_extensions"),
+        "PYTORCH_KERNEL_CACHE_PATH": os.path.join(root, "torch_kernels"),
+        "CUDA_CACHE_PATH": os.path.join(root, "cuda"),
+        "CUDA_CACHE_MAXSIZE": str(CUDA_CACHE_MAXSIZE),
+    }
+
+
+def _entry_usage(path: str) -> tuple:
+    """Returns (allocated bytes, last use time) of a file or directory entry."""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return 0, 0
+    if not os.path.isdir(path) or os.path.islink(path):
+        return st.st_blocks * 512, max(st.st_atime, st.st_mtime)
+    size, last_used = 0, st.st_mtime
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                fst = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            size += fst.st_blocks * 512
+            last_used = max(last_used, fst.st_atime, fst.st_mtime)
+    return size, last_used
+
+
+def _list_entries(directory: str, depth: int | None) -> list:
+    """Entries of a cache directory: every file (depth None) or the items at a given depth."""
+    if depth is None:
+        entries = []
+        for root, _, files in os.walk(directory):
+            entries.extend(os.path.join(root, name) for name in files)
+        return entries
+    entries = []
+    level = [directory]
+    for _ in range(depth):
+        next_level = []
+        for path in level:
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            next_level.append(entry.path)
+                        else:
+                            # Files above the entry depth are entries themselves
+                            entries.append(entry.path)
+            except OSError:
+                continue
+        level = next_level
+    return entries + level
+
+
+def _remove_entry(path: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class CacheManager:
+    """Registry of managed caches; owns the eviction thread and the statistics."""
+
+    def __init__(self, stats_file: str):
+        self.stats_file = stats_file
+        self._caches = {}
+        self._stats = self._load_stats()
+        self._lock = threading.Lock()
+        self._gc_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def register(self, name: str, dirs: list, max_bytes: int, depth: int | None = 1):
+        """
+        Registers a cache made of dirs (a list of (path, entry depth) or of paths, which
+        then use `depth`). max_bytes <= 0 disables eviction but keeps the statistics.
+        """
+        self._caches[name] = {
+            "dirs": [d if isinstance(d, tuple) else (d, depth) for d in dirs],
+            "max_bytes": max_bytes,
+        }
+
+    # --- Statistics ---
+
+    def _load_stats(self) -> dict:
+        try:
+            with open(self.stats_file, 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save_stats(self):
+        os.makedirs(os.path.dirname(self.stats_file), exist_ok=True)
+        tmp_path = f"{self.stats_file}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._stats, f, indent=4)
+            os.replace(tmp_path, self.stats_file)
+        except OSError as e:
+            print(f"[Cache] Could not save cache statistics: {e}")
+
+    def _count(self, name: str, **increments):
+        with self._lock:
+            stats = self._stats.setdefault(name, {})
+            for key, value in increments.items():
+                stats[key] = stats.get(key, 0) + value
+            self._save_stats()
+
+    def record_hits(self, name: str, hits: int = 0, misses: int = 0):
+        if hits or misses:
+            self._count(name, hits=hits, misses=misses)
+
+    def record_install_log(self, text: str, name: str = "packages"):
+        """Counts the cache hits and downloads reported by pip in an install log."""
+        self.record_hits(name, hits=len(_PIP_HIT_RE.findall(text)), misses=len(_PIP_MISS_RE.findall(text)))
+
+    def stats(self) -> dict:
+        """Per-cache size, cap and counters (sizes come from the last eviction pass)."""
+        result = {}
+        for name, cache in self._caches.items():
+            stats = dict(self._stats.get(name, {}))
+            lookups = stats.get("hits", 0) + stats.get("misses", 0)
+            stats["hit_rate"] = round(stats.get("hits", 0) / lookups, 3) if lookups else None
+            stats["max_bytes"] = cache["max_bytes"] if cache["max_bytes"] > 0 else None
+            stats["dirs"] = [path for path, _ in cache["dirs"]]
+            result[name] = stats
+        return result
+
+    # --- Eviction ---
+
+    def gc(self, name: str | None = None) -> dict:
+        """Evicts least recently used entries until each cache fits its cap. Returns {name: bytes evicted}."""
+        evicted = {}
+        with self._gc_lock:
+            for cache_name, cache in self._caches.items():
+                if name is None or cache_name == name:
+                    evicted[cache_name] = self._gc_cache(cache_name, cache)
+        return evicted
+
+    def _gc_cache(self, name: str, cache: dict) -> int:
+        entries = []
+        for directory, depth in cache["dirs"]:
+            if os.path.isdir(directory):
+                entries.extend((path, *_entry_usage(path)) for path in _list_entries(directory, depth))
+        total = sum(size for _, size, _ in entries)
+
+        evicted_bytes = evicted_count = 0
+        if cache["max_bytes"] > 0 and total > cache["max_bytes"]:
+            now = time.time()
+            for path, size, last_used in sorted(entries, key=lambda e: e[2]):
+                if total <= cache["max_bytes"]:
+                    break
+                if now - last_used < MIN_ENTRY_AGE:
+                    continue
+                _remove_entry(path)
+                total -= size
+                evicted_bytes += size
+                evicted_count += 1
+            print(f"[Cache] '{name}': evicted {evicted_count} entries ({evicted_bytes / 1024 ** 3:.2f} GB), now {total / 1024 ** 3:.2f} GB.")
+
+        with self._lock:
+            stats = self._stats.setdefault(name, {})
+            stats["size_bytes"] = total
+            stats["entries"] = len(entries) - evicted_count
+            stats["evictions"] = stats.get("evictions", 0) + evicted_count
+            stats["evicted_bytes"] = stats.get("evicted_bytes", 0) + evicted_bytes
+            stats["last_gc"] = time.time()
+            self._save_stats()
+        return evicted_bytes
+
+    def _loop(self):
+        lower_current_thread_priority()
+        while True:
+            try:
+                self.gc()
+            except Exception as e:
+                print(f"[Cache] Eviction pass failed: {e}")
+            self._wakeup.wait(GC_INTERVAL)
+            self._wakeup.clear()
+
+    def start(self):
+        """Starts the eviction thread (no-op if already running). Called from the app lifespan."""
+        for cache in self._caches.values():
+            for directory, _ in cache["dirs"]:
+                os.makedirs(directory, exist_ok=True)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="cache-manager", daemon=True)
+            self._thread.start()
+
+    def request_gc(self):
+        self._wakeup.set()
+
+
+cache_manager = CacheManager(STATS_FILE)
+# pip: every cached HTTP response and built wheel is a file; uv: entries two levels down
+# (archive-v0/<id>, wheels-v5/<index>, ...); conda: one entry per package (dir or tarball)
+cache_manager.register("packages", [(PIP_CACHE_DIR, None), (UV_CACHE_DIR, 2), (CONDA_PKGS_DIR, 1)], PACKAGE_CACHE_MAX_BYTES)
+# <stack>/<tool>/<entry>: a Triton kernel, an inductor cache kind, an extension build, ...
+cache_manager.register("kernels", [(KERNEL_CACHE_DIR, 3)], KERNEL_CACHE_MAX_BYTES)
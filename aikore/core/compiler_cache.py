@@ -0,0 +1,158 @@
+"""
+Persistent compiler cache (ccache or sccache) for the Module Builder.
+
+Compilers are wrapped, not replaced: a directory of small launcher scripts
+(gcc, g++, cc, c++ ...) is put first in PATH and exported as CC/CXX, so setuptools,
+torch.utils.cpp_extension and CMake all go through the cache. nvcc is covered via
+PYTORCH_NVCC (torch cpp_extension ninja builds) and CMAKE_CUDA_COMPILER_LAUNCHER.
+
+Both tools evict least-recently-used entries once the configured size cap is hit.
+Every build job has its own workspace, so ccache is told to hash paths relative
+to that workspace, otherwise no two builds would ever share an entry.
+"""
+import os
+import json
+import shutil
+import subprocess
+
+# Host compilers routed through the cache
+WRAPPED_COMPILERS = ("cc", "c++", "gcc", "g++", "gcc-13", "g++-13")
+STATS_TIMEOUT = 10
+
+
+class CompilerCache:
+    """
+    Resolves the cache tool and builds the environment of a build using it.
+    mode is 'auto' (ccache, then sccache), 'ccache', 'sccache' or 'off'.
+    """
+
+    def __init__(self, cache_root: str, mode: str = "auto", max_size: str = "20G"):
+        self.cache_root = cache_root
+        self.max_size = max_size
+        self.tool = None
+        self.tool_path = None
+
+        candidates = {"auto": ("ccache", "sccache"), "ccache": ("ccache",), "sccache": ("sccache",)}.get(mode, ())
+        for tool in candidates:
+            path = shutil.which(tool)
+            if path:
+                self.tool, self.tool_path = tool, path
+                break
+        if mode not in ("off", "") and not self.tool:
+            print(f"[Compiler-Cache] No compiler cache available (mode '{mode}'). Builds will not be cached.")
+
+    @property
+    def enabled(self) -> bool:
+        return self.tool is not None
+
+    @property
+    def cache_dir(self) -> str:
+        return os.path.join(self.cache_root, self.tool)
+
+    @property
+    def wrappers_dir(self) -> str:
+        return os.path.join(self.cache_root, "compiler-wrappers", self.tool)
+
+    def _ensure_wrappers(self) -> dict:
+        """Writes one launcher script per host compiler. Returns {name: wrapper_path}."""
+        os.makedirs(self.wrappers_dir, exist_ok=True)
+        search_path = os.pathsep.join(p for p in os.environ.get("PATH", "").split(os.pathsep) if p != self.wrappers_dir)
+        wrappers = {}
+        for name in WRAPPED_COMPILERS:
+            real = shutil.which(name, path=search_path)
+            if not real:
+                continue
+            wrapper_path = os.path.join(self.wrappers_dir, name)
+            content = f'#!/bin/sh\nexec "{self.tool_path}" "{real}" "$@"\n'
+            try:
+                with open(wrapper_path, 'r') as f:
+                    up_to_date = f.read() == content
+            except OSError:
+                up_to_date = False
+            if not up_to_date:
+                with open(wrapper_path, 'w') as f:
+                    f.write(content)
+                os.chmod(wrapper_path, 0o755)
+            wrappers[name] = wrapper_path
+        return wrappers
+
+    def build_env(self, workspace: str) -> dict:
+        """Environment variables routing the compilers of a build (run in workspace) through the cache."""
+        if not self.enabled:
+            return {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        wrappers = self._ensure_wrappers()
+
+        env = {
+            "PATH": f"{self.wrappers_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+            "CMAKE_CUDA_COMPILER_LAUNCHER": self.tool_path,
+            "PYTORCH_NVCC": f"{self.tool_path} nvcc",
+        }
+        # CC/CXX must be single paths (CMake rejects "ccache gcc"), hence the wrappers.
+        # The CMake launchers are only a fallback: combined with CC they would cache twice.
+        if "gcc" in wrappers:
+            env["CC"] = wrappers["gcc"]
+        else:
+            env["CMAKE_C_COMPILER_LAUNCHER"] = self.tool_path
+        if "g++" in wrappers:
+            env["CXX"] = wrappers["g++"]
+        else:
+            env["CMAKE_CXX_COMPILER_LAUNCHER"] = self.tool_path
+
+        if self.tool == "ccache":
+            env.update({
+                "CCACHE_DIR": self.cache_dir,
+                "CCACHE_MAXSIZE": self.max_size,
+                "CCACHE_BASEDIR": workspace,
+                "CCACHE_NOHASHDIR": "true",
+                "CCACHE_COMPILERCHECK": "content",
+                "CCACHE_SLOPPINESS": "file_macro,time_macros,include_file_mtime,include_file_ctime,pch_defines",
+            })
+        else:
+            env.update({
+                "SCCACHE_DIR": self.cache_dir,
+                "SCCACHE_CACHE_SIZE": self.max_size,
+            })
+        return env
+
+    def stats(self) -> dict | None:
+        """Cumulative {'hits', 'misses'} counters of the cache, or None if unavailable."""
+        if not self.enabled:
+            return None
+        try:
+            if self.tool == "ccache":
+                result = subprocess.run(
+                    [self.tool_path, "--print-stats"],
+                    capture_output=True, text=True, timeout=STATS_TIMEOUT,
+                    env={**os.environ, "CCACHE_DIR": self.cache_dir}
+                )
+                counters = dict(line.split("\t", 1) for line in result.stdout.splitlines() if "\t" in line)
+                hits = int(counters.get("direct_cache_hit", 0)) + int(counters.get("preprocessed_cache_hit", 0))
+                misses = int(counters.get("cache_miss", 0))
+            else:
+                result = subprocess.run(
+                    [self.tool_path, "--show-stats", "--stats-format", "json"],
+                    capture_output=True, text=True, timeout=STATS_TIMEOUT,
+                    env={**os.environ, "SCCACHE_DIR": self.cache_dir, "SCCACHE_CACHE_SIZE": self.max_size}
+                )
+                stats = json.loads(result.stdout).get("stats", {})
+                hits = sum(stats.get("cache_hits", {}).get("counts", {}).values())
+                misses = sum(stats.get("cache_misses", {}).get("counts", {}).values())
+        except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+            print(f"[Compiler-Cache] Could not read {self.tool} stats: {e}")
+            return None
+        return {"hits": hits, "misses": misses}
+
+    def diff_stats(self, before: dict | None, after: dict | None) -> dict | None:
+        """Counters for the interval between two stats() snapshots, with a hit rate."""
+        if not before or not after:
+            return None
+        hits = max(0, after["hits"] - before["hits"])
+        misses = max(0, after["misses"] - before["misses"])
+        total = hits + misses
+        return {
+            "tool": self.tool,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 3) if total else None,
+        }
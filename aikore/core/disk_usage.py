@@ -0,0 +1,314 @@
+"""
+Background, incremental disk-usage index.
+
+A single thread walks the tracked roots (instances, outputs, builder envs) at idle
+priority and keeps one record per directory: its mtime, the bytes of its regular
+files, and the (inode, bytes) of files with several hardlinks. A directory whose
+mtime did not change is not listed again; only its subdirectories are stat'ed.
+Queries aggregate the cached records of a subtree, counting each hardlinked inode
+once (conda envs are largely hardlinks to the package cache), so API calls never
+touch the disk.
+
+A directory mtime only changes when entries are added, removed or renamed, not when
+an existing file grows in place. A full rescan therefore runs periodically as well.
+"""
+import os
+import json
+import time
+import threading
+
+from aikore.config import CACHE_DIR
+from aikore.core.priority import lower_current_thread_priority
+
+INDEX_FILE = os.path.join(CACHE_DIR, "disk_usage_index.json")
+SCAN_INTERVAL = int(os.environ.get("AIKORE_DISK_SCAN_INTERVAL", "300"))
+FULL_RESCAN_INTERVAL = 6 * 3600
+
+
+class DiskUsageIndex:
+    """
+    Per-directory records: {path: {"m": mtime_ns, "d": st_dev, "b": bytes of single-link files,
+    "n": file count, "h": [[inode, bytes], ...] for multi-link files, "s": [subdir names]}}.
+    Sizes are allocated bytes (st_blocks * 512), like du.
+    """
+
+    def __init__(self, index_file: str):
+        self.index_file = index_file
+        self.roots = []
+        self._dirs = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._generation = 0
+        self._totals_cache = {}
+        self.last_scan = None
+        self.last_full_scan = 0
+        self._load()
+
+    # --- Persistence ---
+
+    def _load(self):
+        try:
+            with open(self.index_file, 'r') as f:
+                data = json.load(f)
+            self._dirs = data.get("dirs", {})
+            self.last_scan = data.get("last_scan")
+            self.last_full_scan = data.get("last_full_scan", 0)
+        except (OSError, json.JSONDecodeError):
+            self._dirs = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        tmp_path = f"{self.index_file}.tmp"
+        # Directory records are replaced, never modified: a shallow copy is a consistent
+        # snapshot, and the readers (get_usage) are not blocked while it is written
+        with self._lock:
+            data = {"dirs": dict(self._dirs), "last_scan": self.last_scan, "last_full_scan": self.last_full_scan}
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.index_file)
+        except OSError as e:
+            print(f"[Disk-Usage] Could not save index: {e}")
+
+    # --- Scanning ---
+
+    def _scan_dir(self, path: str, st: os.stat_result) -> dict:
+        size = count = 0
+        multi, subdirs = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        elif entry.is_file(follow_symlinks=False):
+                            est = entry.stat(follow_symlinks=False)
+                            allocated = est.st_blocks * 512
+                            count += 1
+                            if est.st_nlink > 1:
+                                multi.append([est.st_ino, allocated])
+                            else:
+                                size += allocated
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return {"m": st.st_mtime_ns, "d": st.st_dev, "b": size, "n": count, "h": multi, "s": sorted(subdirs)}
+
+    def _forget_subtree(self, path: str):
+        record = self._dirs.pop(path, None)
+        if record:
+            for name in record["s"]:
+                self._forget_subtree(os.path.join(path, name))
+
+    def scan_root(self, root: str, full: bool = False) -> bool:
+        """Updates the records under root. Returns True if anything changed."""
+        changed = False
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            try:
+                st = os.lstat(path)
+            except OSError:
+                with self._lock:
+                    if path in self._dirs:
+                        self._forget_subtree(path)
+                        changed = True
+                continue
+            record = self._dirs.get(path)
+            if full or not record or record["m"] != st.st_mtime_ns:
+                new_record = self._scan_dir(path, st)
+                with self._lock:
+                    if record:
+                        for name in set(record["s"]) - set(new_record["s"]):
+                            self._forget_subtree(os.path.join(path, name))
+                    self._dirs[path] = new_record
+                record = new_record
+                changed = True
+            stack.extend(os.path.join(path, name) for name in record["s"])
+        return changed
+
+    def scan(self, full: bool = False):
+        changed = False
+        for root in list(self.roots):
+            if os.path.isdir(root):
+                changed |= self.scan_root(root, full)
+            elif root in self._dirs:
+                with self._lock:
+                    self._forget_subtree(root)
+                changed = True
+        self.last_scan = time.time()
+        if full:
+            self.last_full_scan = self.last_scan
+        if changed:
+            with self._lock:
+                self._generation += 1
+                self._totals_cache.clear()
+        # An unchanged incremental pass has nothing new to persist
+        if changed or full:
+            self._save()
+
+    def _loop(self):
+        lower_current_thread_priority()
+        while True:
+            try:
+                full = time.time() - self.last_full_scan > FULL_RESCAN_INTERVAL
+                started = time.time()
+                self.scan(full=full)
+                print(f"[Disk-Usage] {'Full' if full else 'Incremental'} scan done in {time.time() - started:.1f}s ({len(self._dirs)} directories indexed).")
+            except Exception as e:
+                print(f"[Disk-Usage] Scan failed: {e}")
+            self._wakeup.wait(SCAN_INTERVAL)
+            self._wakeup.clear()
+
+    # --- Public interface ---
+
+    def start(self, roots: list):
+        """Starts the indexer thread on the given roots (no-op if already running)."""
+        for root in roots:
+            if root not in self.roots:
+                self.roots.append(root)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="disk-usage-indexer", daemon=True)
+            self._thread.start()
+
+    def request_scan(self):
+        """Asks for an early incremental scan (e.g. after a deletion or a build)."""
+        self._wakeup.set()
+
+    def get_usage(self, path: str) -> dict | None:
+        """
+        Returns {"bytes", "files"} for a directory from the index, or None if the
+        directory has not been indexed yet. Hardlinked inodes are counted once.
+        """
+        path = os.path.normpath(path)
+        with self._lock:
+            cached = self._totals_cache.get(path)
+            if cached:
+                return cached
+            if path not in self._dirs:
+                return None
+            total = count = 0
+            seen = set()
+            stack = [path]
+            while stack:
+                current = stack.pop()
+                record = self._dirs.get(current)
+                if not record:
+                    continue
+                total += record["b"]
+                count += record["n"]
+                for ino, allocated in record["h"]:
+                    key = (record["d"], ino)
+                    if key not in seen:
+                        seen.add(key)
+                        total += allocated
+                stack.extend(os.path.join(current, name) for name in record["s"])
+            result = {"bytes": total, "files": count}
+            self._totals_cache[path] = result
+            return result
+
+    def list_children(self, path: str) -> list:
+        """Names of the indexed subdirectories of path."""
+        record = self._dirs.get(os.path.normpath(path))
+        return list(record["s"]) if record else []
+
+    def find_dirs(self, root: str, match, skip: tuple = ()) -> list:
+        """
+        Indexed directories under root for which match(path, subdir_names) is true.
+        Matching directories and the paths in skip are not descended into.
+        """
+        root = os.path.normpath(root)
+        found = []
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            record = self._dirs.get(path)
+            if not record or path in skip:
+                continue
+            if path != root and match(path, record["s"]):
+                found.append(path)
+                continue
+            stack.extend(os.path.join(path, name) for name in record["s"])
+        return found
+
+
+disk_index = DiskUsageIndex(INDEX_FILE)
+
+
+# --- INSTANCE USAGE AND QUOTAS ---
+
+class DiskQuotaExceeded(Exception):
+    """Raised when an instance is over its hard disk quota."""
+
+
+MODEL_DIR_NAMES = {"models", "checkpoints", "loras"}
+_GB = 1024 ** 3
+
+
+def get_instance_usage(instance_dir: str, venv_path: str | None, output_dir: str | None) -> dict:
+    """
+    Splits the usage of an instance directory into env, repos, models, logs and other,
+    plus its outputs directory, all from the index. Models directories inside repos are
+    counted as models, not repos. Byte values are None until the directory is indexed.
+    """
+    instance_dir = os.path.normpath(instance_dir)
+    total = disk_index.get_usage(instance_dir)
+    outputs = disk_index.get_usage(output_dir) if output_dir else None
+    result = {
+        "indexed": total is not None,
+        "total": None, "env": None, "repos": None, "models": None, "logs": None, "other": None,
+        "outputs": outputs["bytes"] if outputs else None,
+        "scanned_at": disk_index.last_scan,
+    }
+    if total is None:
+        return result
+
+    def _bytes(path):
+        usage = disk_index.get_usage(path)
+        return usage["bytes"] if usage else 0
+
+    env_dir = os.path.normpath(os.path.join(instance_dir, venv_path)) if venv_path else None
+    skip = (env_dir,) if env_dir else ()
+    model_dirs = disk_index.find_dirs(instance_dir, lambda path, subdirs: os.path.basename(path) in MODEL_DIR_NAMES, skip)
+    repo_dirs = disk_index.find_dirs(instance_dir, lambda path, subdirs: ".git" in subdirs, skip)
+
+    env_bytes = _bytes(env_dir) if env_dir else 0
+    models_bytes = sum(_bytes(path) for path in model_dirs)
+    repos_bytes = sum(_bytes(path) for path in repo_dirs)
+    repos_bytes -= sum(_bytes(path) for path in model_dirs if any(path.startswith(repo + os.sep) for repo in repo_dirs))
+
+    # Logs live at the root of the instance directory: a few stats, no walk
+    logs_bytes = 0
+    try:
+        with os.scandir(instance_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".log") and entry.is_file(follow_symlinks=False):
+                    logs_bytes += entry.stat(follow_symlinks=False).st_blocks * 512
+    except OSError:
+        pass
+
+    result.update({
+        "total": total["bytes"],
+        "env": env_bytes,
+        "repos": max(0, repos_bytes),
+        "models": models_bytes,
+        "logs": logs_bytes,
+        "other": max(0, total["bytes"] - env_bytes - max(0, repos_bytes) - models_bytes - logs_bytes),
+    })
+    return result
+
+
+def get_quota_state(usage: dict, soft_quota_gb: float | None, hard_quota_gb: float | None) -> str:
+    """'ok', 'soft' or 'hard' for the instance total plus its outputs, 'unknown' before indexing."""
+    if not usage.get("indexed"):
+        return "unknown"
+    used = usage["total"] + (usage["outputs"] or 0)
+    if hard_quota_gb and used > hard_quota_gb * _GB:
+        return "hard"
+    if soft_quota_gb and used > soft_quota_gb * _GB:
+        return "soft"
+    return "ok"
+
+
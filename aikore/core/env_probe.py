@@ -0,0 +1,138 @@
+"""
+Lightweight probing of instance Python environments.
+
+Starting the env interpreter costs far less than importing torch, but it is still
+too slow to repeat on every API call. Probe results are therefore cached next to
+the instance (not inside the env, which would change its own fingerprint) and
+reused for as long as the env fingerprint is unchanged.
+"""
+import os
+import re
+import json
+import glob
+import subprocess
+
+PROBE_CACHE_FILENAME = ".aikore_env_probe.json"
+PROBE_TIMEOUT = 30
+
+# Runs inside the instance interpreter. It must stay cheap: importlib.metadata only,
+# torch is never imported (its CUDA version is read from torch/version.py instead).
+_PROBE_SCRIPT = r"""
+import sys, os, re, json, sysconfig, importlib.util
+import importlib.metadata as md
+tag = "cp%d%d" % sys.version_info[:2]
+result = {
+    "python_version": "%d.%d.%d" % sys.version_info[:3],
+    "python_tag": tag,
+    "abi_tag": tag + getattr(sys, "abiflags", ""),
+    "platform": sysconfig.get_platform(),
+    "torch_version": None,
+    "cuda_version": None,
+}
+try:
+    result["torch_version"] = md.version("torch")
+except md.PackageNotFoundError:
+    pass
+spec = importlib.util.find_spec("torch")
+if spec is not None and spec.origin:
+    try:
+        with open(os.path.join(os.path.dirname(spec.origin), "version.py")) as f:
+            m = re.search(r"^cuda\b[^=\n]*=\s*['\"]([^'\"]+)['\"]", f.read(), re.M)
+        if m:
+            result["cuda_version"] = m.group(1)
+    except OSError:
+        pass
+print(json.dumps(result))
+"""
+
+
+def get_env_python(env_path: str) -> str | None:
+    """Returns the interpreter path of a conda env or venv, or None if absent."""
+    for candidate in ("bin/python", "bin/python3"):
+        path = os.path.join(env_path, candidate)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def get_site_packages_dirs(env_path: str) -> list:
+    """Returns the site-packages directories of an env (one per Python minor version)."""
+    return sorted(glob.glob(os.path.join(env_path, "lib", "python*", "site-packages")))
+
+
+def installed_distributions(env_path: str) -> dict:
+    """
+    Lists the distributions installed in an env as {normalized name: version}
+    by reading the *.dist-info directory names, without starting the interpreter.
+    """
+    found = {}
+    for site_dir in get_site_packages_dirs(env_path):
+        for path in glob.glob(os.path.join(site_dir, "*.dist-info")):
+            name, _, version = os.path.basename(path)[:-len(".dist-info")].partition("-")
+            found[re.sub(r"[-_.]+", "-", name).lower()] = version
+    return found
+
+
+def env_fingerprint(env_path: str) -> str | None:
+    """
+    Builds a cheap fingerprint of an env from directory mtimes.
+    conda installs touch conda-meta/, pip installs touch site-packages/, and
+    a Python upgrade replaces bin/python. Returns None if the env does not exist.
+    """
+    if not os.path.isdir(env_path):
+        return None
+    parts = []
+    for path in [os.path.join(env_path, "conda-meta"), os.path.join(env_path, "bin", "python")] + get_site_packages_dirs(env_path):
+        try:
+            parts.append(f"{os.path.relpath(path, env_path)}:{os.stat(path).st_mtime_ns}")
+        except OSError:
+            continue
+    return "|".join(parts)
+
+
+def _read_cache(cache_path: str) -> dict:
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def probe_env(env_path: str, cache_path: str | None) -> dict | None:
+    """
+    Returns the python tag, torch version and CUDA version of an env.
+    The result is cached in cache_path (if given) and reused while the env fingerprint matches.
+    Returns None if the env has no interpreter or the probe fails.
+    """
+    fingerprint = env_fingerprint(env_path)
+    python_exe = get_env_python(env_path)
+    if fingerprint is None or python_exe is None:
+        return None
+
+    cached = _read_cache(cache_path) if cache_path else {}
+    if cached.get("fingerprint") == fingerprint and cached.get("env_path") == env_path:
+        return cached.get("probe")
+
+    try:
+        result = subprocess.run(
+            [python_exe, "-I", "-c", _PROBE_SCRIPT],
+            capture_output=True,
+            text=True,
+            timeout=PROBE_TIMEOUT
+        )
+        if result.returncode != 0:
+            print(f"[Env-Probe] Probe failed for '{env_path}': {result.stderr.strip()}")
+            return None
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+    except (subprocess.TimeoutExpired, json.JSONDecodeError, IndexError, OSError) as e:
+        print(f"[Env-Probe] Probe failed for '{env_path}': {e}")
+        return None
+
+    if cache_path:
+        try:
+            with open(cache_path, 'w') as f:
+                json.dump({"env_path": env_path, "fingerprint": fingerprint, "probe": probe}, f, indent=4)
+        except OSError as e:
+            print(f"[Env-Probe] Could not write probe cache '{cache_path}': {e}")
+
+    return probe
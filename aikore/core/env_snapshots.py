@@ -0,0 +1,393 @@
+"""
+Package snapshots and archives of instance environments.
+
+After every successful start, the manifest of the instance env (pip distributions
+and conda packages) is recorded in <instance>/.aikore_snapshots/<id>.json, unless the
+env fingerprint is unchanged since the previous snapshot. Any two snapshots (or a
+snapshot and the current env) can be diffed.
+
+When the packages differ from the last archived snapshot, the env itself is archived
+as well: every file is stored once, gzip-compressed, in a content-addressed object
+store shared by all instances (ENV_OBJECTS_DIR/<sha[:2]>/<sha256>), and the file list
+goes to <id>.files.json.gz. Files whose size and mtime did not change since the
+previous archive reuse its hash, so only changed files are read. A rollback rebuilds
+the env from the store next to the current one and swaps the two with renames; the
+old env goes to the trashcan purger.
+
+Retention:
+  AIKORE_ENV_SNAPSHOT_KEEP      archives kept per instance (default 3)
+  AIKORE_ENV_SNAPSHOT_HISTORY   package manifests kept per instance (default 50)
+"""
+import os
+import json
+import gzip
+import glob
+import time
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from aikore.config import INSTANCES_DIR, TRASH_DIR, CACHE_DIR
+from aikore.core import env_probe
+from aikore.core.disk_usage import disk_index
+
+SNAPSHOTS_DIRNAME = ".aikore_snapshots"
+ENV_OBJECTS_DIR = os.path.join(CACHE_DIR, "env-objects")
+KEEP_ARCHIVES = max(1, int(os.environ.get("AIKORE_ENV_SNAPSHOT_KEEP", "3")))
+KEEP_HISTORY = max(KEEP_ARCHIVES, int(os.environ.get("AIKORE_ENV_SNAPSHOT_HISTORY", "50")))
+RESTORE_WORKERS = 4
+_CHUNK_SIZE = 1024 * 1024
+
+# Held while archiving, restoring or collecting, so that the garbage collector never
+# removes objects that an archive in progress (not yet written) refers to
+_store_lock = threading.RLock()
+
+
+# --- Manifests ---
+
+def read_packages(env_path: str) -> dict:
+    """
+    Returns the packages installed in an env as {name: version}, without starting its
+    interpreter. Conda packages without a matching Python distribution are listed as
+    "conda::<name>" with "<version>=<build>".
+    """
+    packages = dict(env_probe.installed_distributions(env_path))
+    for path in glob.glob(os.path.join(env_path, "conda-meta", "*.json")):
+        try:
+            with open(path, 'r') as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        name = meta.get("name")
+        if name and name not in packages:
+            packages[f"conda::{name}"] = f"{meta.get('version')}={meta.get('build')}"
+    return dict(sorted(packages.items()))
+
+
+def diff_packages(old: dict, new: dict) -> dict:
+    """Compares two package manifests."""
+    return {
+        "added": {name: new[name] for name in new if name not in old},
+        "removed": {name: old[name] for name in old if name not in new},
+        "changed": {name: {"from": old[name], "to": new[name]} for name in new if name in old and old[name] != new[name]},
+    }
+
+
+def snapshots_dir(instance_dir: str) -> str:
+    return os.path.join(instance_dir, SNAPSHOTS_DIRNAME)
+
+
+def _snapshot_path(instance_dir: str, snapshot_id: str) -> str:
+    return os.path.join(snapshots_dir(instance_dir), f"{os.path.basename(snapshot_id)}.json")
+
+
+def _files_path(instance_dir: str, snapshot_id: str) -> str:
+    return os.path.join(snapshots_dir(instance_dir), f"{os.path.basename(snapshot_id)}.files.json.gz")
+
+
+def load_snapshot(instance_dir: str, snapshot_id: str) -> dict | None:
+    try:
+        with open(_snapshot_path(instance_dir, snapshot_id), 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _write_json(path: str, data: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def list_snapshots(instance_dir: str) -> list:
+    """Returns the snapshots of an instance, oldest first (without their package lists)."""
+    snapshots = []
+    for path in glob.glob(os.path.join(snapshots_dir(instance_dir), "*.json")):
+        try:
+            with open(path, 'r') as f:
+                snapshot = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        archive = snapshot.get("archive")
+        snapshots.append({
+            "id": snapshot["id"],
+            "created_at": snapshot["created_at"],
+            "reason": snapshot.get("reason"),
+            "package_count": len(snapshot.get("packages", {})),
+            "archive": archive,
+            "restorable": bool(archive) and os.path.exists(_files_path(instance_dir, archive)),
+            "archive_bytes": snapshot.get("archive_bytes"),
+        })
+    snapshots.sort(key=lambda s: s["created_at"])
+    return snapshots
+
+
+def is_up_to_date(instance_dir: str, env_path: str) -> bool:
+    """True if the latest snapshot already matches the env fingerprint (cheap: a few stat calls)."""
+    snapshots = list_snapshots(instance_dir)
+    if not snapshots:
+        return False
+    latest = load_snapshot(instance_dir, snapshots[-1]["id"])
+    return bool(latest) and latest.get("fingerprint") == env_probe.env_fingerprint(env_path)
+
+
+# --- Object store ---
+
+def _object_path(sha: str) -> str:
+    return os.path.join(ENV_OBJECTS_DIR, sha[:2], sha)
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _store_object(path: str, sha: str):
+    """Compresses a file into the object store, unless an object with this hash exists."""
+    dest = _object_path(sha)
+    if os.path.exists(dest):
+        return
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp_path = f"{dest}.tmp"
+    with open(path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=1) as dst:
+        shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+    os.replace(tmp_path, dest)
+
+
+def _read_files_manifest(instance_dir: str, archive_id: str) -> list:
+    try:
+        with gzip.open(_files_path(instance_dir, archive_id), 'rt') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return []
+
+
+def _archive_env(env_path: str, previous: list, job=None) -> tuple:
+    """
+    Stores every file of the env in the object store. Returns (entries, total bytes).
+    Entries are ["d", rel, mode], ["l", rel, target] or ["f", rel, mode, size, mtime_ns, sha].
+    """
+    known = {e[1]: e for e in previous if e[0] == "f"}
+    entries = []
+    total = 0
+    hashed = 0
+    for root, dirs, files in os.walk(env_path):
+        if job:
+            job.check_cancelled()
+        rel_root = os.path.relpath(root, env_path)
+        for name in dirs + files:
+            path = os.path.join(root, name)
+            rel = os.path.normpath(os.path.join(rel_root, name))
+            try:
+                st = os.lstat(path)
+                if os.path.islink(path):
+                    entries.append(["l", rel, os.readlink(path)])
+                elif name in dirs:
+                    entries.append(["d", rel, st.st_mode & 0o7777])
+                else:
+                    prev = known.get(rel)
+                    if prev and prev[3] == st.st_size and prev[4] == st.st_mtime_ns and os.path.exists(_object_path(prev[5])):
+                        sha = prev[5]
+                    else:
+                        sha = _hash_file(path)
+                        _store_object(path, sha)
+                        hashed += 1
+                    entries.append(["f", rel, st.st_mode & 0o7777, st.st_size, st.st_mtime_ns, sha])
+                    total += st.st_size
+            except OSError as e:
+                print(f"[Env-Snapshot] Skipping '{path}': {e}")
+        if job:
+            job.progress(None, f"Archiving environment ({len(entries)} entries, {hashed} new or changed files)...")
+    return entries, total
+
+
+def gc_objects() -> int:
+    """Deletes objects that no snapshot archive references anymore. Returns the number removed."""
+    with _store_lock:
+        return _gc_objects()
+
+
+def _gc_objects() -> int:
+    referenced = set()
+    for base in (INSTANCES_DIR, TRASH_DIR):
+        for path in glob.glob(os.path.join(base, "*", SNAPSHOTS_DIRNAME, "*.files.json.gz")):
+            try:
+                with gzip.open(path, 'rt') as f:
+                    referenced.update(e[5] for e in json.load(f) if e[0] == "f")
+            except (OSError, json.JSONDecodeError):
+                # An unreadable manifest must never cause the objects it may reference to be deleted
+                return 0
+    removed = 0
+    for path in glob.glob(os.path.join(ENV_OBJECTS_DIR, "*", "*")):
+        name = os.path.basename(path)
+        if name.endswith(".tmp") or name not in referenced:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+    if removed:
+        print(f"[Env-Snapshot] Removed {removed} unreferenced object(s) from the store.")
+        disk_index.request_scan()
+    return removed
+
+
+# --- Snapshots ---
+
+def _prune(instance_dir: str):
+    """Keeps the KEEP_HISTORY newest manifests and the KEEP_ARCHIVES newest archives."""
+    snapshots = list_snapshots(instance_dir)
+    for snapshot in snapshots[:-KEEP_HISTORY]:
+        try:
+            os.remove(_snapshot_path(instance_dir, snapshot["id"]))
+        except OSError:
+            pass
+    kept = set()
+    for snapshot in reversed(snapshots[-KEEP_HISTORY:]):
+        if snapshot["archive"] and len(kept) < KEEP_ARCHIVES:
+            kept.add(snapshot["archive"])
+    for path in glob.glob(os.path.join(snapshots_dir(instance_dir), "*.files.json.gz")):
+        if os.path.basename(path)[:-len(".files.json.gz")] not in kept:
+            os.remove(path)
+
+
+def take_snapshot(instance_dir: str, env_path: str, reason: str = "start", force: bool = False, job=None) -> dict | None:
+    """
+    Records the env manifest, and archives the env if its packages changed since the
+    last archive. Returns the new snapshot, or None if the env is missing or unchanged.
+    """
+    with _store_lock:
+        return _take_snapshot(instance_dir, env_path, reason, force, job)
+
+
+def _take_snapshot(instance_dir: str, env_path: str, reason: str, force: bool, job) -> dict | None:
+    fingerprint = env_probe.env_fingerprint(env_path)
+    if fingerprint is None:
+        return None
+    if not force and is_up_to_date(instance_dir, env_path):
+        return None
+
+    os.makedirs(snapshots_dir(instance_dir), exist_ok=True)
+    packages = read_packages(env_path)
+    snapshot_id = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+    snapshot = {
+        "id": snapshot_id,
+        "created_at": time.time(),
+        "reason": reason,
+        "env_path": env_path,
+        "fingerprint": fingerprint,
+        "packages": packages,
+        "archive": None,
+        "archive_bytes": None,
+    }
+
+    last_archived = next((s for s in reversed(list_snapshots(instance_dir)) if s["restorable"]), None)
+    last_archived_snapshot = load_snapshot(instance_dir, last_archived["id"]) if last_archived else None
+    if not force and last_archived_snapshot and last_archived_snapshot.get("packages") == packages:
+        # Same packages as the last archive: point to it instead of archiving again
+        snapshot["archive"] = last_archived["archive"]
+        snapshot["archive_bytes"] = last_archived["archive_bytes"]
+    else:
+        started = time.time()
+        previous = _read_files_manifest(instance_dir, last_archived["archive"]) if last_archived else []
+        entries, total = _archive_env(env_path, previous, job=job)
+        with gzip.open(_files_path(instance_dir, snapshot_id), 'wt', compresslevel=6) as f:
+            json.dump(entries, f)
+        snapshot["archive"] = snapshot_id
+        snapshot["archive_bytes"] = total
+        print(f"[Env-Snapshot] Archived '{env_path}' ({len(entries)} entries) in {time.time() - started:.1f}s.")
+
+    _write_json(_snapshot_path(instance_dir, snapshot_id), snapshot)
+    _prune(instance_dir)
+    gc_objects()
+    disk_index.request_scan()
+    return snapshot
+
+
+def _restore_file(target: str, entry: list):
+    _, _, mode, _, mtime_ns, sha = entry
+    with gzip.open(_object_path(sha), 'rb') as src, open(target, 'wb') as dst:
+        shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+    os.chmod(target, mode)
+    os.utime(target, ns=(mtime_ns, mtime_ns))
+
+
+def restore_snapshot(instance_dir: str, env_path: str, snapshot_id: str, job=None):
+    """
+    Rebuilds the env as archived by a snapshot, next to the current env, then swaps
+    them. The instance must be stopped. Raises ValueError if the snapshot has no archive.
+    """
+    with _store_lock:
+        _restore_snapshot(instance_dir, env_path, snapshot_id, job)
+
+
+def _restore_snapshot(instance_dir: str, env_path: str, snapshot_id: str, job):
+    snapshot = load_snapshot(instance_dir, snapshot_id)
+    archive_id = (snapshot or {}).get("archive")
+    if not archive_id or not os.path.exists(_files_path(instance_dir, archive_id)):
+        raise ValueError(f"Snapshot '{snapshot_id}' has no archive to restore.")
+    entries = _read_files_manifest(instance_dir, archive_id)
+    missing = [e[5] for e in entries if e[0] == "f" and not os.path.exists(_object_path(e[5]))]
+    if missing:
+        raise ValueError(f"Archive of snapshot '{snapshot_id}' is incomplete ({len(missing)} missing objects).")
+
+    staging = f"{env_path.rstrip('/')}.aikore-restore"
+    if os.path.lexists(staging):
+        shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    files = []
+    dir_modes = []
+    for entry in entries:
+        target = os.path.join(staging, entry[1])
+        if entry[0] == "d":
+            os.makedirs(target, exist_ok=True)
+            dir_modes.append((target, entry[2]))
+        elif entry[0] == "l":
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.symlink(entry[2], target)
+        else:
+            files.append((target, entry))
+
+    total = sum(e[3] for _, e in files) or 1
+    done = 0
+    started = time.time()
+    # zlib releases the GIL, so decompression scales with a few threads
+    with ThreadPoolExecutor(max_workers=RESTORE_WORKERS) as pool:
+        futures = [(pool.submit(_restore_file, target, entry), entry[3]) for target, entry in files]
+        for future, size in futures:
+            future.result()
+            done += size
+            if job:
+                job.check_cancelled()
+                job.progress(done / total, f"Restoring environment ({done / 1024 ** 3:.1f} / {total / 1024 ** 3:.1f} GB)...")
+    # Read-only directories get their mode back last, deepest first
+    for target, mode in reversed(dir_modes):
+        os.chmod(target, mode)
+
+    if os.path.lexists(env_path):
+        from aikore.core.trashcan import trashcan  # Local import: trashcan is optional here
+        try:
+            trashcan.schedule_purge(env_path)
+        except OSError:
+            shutil.rmtree(env_path, ignore_errors=True)
+    os.rename(staging, env_path)
+    disk_index.request_scan()
+    print(f"[Env-Snapshot] Restored '{env_path}' from snapshot '{snapshot_id}' in {time.time() - started:.1f}s.")
+
+
+def delete_snapshot(instance_dir: str, snapshot_id: str):
+    """Deletes a snapshot; objects it alone referenced are collected in the background."""
+    os.remove(_snapshot_path(instance_dir, snapshot_id))
+    threading.Thread(target=_prune_and_collect, args=(instance_dir,), daemon=True).start()
+
+
+def _prune_and_collect(instance_dir: str):
+    with _store_lock:
+        _prune(instance_dir)
+        gc_objects()
@@ -0,0 +1,185 @@
+"""
+Local bare-mirror cache for git sources.
+
+Every repository is kept as a bare mirror under CACHE_DIR/git-mirrors. A build first
+updates the mirror incrementally (only new objects are downloaded), then clones from
+it with --shared: the workspace borrows the mirror objects through alternates, so the
+clone itself costs no network and almost no disk. Submodules are resolved the same
+way, each one from its own mirror.
+
+Mirror names are '<repo name>-<first 16 hex of sha1(normalized url)>.git', where the
+normalized url has no 'git+' prefix, no trailing '/' and no '.git' suffix. The shell
+helpers of functions.sh (clone_repo, sync_repo) compute the same key and take the same
+'<mirror>.lock' file lock, so instances and builds share the store.
+"""
+import os
+import fcntl
+import shutil
+import asyncio
+import hashlib
+import posixpath
+from urllib.parse import urlsplit, urlunsplit
+
+# Git's own protection against local submodule urls must be lifted for mirrors
+_GIT_LOCAL_OK = ["-c", "protocol.file.allow=always"]
+
+
+def normalize_url(url: str) -> str:
+    url = url.strip()
+    if url.startswith("git+"):
+        url = url[4:]
+    url = url.rstrip("/")
+    if url.endswith(".git"):
+        url = url[:-4]
+    return url
+
+
+def mirror_name(url: str) -> str:
+    normalized = normalize_url(url)
+    base = os.path.basename(normalized) or "repo"
+    digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+    return f"{base}-{digest}.git"
+
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def _resolve_submodule_url(parent_url: str, url: str) -> str:
+    """Resolves a relative submodule url ('../other.git') against the superproject url."""
+    if not url.startswith(("./", "../")):
+        return url
+    parts = urlsplit(parent_url)
+    if parts.scheme:
+        path = posixpath.normpath(posixpath.join(parts.path.rstrip("/"), url))
+        return urlunsplit((parts.scheme, parts.netloc, path, "", ""))
+    return posixpath.normpath(posixpath.join(parent_url.rstrip("/"), url))
+
+
+class GitMirrorStore:
+    """Maintains the mirrors and clones workspaces from them. All output goes to a log callable."""
+
+    def __init__(self, mirrors_dir: str):
+        self.mirrors_dir = mirrors_dir
+        self._locks = {}
+
+    def mirror_path(self, url: str) -> str:
+        return os.path.join(self.mirrors_dir, mirror_name(url))
+
+    async def _git(self, args: list, log, cwd: str | None = None, quiet: bool = False) -> tuple:
+        """Runs git, logs its output unless quiet. Returns (returncode, output)."""
+        process = await asyncio.create_subprocess_exec(
+            "git", *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            cwd=cwd,
+            env={**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+        )
+        output, _ = await process.communicate()
+        text = output.decode("utf-8", errors="replace")
+        if text and not quiet:
+            log(text.replace("\r\n", "\n").replace("\n", "\r\n"))
+        return process.returncode, text
+
+    async def ensure_mirror(self, url: str, log) -> dict:
+        """
+        Creates or incrementally updates the mirror of url.
+        Returns {'path', 'fetched_bytes', 'reused_bytes'}.
+        """
+        os.makedirs(self.mirrors_dir, exist_ok=True)
+        path = self.mirror_path(url)
+        lock = self._locks.setdefault(path, asyncio.Lock())
+        async with lock:
+            # The file lock also serializes against the shell helpers updating the same mirror
+            with open(f"{path}.lock", "w") as lock_file:
+                await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+                try:
+                    return await self._update_locked(url, path, log)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    async def _update_locked(self, url: str, path: str, log) -> dict:
+        fetch_url = normalize_url(url) if url.startswith("git+") else url
+        if os.path.isdir(path):
+            size_before = await asyncio.to_thread(dir_size, path)
+            log(f"\x1b[34m[MIRROR] Updating mirror {os.path.basename(path)}...\x1b[0m\r\n")
+            code, _ = await self._git(["remote", "set-url", "origin", fetch_url], log, cwd=path, quiet=True)
+            code, _ = await self._git(["fetch", "--prune", "--tags", "origin"], log, cwd=path)
+            if code != 0:
+                # Offline or remote hiccup: the existing mirror is still a valid (older) source
+                log("\x1b[33m[WARN] Mirror update failed, using the cached mirror as-is.\x1b[0m\r\n")
+            fetched = max(0, await asyncio.to_thread(dir_size, path) - size_before)
+            return {"path": path, "fetched_bytes": fetched, "reused_bytes": size_before}
+
+        log(f"\x1b[34m[MIRROR] Creating mirror of {url}...\x1b[0m\r\n")
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        code, _ = await self._git(["clone", "--mirror", fetch_url, tmp_path], log)
+        if code != 0:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise Exception(f"Failed to mirror {url}.")
+        # Objects borrowed by workspaces through alternates must never be pruned
+        await self._git(["config", "gc.pruneExpire", "never"], log, cwd=tmp_path, quiet=True)
+        os.replace(tmp_path, path)
+        return {"path": path, "fetched_bytes": await asyncio.to_thread(dir_size, path), "reused_bytes": 0}
+
+    async def clone(self, url: str, dest: str, log, submodules: bool = False) -> dict:
+        """
+        Clones url into dest through its mirror (and its submodules, recursively, if asked).
+        Returns the totals {'fetched_bytes', 'reused_bytes', 'repositories'}.
+        """
+        info = await self.ensure_mirror(url, log)
+        code, _ = await self._git(["clone", "--shared", info["path"], dest], log)
+        if code != 0:
+            raise Exception(f"Failed to clone {url} from its mirror.")
+        await self._git(["remote", "set-url", "origin", normalize_url(url) if url.startswith("git+") else url], log, cwd=dest, quiet=True)
+
+        totals = {"fetched_bytes": info["fetched_bytes"], "reused_bytes": info["reused_bytes"], "repositories": 1}
+        if submodules:
+            await self._clone_submodules(url, dest, log, totals)
+        return totals
+
+    async def _clone_submodules(self, parent_url: str, repo_dir: str, log, totals: dict):
+        if not os.path.exists(os.path.join(repo_dir, ".gitmodules")):
+            return
+        code, output = await self._git(["config", "--file", ".gitmodules", "--get-regexp", r"^submodule\..*\.path$"], log, cwd=repo_dir, quiet=True)
+        if code != 0:
+            return
+        for line in output.splitlines():
+            key, _, sub_path = line.partition(" ")
+            name = key[len("submodule."):-len(".path")]
+            code, raw_url = await self._git(["config", "--file", ".gitmodules", f"submodule.{name}.url"], log, cwd=repo_dir, quiet=True)
+            if code != 0:
+                continue
+            sub_url = _resolve_submodule_url(parent_url, raw_url.strip())
+
+            await self._git(["submodule", "init", "--", sub_path], log, cwd=repo_dir, quiet=True)
+            try:
+                info = await self.ensure_mirror(sub_url, log)
+                # Clone the submodule from its mirror, then point it back at the real remote
+                await self._git(["config", f"submodule.{name}.url", info["path"]], log, cwd=repo_dir, quiet=True)
+                code, _ = await self._git(_GIT_LOCAL_OK + ["submodule", "update", "--", sub_path], log, cwd=repo_dir)
+                totals["fetched_bytes"] += info["fetched_bytes"]
+                totals["reused_bytes"] += info["reused_bytes"]
+            except Exception as e:
+                log(f"\x1b[33m[WARN] {e}\x1b[0m\r\n")
+                code = 1
+            await self._git(["config", f"submodule.{name}.url", sub_url], log, cwd=repo_dir, quiet=True)
+
+            if code != 0:
+                log(f"\x1b[33m[WARN] Submodule '{sub_path}' not available from mirror, fetching it directly.\x1b[0m\r\n")
+                code, _ = await self._git(["submodule", "update", "--", sub_path], log, cwd=repo_dir)
+                if code != 0:
+                    raise Exception(f"Failed to fetch submodule '{sub_path}'.")
+            else:
+                await self._git(["remote", "set-url", "origin", sub_url], log, cwd=os.path.join(repo_dir, sub_path), quiet=True)
+
+            totals["repositories"] += 1
+            await self._clone_submodules(sub_url, os.path.join(repo_dir, sub_path), log, totals)
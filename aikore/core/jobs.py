@@ -0,0 +1,301 @@
+"""
+Durable background jobs.
+
+Long instance operations (copy, delete, rebuild...) run as jobs: each one is a row in
+the `jobs` table, executed by a bounded thread pool with a per-kind concurrency limit,
+and can report progress and be cancelled. Because the row outlives the process, a job
+that was running when AiKore stopped is marked 'interrupted' at the next startup
+(and its kind can repair whatever it left behind) instead of silently disappearing.
+
+Handlers are registered per kind:
+
+    jobs.register("instance_copy", handler, max_concurrent=1, on_interrupted=cleanup)
+
+handler(ctx, params) runs in a worker thread; ctx.progress(fraction, message) reports
+progress, ctx.check_cancelled() raises JobCancelled once a cancel was requested, and
+ctx.run(cmd) runs a subprocess that a cancel kills (whole process group). A job is only
+recorded as 'cancelled' when its handler raised JobCancelled: a handler that completes
+its work succeeded, even if a cancel arrived meanwhile. With
+log_output=True the subprocess writes straight into the job log (JOB_LOGS_DIR/<id>.log),
+which clients follow while it grows (GET /api/jobs/{id}/log, or the websocket
+/api/jobs/{id}/stream).
+"""
+import os
+import json
+import time
+import codecs
+import signal
+import asyncio
+import threading
+import traceback
+import subprocess
+
+from aikore.config import JOB_LOGS_DIR
+from aikore.database import models
+from aikore.database.session import SessionLocal
+
+MAX_WORKERS = max(1, int(os.environ.get("AIKORE_JOB_WORKERS", "4")))
+# Progress is written to the database at most this often (seconds)
+PROGRESS_FLUSH_INTERVAL = 1.0
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled", "interrupted")
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def job_log_path(job_id: int) -> str:
+    return os.path.join(JOB_LOGS_DIR, f"{job_id}.log")
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job has been cancelled."""
+
+
+class JobContext:
+    """Handle given to a running job handler."""
+
+    def __init__(self, manager: "JobManager", job_id: int):
+        self.manager = manager
+        self.job_id = job_id
+        self.cancel_event = threading.Event()
+        self.process = None
+        self._last_flush = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def progress(self, fraction: float | None = None, message: str | None = None, force: bool = False):
+        now = time.time()
+        if not force and now - self._last_flush < PROGRESS_FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        fields = {}
+        if fraction is not None:
+            fields["progress"] = max(0.0, min(1.0, fraction))
+        if message is not None:
+            fields["message"] = message
+        self.manager._update(self.job_id, **fields)
+
+    def log(self, text: str):
+        """Appends a line to the job log."""
+        os.makedirs(JOB_LOGS_DIR, exist_ok=True)
+        with open(job_log_path(self.job_id), 'a', encoding='utf-8') as f:
+            f.write(text if text.endswith("\n") else text + "\n")
+
+    def run(self, cmd: list, log_output: bool = False, **kwargs) -> subprocess.CompletedProcess:
+        """
+        subprocess.run() in its own process group, killed if the job is cancelled.
+        With log_output, stdout/stderr go directly to the job log (nothing is buffered here).
+        """
+        self.check_cancelled()
+        log_file = None
+        if log_output:
+            os.makedirs(JOB_LOGS_DIR, exist_ok=True)
+            log_file = open(job_log_path(self.job_id), 'ab')
+            kwargs["stdout"] = log_file
+        else:
+            kwargs.setdefault("stdout", subprocess.PIPE)
+            kwargs.setdefault("text", True)
+        kwargs.setdefault("stderr", subprocess.STDOUT)
+        try:
+            self.process = subprocess.Popen(cmd, start_new_session=True, **kwargs)
+            output, _ = self.process.communicate()
+            returncode = self.process.returncode
+        finally:
+            self.process = None
+            if log_file:
+                log_file.close()
+        self.check_cancelled()
+        return subprocess.CompletedProcess(cmd, returncode, output, None)
+
+
+class JobManager:
+    """Dispatches queued jobs to a bounded pool, honouring per-kind limits."""
+
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self.max_workers = max_workers
+        self._kinds = {}
+        self._queue = []  # job ids, FIFO
+        self._running = {}  # job_id -> (kind, JobContext)
+        self._lock = threading.Lock()
+
+    def register(self, kind: str, handler, max_concurrent: int = 1, on_interrupted=None):
+        self._kinds[kind] = {"handler": handler, "max_concurrent": max_concurrent, "on_interrupted": on_interrupted}
+
+    # --- Persistence ---
+
+    def _update(self, job_id: int, **fields):
+        with SessionLocal() as db:
+            job = db.query(models.Job).filter(models.Job.id == job_id).first()
+            if job:
+                for key, value in fields.items():
+                    setattr(job, key, value)
+                db.commit()
+
+    @staticmethod
+    def to_dict(job: models.Job) -> dict:
+        return {
+            "id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "instance_id": job.instance_id,
+            "params": json.loads(job.params) if job.params else {},
+            "progress": job.progress,
+            "message": job.message,
+            "error": job.error,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        }
+
+    # --- Public interface ---
+
+    def submit(self, kind: str, params: dict | None = None, instance_id: int | None = None) -> int:
+        if kind not in self._kinds:
+            raise ValueError(f"Unknown job kind '{kind}'.")
+        with SessionLocal() as db:
+            job = models.Job(kind=kind, status="queued", instance_id=instance_id,
+                             params=json.dumps(params or {}, default=str), progress=0.0, created_at=time.time())
+            db.add(job)
+            db.commit()
+            job_id = job.id
+        print(f"[Jobs] Queued job {job_id} ({kind}).")
+        with self._lock:
+            self._queue.append(job_id)
+        self._dispatch()
+        return job_id
+
+    def get(self, job_id: int) -> dict | None:
+        with SessionLocal() as db:
+            job = db.query(models.Job).filter(models.Job.id == job_id).first()
+            return self.to_dict(job) if job else None
+
+    def list(self, status: str | None = None, kind: str | None = None, instance_id: int | None = None, limit: int = 100) -> list:
+        with SessionLocal() as db:
+            query = db.query(models.Job)
+            if status:
+                query = query.filter(models.Job.status == status)
+            if kind:
+                query = query.filter(models.Job.kind == kind)
+            if instance_id is not None:
+                query = query.filter(models.Job.instance_id == instance_id)
+            return [self.to_dict(job) for job in query.order_by(models.Job.id.desc()).limit(limit).all()]
+
+    def read_log(self, job_id: int, offset: int = 0) -> tuple:
+        """Returns (text, new_offset) of the job log from a byte offset."""
+        try:
+            with open(job_log_path(job_id), 'rb') as f:
+                f.seek(max(0, offset))
+                data = f.read()
+        except FileNotFoundError:
+            return "", offset
+        return data.decode('utf-8', errors='replace'), max(0, offset) + len(data)
+
+    async def stream(self, job_id: int, offset: int = 0):
+        """Yields the job log as text, starting at a byte offset, until the job finishes."""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        offset = max(0, offset)
+        while True:
+            # Read the status before the log, so that output written just before the end is not lost
+            job = await asyncio.to_thread(self.get, job_id)
+            finished = not job or job["status"] in FINISHED_STATUSES
+            while True:
+                chunk = b""
+                try:
+                    with open(job_log_path(job_id), 'rb') as f:
+                        f.seek(offset)
+                        chunk = f.read(_STREAM_CHUNK_SIZE)
+                except FileNotFoundError:
+                    pass
+                if not chunk:
+                    break
+                offset += len(chunk)
+                yield decoder.decode(chunk)
+            if finished:
+                break
+            await asyncio.sleep(0.5)
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancels a queued or running job. Returns False if it is not active."""
+        with self._lock:
+            if job_id in self._queue:
+                self._queue.remove(job_id)
+                self._update(job_id, status="cancelled", finished_at=time.time(), message="Cancelled before start.")
+                return True
+            running = self._running.get(job_id)
+        if not running:
+            return False
+        ctx = running[1]
+        ctx.cancel_event.set()
+        process = ctx.process
+        if process and process.poll() is None:
+            try:
+                os.killpg(os.getpgid(process.pid), signal.SIGTERM)
+            except (ProcessLookupError, PermissionError):
+                pass
+        print(f"[Jobs] Cancellation requested for job {job_id}.")
+        return True
+
+    def mark_interrupted(self):
+        """Called once at startup: jobs left queued/running by a previous run are marked interrupted."""
+        with SessionLocal() as db:
+            stale = db.query(models.Job).filter(models.Job.status.in_(("queued", "running"))).all()
+            for job in stale:
+                job.status = "interrupted"
+                job.finished_at = time.time()
+                job.error = "AiKore stopped while this job was active."
+            db.commit()
+            stale = [self.to_dict(job) for job in stale]
+        for job in stale:
+            print(f"[Jobs] Job {job['id']} ({job['kind']}) was interrupted by a restart.")
+            hook = self._kinds.get(job["kind"], {}).get("on_interrupted")
+            if hook:
+                try:
+                    hook(job["params"])
+                except Exception as e:
+                    print(f"[Jobs] Recovery of interrupted job {job['id']} failed: {e}")
+
+    # --- Execution ---
+
+    def _dispatch(self):
+        with self._lock:
+            for job_id in list(self._queue):
+                if len(self._running) >= self.max_workers:
+                    break
+                job = self.get(job_id)
+                if not job:
+                    self._queue.remove(job_id)
+                    continue
+                kind = job["kind"]
+                running_of_kind = sum(1 for k, _ in self._running.values() if k == kind)
+                if running_of_kind >= self._kinds[kind]["max_concurrent"]:
+                    continue
+                self._queue.remove(job_id)
+                ctx = JobContext(self, job_id)
+                self._running[job_id] = (kind, ctx)
+                threading.Thread(target=self._execute, args=(job, ctx), name=f"job-{job_id}", daemon=True).start()
+
+    def _execute(self, job: dict, ctx: JobContext):
+        job_id = job["id"]
+        self._update(job_id, status="running", started_at=time.time())
+        try:
+            self._kinds[job["kind"]]["handler"](ctx, job["params"])
+            self._update(job_id, status="succeeded", progress=1.0, finished_at=time.time())
+            print(f"[Jobs] Job {job_id} ({job['kind']}) succeeded.")
+        except JobCancelled:
+            self._update(job_id, status="cancelled", finished_at=time.time())
+            print(f"[Jobs] Job {job_id} ({job['kind']}) cancelled.")
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+            print(f"[Jobs] Job {job_id} ({job['kind']}) failed: {e}")
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+            self._dispatch()
+
+
+jobs = JobManager()
@@ -0,0 +1,347 @@
+"""
+Content-hash deduplication of model files.
+
+The same multi-GB checkpoint often ends up under several instances and output folders.
+A scan walks the model roots (symlinks are not followed, so the shared /config/models
+folders linked into instances are seen once) and narrows candidates down in stages:
+files are grouped by size, then by a sampled hash (head, middle and tail chunks), and
+only files whose size and sampled hash collide are hashed in full. Full hashes run in
+parallel at idle priority and are kept in an index keyed by (device, inode) and
+validated by (mtime, size): rescans only hash new or modified files, and hardlinked
+copies are hashed once.
+
+Duplicates on the same filesystem are then replaced by a reflink of the kept file
+(FICLONE: the copies stay independent files sharing their extents) or, when the
+filesystem cannot clone, by a hardlink. The kept file is the one in the shared model
+store if any, else the oldest. A dry run only reports the groups and reclaimable bytes.
+The last report is kept in model_dedup_report.json.
+  AIKORE_DEDUP_HASH_WORKERS   parallel full-hash workers (default 4)
+"""
+import os
+import json
+import stat
+import time
+import fcntl
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from aikore.config import CACHE_DIR, INSTANCES_DIR, OUTPUTS_DIR
+from aikore.core.priority import lower_current_thread_priority
+
+MODELS_DIR = "/config/models"
+MODEL_ROOTS = [MODELS_DIR, INSTANCES_DIR, OUTPUTS_DIR]
+INDEX_FILE = os.path.join(CACHE_DIR, "model_hashes.json")
+REPORT_FILE = os.path.join(CACHE_DIR, "model_dedup_report.json")
+
+MODEL_EXTENSIONS = (".safetensors", ".sft", ".ckpt", ".pt", ".pth", ".bin", ".gguf", ".onnx")
+MIN_MODEL_SIZE = 16 * 1024 * 1024
+SAMPLE_SIZE = 1024 * 1024
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+HASH_WORKERS = max(1, int(os.environ.get("AIKORE_DEDUP_HASH_WORKERS", "4")))
+# The index is saved this often while hashing, so a cancelled scan keeps its work
+INDEX_SAVE_INTERVAL = 30
+
+_FICLONE = 0x40049409
+_TMP_SUFFIX = ".aikore-dedup.tmp"
+_scan_lock = threading.Lock()
+
+
+def _is_model_file(name: str) -> bool:
+    return name.lower().endswith(MODEL_EXTENSIONS)
+
+
+def find_model_files(roots: list, min_size: int = MIN_MODEL_SIZE) -> dict:
+    """{(dev, ino): {'paths': [...], 'size', 'mtime_ns'}} of the model files under roots."""
+    inodes = {}
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            # Hidden dirs hold AiKore state (snapshots, wheel stores, git data), not models
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                if not _is_model_file(name) or name.endswith(_TMP_SUFFIX):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.lstat(path)
+                except OSError:
+                    continue
+                if not stat.S_ISREG(st.st_mode) or st.st_size < min_size:
+                    continue
+                entry = inodes.setdefault((st.st_dev, st.st_ino), {"paths": [], "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+                if path not in entry["paths"]:
+                    entry["paths"].append(path)
+    return inodes
+
+
+# --- Hash index ---
+
+def load_index() -> dict:
+    try:
+        with open(INDEX_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _save_index(index: dict):
+    os.makedirs(os.path.dirname(INDEX_FILE), exist_ok=True)
+    tmp_path = f"{INDEX_FILE}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, INDEX_FILE)
+    except OSError as e:
+        print(f"[Model-Dedup] Could not save the hash index: {e}")
+
+
+def _index_entry(index: dict, key: tuple, info: dict) -> dict:
+    """The index entry of an inode, reset if the file changed since it was hashed."""
+    entry = index.get(f"{key[0]}:{key[1]}")
+    if not entry or entry.get("size") != info["size"] or entry.get("mtime_ns") != info["mtime_ns"]:
+        entry = {"size": info["size"], "mtime_ns": info["mtime_ns"]}
+        index[f"{key[0]}:{key[1]}"] = entry
+    return entry
+
+
+def sampled_hash(path: str, size: int) -> str:
+    """Hash of the size and of three SAMPLE_SIZE chunks (head, middle, tail)."""
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        for offset in (0, max(0, size // 2 - SAMPLE_SIZE // 2), max(0, size - SAMPLE_SIZE)):
+            f.seek(offset)
+            digest.update(f.read(SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+def full_hash(path: str, cancel: threading.Event | None = None, on_bytes=None) -> str | None:
+    """sha256 of a whole file. Returns None if cancelled."""
+    digest = hashlib.sha256()
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            if cancel is not None and cancel.is_set():
+                return None
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+            if on_bytes:
+                on_bytes(read)
+    return digest.hexdigest()
+
+
+# --- Scan ---
+
+def _group_by(items: list, key_func) -> list:
+    groups = {}
+    for item in items:
+        key = key_func(item)
+        if key is not None:
+            groups.setdefault(key, []).append(item)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def _keeper(members: list) -> tuple:
+    """The inode to keep in a duplicate group: one in the shared model store, else the oldest."""
+    def rank(member):
+        _, info = member
+        in_store = any(p.startswith(MODELS_DIR + os.sep) for p in info["paths"])
+        return (not in_store, info["mtime_ns"])
+    return min(members, key=rank)
+
+
+def scan(job=None, roots: list | None = None) -> dict:
+    """
+    Finds duplicate model files. Returns the report:
+    {'groups': [{'sha256', 'size_bytes', 'keep', 'duplicates', 'reclaimable_bytes', 'cross_device'}],
+     'files', 'hashed_bytes', 'reclaimable_bytes', 'scanned_at'}.
+    """
+    cancel = job.cancel_event if job else None
+    index = load_index()
+    inodes = find_model_files(roots or [r for r in MODEL_ROOTS if os.path.isdir(r)])
+    if job:
+        job.progress(0.05, f"Found {len(inodes)} model files.", force=True)
+
+    # Stage 1 and 2: same size, then same sampled hash
+    candidates = []
+    for size_group in _group_by(list(inodes.items()), lambda m: m[1]["size"]):
+        for key, info in size_group:
+            entry = _index_entry(index, key, info)
+            if "sample" not in entry:
+                try:
+                    entry["sample"] = sampled_hash(info["paths"][0], info["size"])
+                except OSError:
+                    continue
+        candidates.extend(m for group in _group_by(size_group, lambda m: _index_entry(index, m[0], m[1]).get("sample"))
+                          for m in group)
+
+    # Stage 3: full hashes of the remaining candidates, in parallel
+    to_hash = [(key, info) for key, info in candidates if "sha256" not in _index_entry(index, key, info)]
+    total_bytes = sum(info["size"] for _, info in to_hash) or 1
+    progress = {"bytes": 0, "saved_at": time.time()}
+    progress_lock = threading.Lock()
+
+    def _count(read: int):
+        with progress_lock:
+            progress["bytes"] += read
+            if job:
+                job.progress(0.1 + 0.85 * progress["bytes"] / total_bytes, f"Hashing {len(to_hash)} candidate files...")
+
+    def _hash(member):
+        lower_current_thread_priority()
+        key, info = member
+        try:
+            digest = full_hash(info["paths"][0], cancel, _count)
+        except OSError as e:
+            print(f"[Model-Dedup] Could not hash '{info['paths'][0]}': {e}")
+            return
+        if digest:
+            with progress_lock:
+                _index_entry(index, key, info)["sha256"] = digest
+                if time.time() - progress["saved_at"] > INDEX_SAVE_INTERVAL:
+                    progress["saved_at"] = time.time()
+                    _save_index(dict(index))
+
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="model-dedup") as pool:
+        list(pool.map(_hash, to_hash))
+
+    # Forget inodes that no longer exist
+    live_keys = {f"{dev}:{ino}" for dev, ino in inodes}
+    _save_index({k: v for k, v in index.items() if k in live_keys})
+    if job:
+        job.check_cancelled()
+
+    groups = []
+    for members in _group_by(candidates, lambda m: _index_entry(index, m[0], m[1]).get("sha256")):
+        keep_key, keep_info = _keeper(members)
+        keep_ref = f"{keep_key[0]}:{keep_key[1]}"
+        # Reflinks made by a previous run already share their extents with the kept file
+        duplicates = [(key, info) for key, info in members
+                      if key != keep_key and _index_entry(index, key, info).get("reflink_of") != keep_ref]
+        if not duplicates:
+            continue
+        same_device = [info for key, info in duplicates if key[0] == keep_key[0]]
+        groups.append({
+            "sha256": _index_entry(index, keep_key, keep_info)["sha256"],
+            "size_bytes": keep_info["size"],
+            "keep": keep_info["paths"][0],
+            "duplicates": [p for _, info in duplicates for p in info["paths"]],
+            "reclaimable_bytes": len(same_device) * keep_info["size"],
+            "cross_device": [p for key, info in duplicates if key[0] != keep_key[0] for p in info["paths"]],
+        })
+    groups.sort(key=lambda g: -g["reclaimable_bytes"])
+    return {
+        "groups": groups,
+        "files": sum(len(info["paths"]) for info in inodes.values()),
+        "hashed_bytes": progress["bytes"],
+        "reclaimable_bytes": sum(g["reclaimable_bytes"] for g in groups),
+        "scanned_at": time.time(),
+    }
+
+
+# --- Replacement ---
+
+def _clone_or_link(source: str, target_tmp: str) -> str:
+    """Creates target_tmp as a reflink of source, or a hardlink if cloning is not supported."""
+    try:
+        with open(source, 'rb') as src, open(target_tmp, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        os.chmod(target_tmp, os.stat(source).st_mode & 0o7777)
+        return "reflink"
+    except OSError:
+        try:
+            os.remove(target_tmp)
+        except OSError:
+            pass
+    os.link(source, target_tmp)
+    return "hardlink"
+
+
+def deduplicate(report: dict, job=None) -> dict:
+    """
+    Replaces the duplicates of a scan report, re-checking each file (size, mtime and,
+    for the kept file, its indexed hash) right before the swap. Returns the totals.
+    """
+    index = load_index()
+    totals = {"replaced": 0, "reflinks": 0, "hardlinks": 0, "reclaimed_bytes": 0, "skipped": 0}
+    groups = [g for g in report["groups"] if g["reclaimable_bytes"] > 0]
+    for i, group in enumerate(groups):
+        if job:
+            job.check_cancelled()
+            job.progress(0.95 * i / max(1, len(groups)), f"Deduplicating {os.path.basename(group['keep'])}...")
+        try:
+            keep_st = os.stat(group["keep"])
+        except OSError:
+            totals["skipped"] += len(group["duplicates"])
+            continue
+        keep_entry = index.get(f"{keep_st.st_dev}:{keep_st.st_ino}", {})
+        if keep_entry.get("sha256") != group["sha256"] or keep_entry.get("mtime_ns") != keep_st.st_mtime_ns:
+            totals["skipped"] += len(group["duplicates"])
+            continue
+
+        # An inode is only freed once all its paths are replaced
+        remaining_links = {}
+        for path in group["duplicates"]:
+            try:
+                st = os.lstat(path)
+            except OSError:
+                totals["skipped"] += 1
+                continue
+            entry = index.get(f"{st.st_dev}:{st.st_ino}", {})
+            if (st.st_dev != keep_st.st_dev or (st.st_dev, st.st_ino) == (keep_st.st_dev, keep_st.st_ino)
+                    or entry.get("sha256") != group["sha256"] or entry.get("mtime_ns") != st.st_mtime_ns
+                    or st.st_size != keep_st.st_size):
+                totals["skipped"] += 1
+                continue
+            tmp_path = path + _TMP_SUFFIX
+            try:
+                method = _clone_or_link(group["keep"], tmp_path)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"[Model-Dedup] Could not replace '{path}': {e}")
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                totals["skipped"] += 1
+                continue
+            totals["replaced"] += 1
+            totals[f"{method}s"] += 1
+            links = remaining_links.setdefault((st.st_dev, st.st_ino), st.st_nlink) - 1
+            remaining_links[(st.st_dev, st.st_ino)] = links
+            if links == 0:
+                totals["reclaimed_bytes"] += st.st_size
+            if method == "reflink":
+                # Index the clone so that rescans know it is not a duplicate anymore
+                try:
+                    new_st = os.stat(path)
+                    index[f"{new_st.st_dev}:{new_st.st_ino}"] = {
+                        **keep_entry, "mtime_ns": new_st.st_mtime_ns, "reflink_of": f"{keep_st.st_dev}:{keep_st.st_ino}"}
+                except OSError:
+                    pass
+    _save_index(index)
+    print(f"[Model-Dedup] Replaced {totals['replaced']} duplicates ({totals['reflinks']} reflinks, {totals['hardlinks']} hardlinks), reclaimed {totals['reclaimed_bytes'] / 1024 ** 3:.2f} GB.")
+    return totals
+
+
+def run(job=None, dry_run: bool = True) -> dict:
+    """Scans (and unless dry_run, deduplicates) the model roots. The report is saved to REPORT_FILE."""
+    with _scan_lock:
+        report = scan(job)
+        report["dry_run"] = dry_run
+        if not dry_run:
+            report["result"] = deduplicate(report, job)
+        os.makedirs(os.path.dirname(REPORT_FILE), exist_ok=True)
+        with open(REPORT_FILE, 'w') as f:
+            json.dump(report, f, indent=4)
+        return report
+
+
+def load_report() -> dict | None:
+    try:
+        with open(REPORT_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
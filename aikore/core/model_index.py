@@ -0,0 +1,225 @@
+"""
+Inventory of the model files under /config.
+
+Each .safetensors file starts with an 8-byte little-endian header length followed by a
+JSON header describing every tensor (dtype, shape, offsets) and optional string
+metadata. The header is read through mmap, so only its pages are touched: indexing
+thousands of multi-GB models reads a few kilobytes per file. From it the index derives
+the parameter count, the dominant dtype and architecture hints (tensor name patterns,
+plus the modelspec/kohya metadata when present). Other model formats are listed with
+their size only.
+
+The index also records which instances reference each model: the files inside an
+instance directory, and the files reached through the symlinks it contains (the
+shared folders linked by sl_folder). Entries are reused while (size, mtime) are
+unchanged, so a rebuild only parses new or modified files. It is kept in
+model_index.json.
+"""
+import os
+import json
+import mmap
+import time
+import struct
+import threading
+
+from aikore.config import CACHE_DIR, INSTANCES_DIR
+from aikore.core.model_dedup import MODEL_ROOTS, find_model_files
+
+INDEX_FILE = os.path.join(CACHE_DIR, "model_index.json")
+SAFETENSORS_EXTENSIONS = (".safetensors", ".sft")
+# A larger header is not a safetensors file (the format caps it at 100 MB)
+MAX_HEADER_SIZE = 100 * 1024 * 1024
+# Depth of the symlink search in an instance directory (e.g. ComfyUI/models/checkpoints)
+LINK_SEARCH_DEPTH = 5
+_SKIPPED_DIRS = {"node_modules", "__pycache__"}
+
+# Architecture hints from tensor names: a model gets the LoRA hint if it applies, the first
+# matching family, and only when no family matched, the first matching component type
+_LORA_RULE = lambda keys: any(".lora_down." in k or ".lora_A." in k or k.startswith(("lora_unet_", "lora_te")) for k in keys)
+_FAMILY_RULES = [
+    ("Flux", lambda keys: any("double_blocks." in k for k in keys) and any("single_blocks." in k for k in keys)),
+    ("SD3", lambda keys: any("joint_blocks." in k for k in keys)),
+    ("SDXL", lambda keys: any(k.startswith("conditioner.embedders.") or "label_emb." in k for k in keys)),
+    ("SD2.x", lambda keys: any(k.startswith("cond_stage_model.model.") for k in keys)),
+    ("SD1.x", lambda keys: any(k.startswith("cond_stage_model.transformer.") for k in keys)),
+]
+_COMPONENT_RULES = [
+    ("ControlNet", lambda keys: any("zero_convs." in k or "controlnet_" in k for k in keys)),
+    ("UNet", lambda keys: any("input_blocks." in k or k.startswith("down_blocks.") for k in keys)),
+    ("VAE", lambda keys: any(k.startswith(("encoder.down", "decoder.up", "first_stage_model.")) for k in keys)),
+    ("CLIP text encoder", lambda keys: any("text_model.encoder." in k for k in keys)),
+    ("T5 encoder", lambda keys: any(k.startswith("encoder.block.") for k in keys)),
+    ("CLIP vision", lambda keys: any("vision_model.encoder." in k for k in keys)),
+    ("Transformer LM", lambda keys: any(k.startswith("model.layers.") for k in keys)),
+]
+# Metadata keys worth keeping in the index (short strings that describe the model)
+_KEPT_METADATA = ("modelspec.architecture", "modelspec.title", "modelspec.resolution",
+                  "ss_base_model_version", "ss_network_module", "ss_network_dim", "format")
+
+_build_lock = threading.Lock()
+
+
+def read_safetensors_header(path: str) -> dict:
+    """Returns the JSON header of a safetensors file, reading only the header pages."""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < 8:
+            raise ValueError("file too small")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            (header_size,) = struct.unpack("<Q", mm[:8])
+            if header_size > min(MAX_HEADER_SIZE, size - 8):
+                raise ValueError("invalid header size")
+            return json.loads(mm[8:8 + header_size])
+
+
+def architecture_hints(tensor_names: set, metadata: dict) -> list:
+    hints = [str(metadata[key]) for key in ("modelspec.architecture", "ss_base_model_version") if metadata.get(key)]
+    if _LORA_RULE(tensor_names):
+        hints.append("LoRA")
+    family = next((hint for hint, rule in _FAMILY_RULES if rule(tensor_names)), None)
+    if family is None:
+        family = next((hint for hint, rule in _COMPONENT_RULES if rule(tensor_names)), None)
+    if family:
+        hints.append(family)
+    return hints
+
+
+def describe_safetensors(path: str) -> dict:
+    """Parameter count, dtypes, tensor count, architecture hints and metadata of a safetensors file."""
+    header = read_safetensors_header(path)
+    metadata = header.pop("__metadata__", None) or {}
+    parameters = 0
+    dtype_parameters = {}
+    for tensor in header.values():
+        count = 1
+        for dim in tensor.get("shape", []):
+            count *= dim
+        parameters += count
+        dtype = tensor.get("dtype", "?")
+        dtype_parameters[dtype] = dtype_parameters.get(dtype, 0) + count
+    return {
+        "format": "safetensors",
+        "parameters": parameters,
+        "tensors": len(header),
+        "dtype": max(dtype_parameters, key=dtype_parameters.get) if dtype_parameters else None,
+        "dtypes": dtype_parameters,
+        "architecture": architecture_hints(set(header), metadata),
+        "metadata": {k: metadata[k] for k in _KEPT_METADATA if k in metadata},
+    }
+
+
+# --- Instance references ---
+
+def _is_env_dir(path: str) -> bool:
+    return os.path.isdir(os.path.join(path, "conda-meta")) or os.path.isfile(os.path.join(path, "pyvenv.cfg"))
+
+
+def instance_link_targets(instance_dir: str) -> list:
+    """Real paths reached through the symlinks of an instance directory (envs are skipped)."""
+    targets = []
+    level = [instance_dir]
+    for _ in range(LINK_SEARCH_DEPTH):
+        next_level = []
+        for path in level:
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_symlink():
+                            targets.append(os.path.realpath(entry.path))
+                        elif (entry.is_dir(follow_symlinks=False) and not entry.name.startswith(".")
+                              and entry.name not in _SKIPPED_DIRS and not _is_env_dir(entry.path)):
+                            next_level.append(entry.path)
+            except OSError:
+                continue
+        level = next_level
+    return targets
+
+
+def _instance_references() -> dict:
+    """{instance name: [instance dir + symlink targets]}."""
+    references = {}
+    try:
+        names = [n for n in os.listdir(INSTANCES_DIR) if not n.startswith(".")]
+    except OSError:
+        return references
+    for name in names:
+        instance_dir = os.path.join(INSTANCES_DIR, name)
+        if os.path.isdir(instance_dir):
+            references[name] = [instance_dir] + instance_link_targets(instance_dir)
+    return references
+
+
+def _referencing_instances(paths: list, references: dict) -> list:
+    found = []
+    for name, roots in references.items():
+        if any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for path in paths for root in roots):
+            found.append(name)
+    return sorted(found)
+
+
+# --- Index ---
+
+def load_index() -> dict:
+    try:
+        with open(INDEX_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def build_index(job=None, roots: list | None = None) -> dict:
+    """(Re)builds the model index; unchanged files keep their entry. Returns the index."""
+    with _build_lock:
+        previous = load_index().get("models", {})
+        # Small files matter here (LoRAs, embeddings), unlike for deduplication
+        inodes = find_model_files(roots or [r for r in MODEL_ROOTS if os.path.isdir(r)], min_size=0)
+        references = _instance_references()
+        models = {}
+        parsed = 0
+        for i, ((dev, ino), info) in enumerate(inodes.items()):
+            if job:
+                job.check_cancelled()
+                job.progress(i / max(1, len(inodes)), f"Indexing {len(inodes)} model files...")
+            path = info["paths"][0]
+            entry = previous.get(path)
+            if not entry or entry.get("size_bytes") != info["size"] or entry.get("mtime_ns") != info["mtime_ns"]:
+                entry = {"size_bytes": info["size"], "mtime_ns": info["mtime_ns"], "format": os.path.splitext(path)[1].lstrip(".").lower()}
+                if path.lower().endswith(SAFETENSORS_EXTENSIONS):
+                    try:
+                        entry.update(describe_safetensors(path))
+                    except (OSError, ValueError) as e:
+                        entry["error"] = str(e)
+                parsed += 1
+            entry = dict(entry, name=os.path.basename(path), path=path, links=info["paths"][1:],
+                         instances=_referencing_instances(info["paths"], references))
+            models[path] = entry
+
+        index = {"indexed_at": time.time(), "models": models}
+        os.makedirs(os.path.dirname(INDEX_FILE), exist_ok=True)
+        tmp_path = f"{INDEX_FILE}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, INDEX_FILE)
+        print(f"[Model-Index] Indexed {len(models)} model files ({parsed} parsed, {len(models) - parsed} unchanged).")
+        return index
+
+
+def list_models(architecture: str | None = None, dtype: str | None = None, instance: str | None = None,
+                search: str | None = None, min_size_bytes: int = 0) -> list:
+    """Models of the index matching every given filter (case-insensitive substrings), largest first."""
+    models = load_index().get("models", {}).values()
+
+    def matches(model: dict) -> bool:
+        if model["size_bytes"] < min_size_bytes:
+            return False
+        if architecture and not any(architecture.lower() in hint.lower() for hint in model.get("architecture", [])):
+            return False
+        if dtype and (model.get("dtype") or "").lower() != dtype.lower():
+            return False
+        if instance and instance not in model.get("instances", []):
+            return False
+        if search and search.lower() not in model["path"].lower():
+            return False
+        return True
+
+    return sorted((m for m in models if matches(m)), key=lambda m: -m["size_bytes"])
@@ -0,0 +1,318 @@
+"""
+Page-cache pre-warming of instance models.
+
+While an instance is "starting" (its blueprint still syncs repositories, checks its env
+and imports Python modules), the model files it is about to load are read into the page
+cache, so that the first generation does not wait for minutes of cold disk I/O.
+
+The files come from two sources:
+  - the blueprint: '# aikore.prewarm = <glob>[, <glob>...]' in its metadata block, with
+    globs relative to the instance directory (e.g. ComfyUI/models/checkpoints/*.safetensors);
+  - recent use: while an instance runs, the model files its processes have open or
+    mapped are sampled from /proc and kept in .aikore_model_usage.json.
+Recently used files come first (most recent first), then the declared ones, within a
+budget of the available memory. Each file gets posix_fadvise(WILLNEED) and is then read
+in chunks by a thread at idle CPU and I/O priority, so the instance always goes first;
+chunks already resident (mincore) are skipped. Residency is measured the same way.
+  AIKORE_PREWARM                  0 disables pre-warming (default 1)
+  AIKORE_PREWARM_MAX_FRACTION     share of MemAvailable that may be pre-warmed (default 0.5)
+  AIKORE_MODEL_USAGE_DAYS         how long a used model stays in the history (default 14)
+"""
+import os
+import glob
+import json
+import mmap
+import time
+import ctypes
+import threading
+
+import psutil
+
+from aikore.core.priority import lower_current_thread_priority
+
+PREWARM_ENABLED = os.environ.get("AIKORE_PREWARM", "1") != "0"
+PREWARM_MAX_FRACTION = float(os.environ.get("AIKORE_PREWARM_MAX_FRACTION", "0.5"))
+USAGE_MAX_AGE = float(os.environ.get("AIKORE_MODEL_USAGE_DAYS", "14")) * 86400
+USAGE_FILENAME = ".aikore_model_usage.json"
+
+MODEL_EXTENSIONS = (".safetensors", ".sft", ".ckpt", ".pt", ".pth", ".bin", ".gguf", ".onnx")
+MIN_MODEL_SIZE = 16 * 1024 * 1024
+CHUNK_SIZE = 8 * 1024 * 1024
+SAMPLE_INTERVAL = 60
+# The last-seen time of a model already in the history is only rewritten this often
+USAGE_WRITE_INTERVAL = 3600
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+_LSB_TABLE = bytes(b & 1 for b in range(256))
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.mmap.restype = ctypes.c_void_p
+        libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+        libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+        _libc = libc
+    return _libc
+
+
+def _residency_vector(fd: int, size: int) -> bytes | None:
+    """One byte per page of the file, 1 if the page is in the page cache (mincore(2))."""
+    libc = _get_libc()
+    addr = libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+    if addr is None or addr == ctypes.c_void_p(-1).value:
+        return None
+    try:
+        pages = (size + PAGE_SIZE - 1) // PAGE_SIZE
+        vec = (ctypes.c_ubyte * pages)()
+        if libc.mincore(addr, size, vec) != 0:
+            return None
+        return bytes(vec).translate(_LSB_TABLE)
+    finally:
+        libc.munmap(addr, size)
+
+
+def resident_bytes(path: str) -> tuple:
+    """Returns (size, bytes in the page cache or None if unknown) of a file."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return 0, None
+    try:
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return 0, 0
+        vec = _residency_vector(fd, size)
+        return size, (min(vec.count(1) * PAGE_SIZE, size) if vec is not None else None)
+    except OSError:
+        return 0, None
+    finally:
+        os.close(fd)
+
+
+def _is_model_file(path: str) -> bool:
+    if not path.lower().endswith(MODEL_EXTENSIONS):
+        return False
+    try:
+        return os.path.getsize(path) >= MIN_MODEL_SIZE
+    except OSError:
+        return False
+
+
+# --- Usage history ---
+
+def _usage_path(conf_dir: str) -> str:
+    return os.path.join(conf_dir, USAGE_FILENAME)
+
+
+def load_usage(conf_dir: str) -> dict:
+    """{model path: last time an instance process had it open or mapped}."""
+    try:
+        with open(_usage_path(conf_dir), 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _save_usage(conf_dir: str, usage: dict):
+    tmp_path = f"{_usage_path(conf_dir)}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(usage, f, indent=4)
+        os.replace(tmp_path, _usage_path(conf_dir))
+    except OSError as e:
+        print(f"[Prewarm] Could not save the model usage of '{conf_dir}': {e}")
+
+
+def _open_model_files(pid: int) -> set:
+    """Model files open or memory-mapped by a process and its children."""
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return set()
+    found = set()
+    for process in processes:
+        try:
+            with open(f"/proc/{process.pid}/maps", 'r') as f:
+                for line in f:
+                    parts = line.split(None, 5)
+                    if len(parts) == 6 and parts[5].startswith("/"):
+                        found.add(parts[5].rstrip("\n"))
+            found.update(f.path for f in process.open_files())
+        except (OSError, psutil.Error):
+            continue
+    return {path for path in found if _is_model_file(path)}
+
+
+# --- Pre-warming ---
+
+def _candidate_files(conf_dir: str, patterns: str | None) -> list:
+    """Model files to pre-warm, most relevant first: recently used, then declared by the blueprint."""
+    now = time.time()
+    usage = load_usage(conf_dir)
+    files = [path for path, seen in sorted(usage.items(), key=lambda item: -item[1])
+             if now - seen <= USAGE_MAX_AGE and os.path.isfile(path)]
+    for pattern in (patterns or "").split(","):
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        matches = glob.glob(os.path.join(conf_dir, pattern), recursive=True)
+        # Newest files first: the most likely to be loaded
+        for path in sorted(matches, key=lambda p: -os.path.getmtime(p)):
+            real_path = os.path.realpath(path)
+            if real_path not in files and _is_model_file(real_path):
+                files.append(real_path)
+    return files
+
+
+def _mem_available() -> int:
+    try:
+        return psutil.virtual_memory().available
+    except Exception:
+        return 0
+
+
+def _warm_file(path: str, cancel: threading.Event, status: dict):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        vec = _residency_vector(fd, size) if size else None
+        try:
+            os.posix_fadvise(fd, 0, size, os.POSIX_FADV_WILLNEED)
+        except (AttributeError, OSError):
+            pass
+        buffer = bytearray(CHUNK_SIZE)
+        pages_per_chunk = CHUNK_SIZE // PAGE_SIZE
+        for offset in range(0, size, CHUNK_SIZE):
+            if cancel.is_set():
+                return
+            if vec is not None:
+                first_page = offset // PAGE_SIZE
+                if vec.count(0, first_page, first_page + pages_per_chunk) == 0:
+                    continue
+            read = os.preadv(fd, [buffer], offset)
+            status["read_bytes"] += read
+            if read <= 0:
+                break
+    finally:
+        os.close(fd)
+
+
+class PrewarmManager:
+    """Runs one pre-warm thread per starting instance and samples model usage of running instances."""
+
+    def __init__(self):
+        self._status = {}
+        self._cancel = {}
+        self._tracked = {}
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    def start(self, instance_id: int, pid: int, conf_dir: str, patterns: str | None):
+        """Starts pre-warming the models of an instance and tracking the models it uses."""
+        with self._lock:
+            self._tracked[instance_id] = (pid, conf_dir, {})
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name="model-usage-sampler", daemon=True)
+                self._sampler.start()
+            if not PREWARM_ENABLED:
+                self._status[instance_id] = {"state": "disabled"}
+                return
+            previous = self._cancel.get(instance_id)
+            if previous:
+                previous.set()
+            cancel = threading.Event()
+            self._cancel[instance_id] = cancel
+            status = {"state": "queued", "files": 0, "planned_bytes": 0, "read_bytes": 0,
+                      "started_at": time.time(), "finished_at": None}
+            self._status[instance_id] = status
+        threading.Thread(target=self._run, args=(instance_id, conf_dir, patterns, cancel, status),
+                         name=f"prewarm-{instance_id}", daemon=True).start()
+
+    def stop(self, instance_id: int):
+        """Cancels the pre-warm of an instance and stops sampling its model usage."""
+        with self._lock:
+            cancel = self._cancel.pop(instance_id, None)
+            self._tracked.pop(instance_id, None)
+        if cancel:
+            cancel.set()
+
+    def _run(self, instance_id: int, conf_dir: str, patterns: str | None, cancel: threading.Event, status: dict):
+        lower_current_thread_priority()
+        planned = []
+        try:
+            budget = int(_mem_available() * PREWARM_MAX_FRACTION)
+            for path in _candidate_files(conf_dir, patterns):
+                size = os.path.getsize(path)
+                if size <= budget:
+                    planned.append(path)
+                    budget -= size
+            status.update(state="running", files=len(planned), planned_bytes=sum(os.path.getsize(p) for p in planned))
+            if planned:
+                print(f"[Prewarm] Instance {instance_id}: reading {len(planned)} model files ({status['planned_bytes'] / 1024 ** 3:.1f} GB) into the page cache.")
+            for path in planned:
+                if cancel.is_set():
+                    break
+                try:
+                    _warm_file(path, cancel, status)
+                except OSError as e:
+                    print(f"[Prewarm] Instance {instance_id}: could not read '{path}': {e}")
+            status["state"] = "cancelled" if cancel.is_set() else "done"
+        except Exception as e:
+            status["state"] = "failed"
+            print(f"[Prewarm] Instance {instance_id}: pre-warm failed: {e}")
+        status["finished_at"] = time.time()
+        if planned and status["state"] == "done":
+            elapsed = status["finished_at"] - status["started_at"]
+            print(f"[Prewarm] Instance {instance_id}: done in {elapsed:.0f}s ({status['read_bytes'] / 1024 ** 3:.1f} GB read from disk).")
+
+    def _sample_loop(self):
+        lower_current_thread_priority()
+        while True:
+            time.sleep(SAMPLE_INTERVAL)
+            with self._lock:
+                tracked = list(self._tracked.items())
+            for instance_id, (pid, conf_dir, last_written) in tracked:
+                if not psutil.pid_exists(pid):
+                    with self._lock:
+                        self._tracked.pop(instance_id, None)
+                    continue
+                try:
+                    self._record_usage(conf_dir, _open_model_files(pid), last_written)
+                except Exception as e:
+                    print(f"[Prewarm] Could not sample the models of instance {instance_id}: {e}")
+
+    def _record_usage(self, conf_dir: str, paths: set, last_written: dict):
+        now = time.time()
+        stale = [p for p in paths if now - last_written.get(p, 0) >= USAGE_WRITE_INTERVAL]
+        if not stale:
+            return
+        usage = {path: seen for path, seen in load_usage(conf_dir).items() if now - seen <= USAGE_MAX_AGE}
+        for path in stale:
+            usage[path] = now
+            last_written[path] = now
+        _save_usage(conf_dir, usage)
+
+    def report(self, instance_id: int, conf_dir: str, patterns: str | None) -> dict:
+        """Pre-warm state of an instance and the page-cache residency of its model files."""
+        files = []
+        for path in _candidate_files(conf_dir, patterns):
+            size, resident = resident_bytes(path)
+            files.append({"path": path, "size_bytes": size, "resident_bytes": resident})
+        total = sum(f["size_bytes"] for f in files)
+        resident = sum(f["resident_bytes"] or 0 for f in files)
+        return {
+            "prewarm": dict(self._status.get(instance_id, {"state": "idle"})),
+            "files": files,
+            "total_bytes": total,
+            "resident_bytes": resident,
+            "resident_fraction": round(resident / total, 3) if total else None,
+        }
+
+
+prewarm_manager = PrewarmManager()
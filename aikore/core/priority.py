@@ -0,0 +1,43 @@
+"""
+Helpers to run background work (env provisioning, cache maintenance, deletions)
+at idle CPU and I/O priority, so that it never competes with running instances.
+"""
+import os
+import shutil
+import ctypes
+import threading
+
+# ioprio_set(2) constants (linux/ioprio.h)
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+_SYS_IOPRIO_SET = {"x86_64": 251, "aarch64": 30}
+
+
+def low_priority_prefix() -> str:
+    """Shell prefix running a command at idle I/O class and lowest CPU priority."""
+    prefix = "nice -n 19 "
+    if shutil.which("ionice"):
+        prefix = "ionice -c3 " + prefix
+    return prefix
+
+
+def lower_current_thread_priority():
+    """
+    Moves the calling thread to the lowest CPU priority and the idle I/O class.
+    Linux applies both per thread, so the rest of AiKore keeps its priority.
+    Failures are ignored: this is a best-effort optimization.
+    """
+    tid = threading.get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, tid, 19)
+    except (AttributeError, OSError):
+        pass
+    syscall_nr = _SYS_IOPRIO_SET.get(os.uname().machine)
+    if syscall_nr is None:
+        return
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.syscall(syscall_nr, _IOPRIO_WHO_PROCESS, tid, _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT)
+    except (OSError, AttributeError):
+        pass
@@ -14,6 +14,8 @@ import fcntl
 import termios
 import struct
 import shutil
+import json
+import shlex
 from pathlib import Path
 from subprocess import PIPE, STDOUT
 from sqlalchemy.orm import Session
@@ -21,9 +23,14 @@ from sqlalchemy.orm import Session
 # We will need access to the DB models and the session factory
 from aikore.database import models
 from aikore.database.session import SessionLocal
+from aikore.core import wheel_compat, disk_usage, env_probe, env_snapshots, start_stamp
+from aikore.core.cache_manager import cache_manager, package_cache_env, kernel_cache_env
+from aikore.core.trashcan import trashcan
+from aikore.core.jobs import jobs
+from aikore.core.prewarm import prewarm_manager
 
 # --- CONSTANTS ---
-from aikore.config import INSTANCES_DIR, OUTPUTS_DIR, BLUEPRINTS_DIR, CUSTOM_BLUEPRINTS_DIR, SCRIPTS_DIR
+from aikore.config import INSTANCES_DIR, OUTPUTS_DIR, BLUEPRINTS_DIR, CUSTOM_BLUEPRINTS_DIR, SCRIPTS_DIR, CACHE_DIR, VERSIONS_ENV_FILE, TMP_DIR
 
 # Keep local references for backward compatibility in this module
 INSTANCES_DIR = INSTANCES_DIR
@@ -33,6 +40,12 @@ CUSTOM_BLUEPRINTS_DIR = CUSTOM_BLUEPRINTS_DIR
 SCRIPTS_DIR = SCRIPTS_DIR
 NGINX_SITES_AVAILABLE = "/etc/nginx/locations.d"
 NGINX_RELOAD_FLAG = Path("/run/aikore/nginx_reload.flag")
+# Local PEP 503 index over the global wheel store (see api/wheel_index.py), reached directly on uvicorn
+WHEEL_INDEX_BASE_URL = "http://127.0.0.1:8000/api/wheels"
+# Cached version check output, next to the instance (not inside its env)
+VERSION_CHECK_CACHE_FILENAME = ".aikore_version_check.json"
+# Prebuilt base envs (python + torch), one per (python, cuda, torch) triple, cloned by blueprints
+ENV_TEMPLATES_DIR = os.path.join(CACHE_DIR, "env-templates")
 
 # Timeout in seconds before an instance is marked as 'stalled'
 STALLED_TIMEOUT = 180
@@ -126,6 +139,30 @@ def _cleanup_instance_files(instance_slug: str):
     if os.path.isdir(firefox_profile_dir):
         shutil.rmtree(firefox_profile_dir, ignore_errors=True)
 
+    _purge_path(os.path.join(TMP_DIR, instance_slug))
+
+
+def _purge_path(path: str):
+    """Hands a leftover temp path to the trashcan purger (renamed away instantly, deleted in the background)."""
+    if not os.path.lexists(path):
+        return
+    try:
+        trashcan.schedule_purge(path)
+    except OSError as e:
+        print(f"[Manager] Could not schedule the removal of '{path}': {e}")
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def purge_stale_tmp_dirs():
+    """Removes everything left in TMP_DIR by previous runs. Only valid while no instance is running."""
+    try:
+        names = os.listdir(TMP_DIR)
+    except OSError:
+        return 0
+    for name in names:
+        _purge_path(os.path.join(TMP_DIR, name))
+    return len(names)
+
 # --- TERMINAL MANAGEMENT ---
 
 def _find_blueprint_path(blueprint_filename: str) -> str | None:
@@ -173,6 +210,65 @@ def parse_blueprint_metadata(blueprint_filename: str) -> dict:
     return metadata
 
 
+def _read_versions_env() -> dict:
+    """Reads the KEY=VALUE defaults of versions.env (the blueprints source the same file)."""
+    values = {}
+    try:
+        with open(VERSIONS_ENV_FILE, 'r') as f:
+            for line in f:
+                m = re.match(r'^\s*(?:export\s+)?([A-Z0-9_]+)=(?:"([^"]*)"|(\S*))', line)
+                if m:
+                    values[m.group(1)] = m.group(2) if m.group(2) is not None else m.group(3)
+    except OSError:
+        pass
+    return values
+
+
+def _resolve_stack_versions(instance: models.Instance, launch_sh_path: str) -> tuple:
+    """
+    Returns the (python version, CUDA tag, torch version) of an instance, each None if it
+    cannot be determined. Custom instance versions override versions.env; the default
+    Python version is the one the launch script falls back to (${PYTHON_VERSION:-X}).
+    """
+    defaults = _read_versions_env()
+    torch_version = instance.torch_version or defaults.get("TORCH_VERSION")
+    if instance.cuda_version:
+        cuda_tag = "cu" + instance.cuda_version.replace(".", "")
+    else:
+        m = re.search(r"/(cu\d+|cpu|rocm[\d.]+)/?$", defaults.get("PYTORCH_INDEX_URL", ""))
+        cuda_tag = m.group(1) if m else None
+    python_version = instance.python_version
+    if not python_version:
+        try:
+            with open(launch_sh_path, 'r') as f:
+                m = re.search(r"PYTHON_VERSION:-([0-9.]+)", f.read())
+            python_version = m.group(1) if m else None
+        except OSError:
+            python_version = None
+    return python_version, cuda_tag, torch_version
+
+
+def get_env_template_path(instance: models.Instance, launch_sh_path: str) -> str | None:
+    """Returns the template env path for the instance's (python, cuda, torch) triple, or None if it cannot be determined."""
+    python_version, cuda_tag, torch_version = _resolve_stack_versions(instance, launch_sh_path)
+    if not (torch_version and cuda_tag and python_version):
+        return None
+    key = re.sub(r"[^A-Za-z0-9.+_-]", "_", f"py{python_version}-{cuda_tag}-torch{torch_version}")
+    return os.path.join(ENV_TEMPLATES_DIR, key)
+
+
+def get_kernel_cache_key(instance: models.Instance, launch_sh_path: str) -> str:
+    """
+    Key of the kernel cache shared by the instances of a (torch, CUDA, GPU architectures)
+    stack: compiled kernels are only valid for the toolchain and the GPUs that built them.
+    """
+    _, cuda_tag, torch_version = _resolve_stack_versions(instance, launch_sh_path)
+    archs = wheel_compat.get_gpu_archs(instance.gpu_ids)
+    arch_tag = "sm" + "_".join(sorted(a.replace(".", "") for a in archs)) if archs else "sm-unknown"
+    key = f"torch{torch_version or 'unknown'}-{cuda_tag or 'unknown'}-{arch_tag}"
+    return re.sub(r"[^A-Za-z0-9.+_-]", "_", key)
+
+
 def _parse_venv_from_launch_sh(launch_sh_path: str) -> dict:
     """
     Reads the AIKORE-METADATA block from an instance's launch.sh file.
@@ -308,6 +404,9 @@ def monitor_instance_thread(instance_id: int, pid: int, port_to_monitor: int, in
                 with SessionLocal() as db:
                     db.query(models.Instance).filter(models.Instance.id == instance_id).update({"status": "started"})
                     db.commit()
+                _record_install_stats(instance_id)
+                _write_start_stamp(instance_id)
+                request_env_snapshot(instance_id)
 
                 if persistent_display is not None:
                     print(f"[Monitor-{instance_id}] Persistent mode detected. Launching Firefox on display :{persistent_display}.")
@@ -389,6 +488,16 @@ def start_instance_process(db: Session, instance: models.Instance):
     if not instance.persistent_mode and instance.port is None:
         raise ValueError(f"Cannot start instance '{instance.name}': port is missing. Please update configuration.")
 
+    # --- DISK QUOTA CHECK (from the background index, no walk) ---
+    quota_warning = None
+    usage = get_instance_disk_usage(db, instance)
+    used_gb = ((usage["total"] or 0) + (usage["outputs"] or 0)) / (1024 ** 3)
+    if usage["quota"]["state"] == "hard":
+        raise disk_usage.DiskQuotaExceeded(f"Cannot start instance '{instance.name}': disk usage ({used_gb:.1f} GB) exceeds its hard quota of {usage['quota']['hard_gb']} GB.")
+    if usage["quota"]["state"] == "soft":
+        quota_warning = f"[AiKore] WARNING: disk usage ({used_gb:.1f} GB) exceeds the soft quota of {usage['quota']['soft_gb']} GB."
+        print(f"[Manager] [Warning] Instance '{instance.name}': {quota_warning}")
+
 
     # --- NEW: Logic to handle satellite vs. normal instances ---
     is_satellite = instance.parent_instance_id is not None
@@ -424,8 +533,10 @@ def start_instance_process(db: Session, instance: models.Instance):
     os.makedirs(instance_output_dir, exist_ok=True)
     os.makedirs(NGINX_SITES_AVAILABLE, exist_ok=True)
 
-    global_tmp_dir = "/config/tmp"
-    os.makedirs(global_tmp_dir, exist_ok=True)
+    # Private temp dir, emptied at every start and removed at stop
+    instance_tmp_dir = os.path.join(TMP_DIR, instance_slug)
+    _purge_path(instance_tmp_dir)
+    os.makedirs(instance_tmp_dir, exist_ok=True)
     
     # --- NEW: Write aikore_vars.env for custom versions ---
     custom_vars_path = os.path.join(effective_conf_dir, "aikore_vars.env")
@@ -469,7 +580,7 @@ def start_instance_process(db: Session, instance: models.Instance):
 
     # --- Environment Setup ---
     env = os.environ.copy()
-    env["TMPDIR"] = global_tmp_dir
+    env["TMPDIR"] = instance_tmp_dir
     
     # --- GPU Configuration ---
     # Ensure PCI_BUS_ID ordering to prevent mismatches between expected and actual GPU indices
@@ -496,6 +607,40 @@ def start_instance_process(db: Session, instance: models.Instance):
     if instance.python_version: env["PYTHON_VERSION"] = instance.python_version
     if instance.cuda_version: env["CUDA_VERSION"] = instance.cuda_version
     if instance.torch_version: env["TORCH_VERSION"] = instance.torch_version
+
+    # Wheel index scoped to the architectures of the instance GPUs and to its torch/CUDA
+    # versions, so pip never picks a wheel built for another ABI (pip --extra-index-url)
+    gpu_archs = wheel_compat.get_gpu_archs(instance.gpu_ids)
+    _, cuda_tag, torch_version = _resolve_stack_versions(instance, dest_script_path)
+    wheel_stack = wheel_compat.stack_scope(torch_version, cuda_tag)
+    index_url = WHEEL_INDEX_BASE_URL
+    if gpu_archs:
+        index_url += f"/arch/{'_'.join(sorted(gpu_archs))}"
+        if wheel_stack:
+            index_url += f"/{wheel_stack}"
+    elif wheel_stack:
+        index_url += f"/stack/{wheel_stack}"
+    env["AIKORE_WHEEL_INDEX_URL"] = f"{index_url}/simple/"
+
+    # Shared, size-capped pip/uv/conda download cache (see core/cache_manager.py)
+    env.update(package_cache_env())
+    # Triton, torch.compile, torch extension and CUDA JIT caches, shared by the instances of the
+    # same torch/CUDA/GPU stack and size-capped (see core/cache_manager.py)
+    env.update(kernel_cache_env(get_kernel_cache_key(instance, dest_script_path)))
+
+    # Base env (python + torch) that blueprints clone instead of creating a new env (see functions.sh)
+    env_template = get_env_template_path(instance, dest_script_path)
+    if env_template:
+        env["AIKORE_ENV_TEMPLATE"] = env_template
+
+    # Fast path: blueprints skip their setup phases when nothing changed since the last
+    # successful start (see core/start_stamp.py and aikore_fast_path in functions.sh)
+    venv_path = _get_instance_venv_metadata(instance, effective_conf_dir).get('venv_path')
+    stamp_match, stamp_reason = start_stamp.check_stamp(effective_conf_dir, os.path.join(effective_conf_dir, venv_path) if venv_path else None)
+    env["AIKORE_START_STAMP_MATCH"] = "1" if stamp_match else "0"
+    print(f"[Manager] Instance '{instance.name}': {'fast start' if stamp_match else 'full setup'} ({stamp_reason}).")
+    # The setup phases of this start report their own failures
+    start_stamp.clear_setup_failure(effective_conf_dir)
     
     port_to_monitor = instance.port
     internal_app_port = instance.port
@@ -530,6 +675,9 @@ def start_instance_process(db: Session, instance: models.Instance):
 
     output_log_path = os.path.join(log_and_cwd_dir, "output.log")
     with open(output_log_path, 'w') as output_log:
+        if quota_warning:
+            output_log.write(quota_warning + "\n")
+            output_log.flush()
         main_process = subprocess.Popen(main_cmd, cwd=log_and_cwd_dir, env=env, stdout=output_log, stderr=output_log, preexec_fn=os.setsid)
     
     instance.pid = main_process.pid
@@ -544,6 +692,9 @@ def start_instance_process(db: Session, instance: models.Instance):
     monitor.start()
 
     running_instances[instance.id] = {"process": main_process, "monitor_thread": monitor}
+
+    # Read the models the instance is about to load into the page cache while it starts
+    prewarm_manager.start(instance.id, main_process.pid, effective_conf_dir, get_prewarm_patterns(instance, effective_conf_dir))
     print(f"[Manager] Started instance '{instance.name}' (PID: {instance.pid}) and its monitor thread.")
 
 
@@ -552,6 +703,7 @@ def stop_instance_process(db: Session, instance: models.Instance):
     Stops a running instance process and its monitor thread.
     """
     instance_id = instance.id
+    prewarm_manager.stop(instance_id)
     if instance_id not in running_instances:
         print(f"[Manager] Stop requested, but instance {instance_id} not in running_instances dict. Cleaning up files.")
     else:
@@ -598,34 +750,125 @@ def _get_instance_venv_metadata(instance: models.Instance, instance_conf_dir: st
     return metadata
 
 
+def get_prewarm_patterns(instance: models.Instance, instance_conf_dir: str) -> str | None:
+    """Model globs declared by 'aikore.prewarm' in the instance launch.sh, or else in its blueprint."""
+    patterns = _parse_venv_from_launch_sh(os.path.join(instance_conf_dir, "launch.sh")).get('prewarm')
+    return patterns or parse_blueprint_metadata(instance.base_blueprint).get('prewarm')
+
+
+def get_instance_disk_usage(db: Session, instance: models.Instance) -> dict:
+    """
+    Disk usage breakdown of an instance (from the background index) and its quota state.
+    Satellites share their parent's directory, so the parent's directory and quotas apply.
+    """
+    owner = instance
+    if instance.parent_instance_id is not None:
+        from aikore.database import crud  # Local import to avoid circular dependency
+        owner = crud.get_instance(db, instance_id=instance.parent_instance_id) or instance
+    instance_conf_dir = os.path.join(INSTANCES_DIR, owner.name)
+    venv_path = _get_instance_venv_metadata(owner, instance_conf_dir).get('venv_path')
+    output_dir = os.path.join(OUTPUTS_DIR, instance.output_path or instance.name)
+
+    usage = disk_usage.get_instance_usage(instance_conf_dir, venv_path, output_dir)
+    usage["quota"] = {
+        "soft_gb": owner.disk_quota_soft_gb,
+        "hard_gb": owner.disk_quota_hard_gb,
+        "state": disk_usage.get_quota_state(usage, owner.disk_quota_soft_gb, owner.disk_quota_hard_gb),
+    }
+    return usage
+
+
+def get_instance_env_path(instance: models.Instance) -> tuple:
+    """Returns (instance_conf_dir, full env path or None if the blueprint declares no venv)."""
+    instance_conf_dir = os.path.join(INSTANCES_DIR, instance.name)
+    venv_path = _get_instance_venv_metadata(instance, instance_conf_dir).get('venv_path')
+    return instance_conf_dir, os.path.join(instance_conf_dir, venv_path) if venv_path else None
+
+
+def _record_install_stats(instance_id: int):
+    """Feeds the package cache hit statistics with the install output of a start."""
+    try:
+        with SessionLocal() as db:
+            instance = db.query(models.Instance).filter(models.Instance.id == instance_id).first()
+            if not instance:
+                return
+            output_log_path = os.path.join(INSTANCES_DIR, instance.name, "output.log")
+        with open(output_log_path, 'r', encoding='utf-8', errors='ignore') as f:
+            cache_manager.record_install_log(f.read())
+    except OSError:
+        pass
+
+
+def _write_start_stamp(instance_id: int):
+    """Records the start fingerprint of an instance that just started (satellites stamp their parent's dir)."""
+    try:
+        with SessionLocal() as db:
+            instance = db.query(models.Instance).filter(models.Instance.id == instance_id).first()
+            if not instance:
+                return
+            if instance.parent_instance_id is not None:
+                instance = db.query(models.Instance).filter(models.Instance.id == instance.parent_instance_id).first()
+                if not instance:
+                    return
+            instance_conf_dir, env_path = get_instance_env_path(instance)
+        start_stamp.write_stamp(instance_conf_dir, env_path)
+    except Exception as e:
+        print(f"[Manager] Could not write the start stamp of instance {instance_id}: {e}")
+
+
+def request_env_snapshot(instance_id: int, reason: str = "start"):
+    """
+    Queues an 'env_snapshot' job for an instance (see core/env_snapshots.py), unless its
+    env is unchanged since the last snapshot. Satellites use their parent's env and are skipped.
+    """
+    try:
+        with SessionLocal() as db:
+            instance = db.query(models.Instance).filter(models.Instance.id == instance_id).first()
+            if not instance or instance.parent_instance_id is not None:
+                return
+            instance_conf_dir, env_path = get_instance_env_path(instance)
+        if env_path and not env_snapshots.is_up_to_date(instance_conf_dir, env_path):
+            jobs.submit("env_snapshot", {"instance_id": instance_id, "reason": reason}, instance_id=instance_id)
+    except Exception as e:
+        print(f"[Manager] Could not schedule an env snapshot for instance {instance_id}: {e}")
+
+
 def run_version_check(instance: models.Instance) -> str:
     """
     Runs the version check script within the instance's environment.
+    The script does everything (versions and pip check) in a single interpreter pass.
+    Its output is cached next to the instance and reused while the env fingerprint
+    (site-packages/conda-meta mtimes) and the script itself are unchanged.
     """
     instance_conf_dir = os.path.join(INSTANCES_DIR, instance.name)
     metadata = _get_instance_venv_metadata(instance, instance_conf_dir)
-    
-    venv_type = metadata.get('venv_type')
     venv_path = metadata.get('venv_path')
-    
-    script_path = os.path.join(SCRIPTS_DIR, "version_check.sh")
-    command =['/bin/bash', script_path] # Default command
+    script_path = os.path.join(SCRIPTS_DIR, "version_check.py")
+    cache_path = os.path.join(instance_conf_dir, VERSION_CHECK_CACHE_FILENAME)
 
-    if venv_type and venv_path:
-        full_venv_path = os.path.join(instance_conf_dir, venv_path)
-        if venv_type == 'conda' and os.path.isdir(full_venv_path):
-            # Command to activate conda env and then run the script
-            activate_and_run_cmd = f"source /home/abc/miniconda3/bin/activate {full_venv_path} && bash {script_path}"
-            command =['/bin/bash', '-c', activate_and_run_cmd]
-        elif venv_type == 'python' and os.path.exists(os.path.join(full_venv_path, 'bin', 'activate')):
-            # For standard python venv, we can source it in a subshell
-            activate_and_run_cmd = f"source {os.path.join(full_venv_path, 'bin', 'activate')} && bash {script_path}"
-            command = ['/bin/bash', '-c', activate_and_run_cmd]
+    fingerprint = None
+    if venv_path:
+        env_fp = env_probe.env_fingerprint(os.path.join(instance_conf_dir, venv_path))
+        if env_fp is not None:
+            try:
+                fingerprint = f"{env_fp}|script:{os.stat(script_path).st_mtime_ns}"
+            except OSError:
+                fingerprint = None
 
+    if fingerprint:
+        try:
+            with open(cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached.get("fingerprint") == fingerprint:
+                return cached["output"]
+        except (OSError, json.JSONDecodeError, KeyError):
+            pass
+
+    command, cwd = build_venv_command(instance, f"python -I {shlex.quote(script_path)}")
     try:
         result = subprocess.run(
             command,
-            cwd=instance_conf_dir,
+            cwd=cwd,
             capture_output=True,
             text=True,
             timeout=120 # 120-second timeout for safety
@@ -634,16 +877,23 @@ def run_version_check(instance: models.Instance) -> str:
             # Combine stdout and stderr for better error diagnosis
             error_output = f"Error running version check:\nSTDOUT:\n{result.stdout}\nSTDERR:\n{result.stderr}"
             return error_output
-        return result.stdout
     except subprocess.TimeoutExpired:
         return "Error: The version check script timed out."
     except Exception as e:
         return f"An unexpected error occurred while running version check: {e}"
 
-def run_command_in_instance_venv(instance: models.Instance, command_to_run: str) -> (bool, str):
+    if fingerprint:
+        try:
+            with open(cache_path, 'w') as f:
+                json.dump({"fingerprint": fingerprint, "checked_at": time.time(), "output": result.stdout}, f, indent=4)
+        except OSError as e:
+            print(f"[Manager] Could not write version check cache for '{instance.name}': {e}")
+    return result.stdout
+
+def build_venv_command(instance: models.Instance, command_to_run: str) -> tuple:
     """
-    Runs a given shell command within the instance's configured virtual environment.
-    Returns a tuple of (success: bool, output: str).
+    Wraps a shell command so that it runs inside the instance's configured virtual
+    environment (activated once, in the same shell). Returns (command list, cwd).
     """
     instance_conf_dir = os.path.join(INSTANCES_DIR, instance.name)
     metadata = _get_instance_venv_metadata(instance, instance_conf_dir)
@@ -662,6 +912,19 @@ def run_command_in_instance_venv(instance: models.Instance, command_to_run: str)
             activate_and_run_cmd = f"source {os.path.join(full_venv_path, 'bin', 'activate')} && {command_to_run}"
             command =['/bin/bash', '-c', activate_and_run_cmd]
 
+    # Installs go through the shared package cache, as in the instance itself
+    cache_vars = [f"{key}={value}" for key, value in package_cache_env().items()]
+    return ['env'] + cache_vars + command, instance_conf_dir
+
+
+def run_command_in_instance_venv(instance: models.Instance, command_to_run: str) -> (bool, str):
+    """
+    Runs a given shell command within the instance's configured virtual environment.
+    Returns a tuple of (success: bool, output: str).
+    Blocking: long commands should go through the 'venv_command' job instead.
+    """
+    command, instance_conf_dir = build_venv_command(instance, command_to_run)
+
     try:
         print(f"[Manager] Running command in venv for '{instance.name}': {command_to_run}")
         result = subprocess.run(
@@ -0,0 +1,221 @@
+"""
+Start fingerprints: lets blueprints skip their setup phases on unchanged restarts.
+
+The fingerprint of an instance covers everything its setup phases depend on: the
+launch.sh script, aikore_vars.env, the shared versions.env and functions.sh, the HEAD
+commit of every git checkout in the instance directory, the requirements files of
+those checkouts (and the user requirements.txt), and the env fingerprint (see
+env_probe). Repositories are read straight from .git, git itself is never run.
+
+After a successful start (status "started"), the fingerprint is stored in the
+instance directory. On the next start, the process manager recomputes it before
+launching and exports AIKORE_START_STAMP_MATCH=1 when nothing changed, which the
+blueprints test with `aikore_fast_path` (functions.sh) to go straight to the launch.
+A pending env rebuild never matches, and a stamp older than the maximum age does not
+either, so upstream updates are still pulled regularly. A blueprint phase that fails
+without stopping the script (e.g. install_requirements) leaves a setup-failure marker
+(`aikore_setup_failed` in functions.sh): no stamp is recorded for that start, and the
+next start runs the full setup again.
+  AIKORE_FAST_START                  0 disables the fast path (default 1)
+  AIKORE_FAST_START_MAX_AGE_HOURS    stamp validity (default 24, 0 = no limit)
+"""
+import os
+import json
+import time
+import hashlib
+
+from aikore.config import VERSIONS_ENV_FILE, FUNCTIONS_SH_FILE
+from aikore.core import env_probe
+
+STAMP_FILENAME = ".aikore_start_stamp.json"
+SETUP_FAILED_FILENAME = ".aikore_setup_failed"
+FAST_START_ENABLED = os.environ.get("AIKORE_FAST_START", "1") != "0"
+STAMP_MAX_AGE = float(os.environ.get("AIKORE_FAST_START_MAX_AGE_HOURS", "24")) * 3600
+
+# Checkouts are searched this many levels below the instance directory
+# (e.g. ComfyUI/custom_nodes/<node>/.git)
+REPO_SEARCH_DEPTH = 3
+_SKIPPED_DIRS = {"node_modules", "__pycache__", "models", "output", "outputs"}
+
+
+def _file_digest(path: str) -> str | None:
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _git_dir(repo_dir: str) -> str | None:
+    """Returns the git directory of a checkout (.git, or the target of a .git file)."""
+    dot_git = os.path.join(repo_dir, ".git")
+    if os.path.isdir(dot_git):
+        return dot_git
+    try:
+        with open(dot_git, 'r') as f:
+            content = f.read().strip()
+    except OSError:
+        return None
+    if content.startswith("gitdir:"):
+        return os.path.normpath(os.path.join(repo_dir, content[len("gitdir:"):].strip()))
+    return None
+
+
+def read_git_head(repo_dir: str) -> str | None:
+    """Resolves the HEAD commit of a checkout from its loose or packed refs."""
+    git_dir = _git_dir(repo_dir)
+    if not git_dir:
+        return None
+    try:
+        with open(os.path.join(git_dir, "HEAD"), 'r') as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+    if not head.startswith("ref:"):
+        return head
+    ref = head[len("ref:"):].strip()
+    try:
+        with open(os.path.join(git_dir, ref), 'r') as f:
+            return f.read().strip()
+    except OSError:
+        pass
+    # Worktrees keep their shared refs in the common dir
+    ref_dirs = [git_dir]
+    try:
+        with open(os.path.join(git_dir, "commondir"), 'r') as f:
+            ref_dirs.append(os.path.normpath(os.path.join(git_dir, f.read().strip())))
+    except OSError:
+        pass
+    for ref_dir in ref_dirs:
+        try:
+            with open(os.path.join(ref_dir, "packed-refs"), 'r') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1] == ref:
+                        return parts[0]
+        except OSError:
+            continue
+    return f"unborn:{ref}"
+
+
+def find_repositories(root: str, skip: set = frozenset(), max_depth: int = REPO_SEARCH_DEPTH) -> list:
+    """Lists the git checkouts in root and below (sorted), without following symlinks."""
+    repos = []
+    level = [root]
+    for depth in range(max_depth + 1):
+        next_level = []
+        for path in level:
+            if os.path.exists(os.path.join(path, ".git")):
+                repos.append(path)
+            if depth == max_depth:
+                continue
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if (entry.is_dir(follow_symlinks=False) and not entry.name.startswith(".")
+                                and entry.name not in _SKIPPED_DIRS and entry.path not in skip):
+                            next_level.append(entry.path)
+            except OSError:
+                continue
+        level = next_level
+    return sorted(repos)
+
+
+def compute_fingerprint(conf_dir: str, env_path: str | None) -> dict | None:
+    """
+    Returns the start fingerprint of an instance as {component: digest}, or None when
+    the env is declared but missing (the next start has to create it anyway).
+    """
+    fingerprint = {
+        "launch.sh": _file_digest(os.path.join(conf_dir, "launch.sh")),
+        "aikore_vars.env": _file_digest(os.path.join(conf_dir, "aikore_vars.env")),
+        "requirements.txt": _file_digest(os.path.join(conf_dir, "requirements.txt")),
+        "versions.env": _file_digest(VERSIONS_ENV_FILE),
+        "functions.sh": _file_digest(FUNCTIONS_SH_FILE),
+    }
+    if env_path:
+        env_fp = env_probe.env_fingerprint(env_path)
+        if env_fp is None:
+            return None
+        fingerprint["env"] = env_fp
+
+    for repo in find_repositories(conf_dir, skip={env_path} if env_path else set()):
+        rel = os.path.relpath(repo, conf_dir)
+        fingerprint[f"repo:{rel}"] = read_git_head(repo)
+        requirements = _file_digest(os.path.join(repo, "requirements.txt"))
+        if requirements:
+            fingerprint[f"requirements:{rel}"] = requirements
+    return fingerprint
+
+
+def _read_stamp(conf_dir: str) -> dict:
+    try:
+        with open(os.path.join(conf_dir, STAMP_FILENAME), 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def write_stamp(conf_dir: str, env_path: str | None):
+    """Stores the current fingerprint of a successfully started instance."""
+    if setup_failed(conf_dir):
+        print(f"[Start-Stamp] A setup phase failed in '{conf_dir}', no start stamp recorded.")
+        clear_stamp(conf_dir)
+        return
+    fingerprint = compute_fingerprint(conf_dir, env_path)
+    stamp_path = os.path.join(conf_dir, STAMP_FILENAME)
+    if fingerprint is None:
+        clear_stamp(conf_dir)
+        return
+    tmp_path = f"{stamp_path}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({"created_at": time.time(), "fingerprint": fingerprint}, f, indent=4)
+        os.replace(tmp_path, stamp_path)
+    except OSError as e:
+        print(f"[Start-Stamp] Could not write the start stamp in '{conf_dir}': {e}")
+
+
+def clear_stamp(conf_dir: str):
+    try:
+        os.remove(os.path.join(conf_dir, STAMP_FILENAME))
+    except OSError:
+        pass
+
+
+def setup_failed(conf_dir: str) -> bool:
+    """True when a blueprint phase reported a failure during the current or last start."""
+    return os.path.exists(os.path.join(conf_dir, SETUP_FAILED_FILENAME))
+
+
+def clear_setup_failure(conf_dir: str):
+    try:
+        os.remove(os.path.join(conf_dir, SETUP_FAILED_FILENAME))
+    except OSError:
+        pass
+
+
+def check_stamp(conf_dir: str, env_path: str | None) -> tuple:
+    """
+    Compares the current fingerprint with the stamp of the last successful start.
+    Returns (match, reason); reason explains a mismatch for the logs.
+    """
+    if not FAST_START_ENABLED:
+        return False, "fast start disabled"
+    if os.path.exists(os.path.join(conf_dir, ".rebuild-env")):
+        return False, "env rebuild pending"
+    if setup_failed(conf_dir):
+        return False, "a setup phase failed on the last start"
+    stamp = _read_stamp(conf_dir)
+    if not stamp:
+        return False, "no successful start recorded"
+    if STAMP_MAX_AGE > 0 and time.time() - stamp.get("created_at", 0) > STAMP_MAX_AGE:
+        return False, "stamp expired"
+    fingerprint = compute_fingerprint(conf_dir, env_path)
+    if fingerprint is None:
+        return False, "env missing"
+    stored = stamp.get("fingerprint", {})
+    changed = sorted(key for key in set(fingerprint) | set(stored) if fingerprint.get(key) != stored.get(key))
+    if changed:
+        return False, f"changed: {', '.join(changed[:5])}{' ...' if len(changed) > 5 else ''}"
+    return True, "unchanged since the last successful start"
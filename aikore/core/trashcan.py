@@ -0,0 +1,215 @@
+"""
+Trashcan manager: retention policy and throttled background deletion.
+
+Deleted instances are moved to TRASH_DIR/<name> (an instant rename) together with a
+.aikore_trash.json file holding their database row, so they can be restored later.
+Permanent deletions and expired entries are first renamed into TRASH_DIR/.purging,
+then removed file by file by a single idle-priority thread, rate limited so that a
+multi-GB env never saturates the disk under running instances. Whatever is left in
+.purging after a restart is picked up again.
+
+Retention (checked hourly and after every trash operation):
+  AIKORE_TRASH_MAX_AGE_DAYS   entries trashed longer ago are purged (default 14, 0 = keep)
+  AIKORE_TRASH_MAX_GB         oldest entries are purged until the trash fits (default 0 = no limit)
+  AIKORE_TRASH_DELETE_RATE    files unlinked per second by the purger (default 2000)
+"""
+import os
+import json
+import time
+import stat
+import shutil
+import threading
+from datetime import datetime
+
+from aikore.config import TRASH_DIR
+from aikore.core.priority import lower_current_thread_priority
+from aikore.core.disk_usage import disk_index
+
+METADATA_FILE = ".aikore_trash.json"
+MAX_AGE_DAYS = float(os.environ.get("AIKORE_TRASH_MAX_AGE_DAYS", "14"))
+MAX_BYTES = int(float(os.environ.get("AIKORE_TRASH_MAX_GB", "0")) * 1024 ** 3)
+DELETE_RATE = max(1, int(os.environ.get("AIKORE_TRASH_DELETE_RATE", "2000")))
+GC_INTERVAL = 3600
+
+
+def _force_writable(func, path, exc):
+    """rmtree/unlink error handler: make read-only entries writable and retry once."""
+    try:
+        os.chmod(path, stat.S_IWUSR | stat.S_IRUSR | stat.S_IXUSR)
+        func(path)
+    except OSError as e:
+        print(f"[Trashcan] Failed to delete '{path}': {e}")
+
+
+def throttled_rmtree(path: str, files_per_second: int = DELETE_RATE):
+    """Bottom-up removal of a tree, sleeping between batches to cap the unlink rate."""
+    batch = max(1, files_per_second // 10)
+    removed = 0
+    for root, dirs, files in os.walk(path, topdown=False):
+        links = [d for d in dirs if os.path.islink(os.path.join(root, d))]
+        for name in files + links:
+            entry = os.path.join(root, name)
+            try:
+                os.unlink(entry)
+            except OSError as e:
+                _force_writable(os.unlink, entry, e)
+            removed += 1
+            if removed % batch == 0:
+                time.sleep(0.1)
+        for name in dirs:
+            entry = os.path.join(root, name)
+            if name not in links:
+                try:
+                    os.rmdir(entry)
+                except OSError as e:
+                    _force_writable(os.rmdir, entry, e)
+    try:
+        os.rmdir(path)
+    except OSError:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class Trashcan:
+    """Lists, restores and purges trashcan entries; owns the background purger thread."""
+
+    def __init__(self, trash_dir: str):
+        self.trash_dir = trash_dir
+        self.purging_dir = os.path.join(trash_dir, ".purging")
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    # --- Entries ---
+
+    def entry_path(self, name: str) -> str:
+        return os.path.join(self.trash_dir, os.path.basename(name))
+
+    def read_metadata(self, name: str) -> dict | None:
+        try:
+            with open(os.path.join(self.entry_path(name), METADATA_FILE), 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def move_to_trash(self, instance_dir: str, name: str, instance_row: dict | None = None):
+        """Renames an instance directory into the trash and records its database row."""
+        os.makedirs(self.trash_dir, exist_ok=True)
+        dest = self.entry_path(name)
+        shutil.move(instance_dir, dest)
+        metadata = {"name": name, "trashed_at": time.time(), "instance": instance_row}
+        try:
+            with open(os.path.join(dest, METADATA_FILE), 'w') as f:
+                json.dump(metadata, f, indent=4, default=str)
+        except OSError as e:
+            print(f"[Trashcan] Could not write metadata for '{name}': {e}")
+        self.request_gc()
+
+    def list(self) -> list:
+        entries = []
+        try:
+            names = [e.name for e in os.scandir(self.trash_dir) if e.is_dir(follow_symlinks=False) and not e.name.startswith(".")]
+        except OSError:
+            return entries
+        for name in names:
+            path = self.entry_path(name)
+            metadata = self.read_metadata(name)
+            instance_row = (metadata or {}).get("instance") or {}
+            try:
+                trashed_at = metadata["trashed_at"] if metadata else os.path.getmtime(path)
+            except OSError:
+                continue
+            usage = disk_index.get_usage(path)
+            entries.append({
+                "name": name,
+                "trashed_at": trashed_at,
+                "trashed_at_iso": datetime.fromtimestamp(trashed_at).isoformat(timespec="seconds"),
+                "size_bytes": usage["bytes"] if usage else None,
+                "restorable": bool(instance_row),
+                "base_blueprint": instance_row.get("base_blueprint"),
+            })
+        entries.sort(key=lambda e: e["trashed_at"])
+        return entries
+
+    def restore_files(self, name: str, instance_dir: str):
+        """Moves an entry back with a rename (the trash lives on the same filesystem as the instances)."""
+        src = self.entry_path(name)
+        os.rename(src, instance_dir)
+        try:
+            os.remove(os.path.join(instance_dir, METADATA_FILE))
+        except OSError:
+            pass
+        disk_index.request_scan()
+
+    # --- Purging ---
+
+    def schedule_purge(self, path: str):
+        """Renames path into .purging (instant) and lets the purger thread delete it."""
+        os.makedirs(self.purging_dir, exist_ok=True)
+        dest = os.path.join(self.purging_dir, f"{os.path.basename(path)}-{int(time.time() * 1000)}")
+        os.rename(path, dest)
+        self._wakeup.set()
+
+    def purge(self, name: str):
+        self.schedule_purge(self.entry_path(name))
+
+    def gc(self) -> list:
+        """Applies the retention policy. Returns the names scheduled for purge."""
+        with self._lock:
+            entries = self.list()
+            now = time.time()
+            expired = []
+            if MAX_AGE_DAYS > 0:
+                expired = [e for e in entries if now - e["trashed_at"] > MAX_AGE_DAYS * 86400]
+            remaining = [e for e in entries if e not in expired]
+            if MAX_BYTES > 0:
+                total = sum(e["size_bytes"] or 0 for e in remaining)
+                # Least recently trashed first
+                while remaining and total > MAX_BYTES:
+                    oldest = remaining.pop(0)
+                    total -= oldest["size_bytes"] or 0
+                    expired.append(oldest)
+            for entry in expired:
+                try:
+                    self.purge(entry["name"])
+                    print(f"[Trashcan] Purging '{entry['name']}' (retention policy).")
+                except OSError as e:
+                    print(f"[Trashcan] Could not schedule purge of '{entry['name']}': {e}")
+            return [e["name"] for e in expired]
+
+    def _drain_purging(self):
+        try:
+            pending = [e.path for e in os.scandir(self.purging_dir)]
+        except OSError:
+            return
+        for path in pending:
+            started = time.time()
+            throttled_rmtree(path)
+            print(f"[Trashcan] Deleted '{os.path.basename(path)}' in {time.time() - started:.1f}s.")
+        if pending:
+            disk_index.request_scan()
+
+    def _loop(self):
+        lower_current_thread_priority()
+        last_gc = 0
+        while True:
+            try:
+                if time.time() - last_gc > GC_INTERVAL:
+                    self.gc()
+                    last_gc = time.time()
+                self._drain_purging()
+            except Exception as e:
+                print(f"[Trashcan] Background maintenance failed: {e}")
+            self._wakeup.wait(GC_INTERVAL)
+            self._wakeup.clear()
+
+    def start(self):
+        """Starts the purger thread (no-op if already running). Called from the app lifespan."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="trashcan-purger", daemon=True)
+            self._thread.start()
+
+    def request_gc(self):
+        threading.Thread(target=self.gc, daemon=True).start()
+
+
+trashcan = Trashcan(TRASH_DIR)
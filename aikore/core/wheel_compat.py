@@ -0,0 +1,267 @@
+"""
+Wheel-to-environment compatibility matching.
+
+Global wheels are stored as '<PEP 427 name>+archX.Y.whl'. This module parses those
+filenames, combines them with the builder manifest data and an env probe
+(see env_probe.py), and decides whether a wheel can be installed in an instance.
+"""
+import re
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+# Ordered from best to worst, used for ranking.
+COMPAT_RANK = {"compatible": 0, "partial": 1, "unknown": 2, "incompatible": 3}
+
+_ARCH_SUFFIX_RE = re.compile(r'\+arch([\d\._]+)(?=\.whl$)')
+_ARCH_RE = re.compile(r'(\d+)\.(\d+)')
+# Torch/CUDA scope of the wheel index: 'torch2.7-cu12' (or 'torch2.7' without CUDA)
+_STACK_SCOPE_RE = re.compile(r'^torch(\d+\.\d+)(?:-cu(\d+))?$')
+
+# GPU architectures never change while AiKore runs, cache them per index.
+_gpu_arch_cache = {}
+
+
+def normalize_project_name(name: str) -> str:
+    """PEP 503 normalization (e.g. 'Flash_Attn' -> 'flash-attn')."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def clean_wheel_filename(filename: str) -> str:
+    """Strips the '+archX.Y' suffix: 'pkg-1.0-cp312-cp312-linux_x86_64+arch8.9.whl' -> '...linux_x86_64.whl'."""
+    return _ARCH_SUFFIX_RE.sub('', filename)
+
+
+def parse_arch_list(value) -> list:
+    """
+    Extracts 'X.Y' compute capabilities from any arch notation used by AiKore:
+    '8.9', '8.9;9.0', '8.9 9.0', '8.9_9.0', '8.9+PTX'.
+    """
+    if not value or not isinstance(value, str):
+        return []
+    archs = []
+    for major, minor in _ARCH_RE.findall(value):
+        arch = f"{int(major)}.{int(minor)}"
+        if arch not in archs:
+            archs.append(arch)
+    return archs
+
+
+def parse_wheel_filename(filename: str) -> dict | None:
+    """
+    Parses a (possibly arch-suffixed) wheel filename into its PEP 427 components.
+    Returns None if the name is not a valid wheel filename.
+    """
+    archs = []
+    match = _ARCH_SUFFIX_RE.search(filename)
+    if match:
+        archs = parse_arch_list(match.group(1).replace("_", " "))
+        filename = filename[:match.start()] + ".whl"
+
+    if not filename.endswith(".whl"):
+        return None
+    parts = filename[:-4].split("-")
+    if len(parts) not in (5, 6):
+        return None
+
+    return {
+        "project": normalize_project_name(parts[0]),
+        "version": parts[1],
+        "python_tags": parts[-3].split("."),
+        "abi_tags": parts[-2].split("."),
+        "platform_tags": parts[-1].split("."),
+        "archs": archs,
+    }
+
+
+def get_gpu_archs(gpu_ids: str | None = None) -> list:
+    """
+    Returns the compute capabilities of the GPUs visible to an instance.
+    gpu_ids is the instance's comma-separated CUDA_VISIBLE_DEVICES value;
+    if empty, all GPUs are considered. Returns an empty list if NVML is unavailable.
+    """
+    if not pynvml:
+        return []
+    try:
+        pynvml.nvmlInit()
+    except Exception as e:
+        print(f"[Wheel-Compat] NVML unavailable: {e}")
+        return []
+    try:
+        if gpu_ids and gpu_ids.strip():
+            indices = [int(i) for i in re.findall(r'\d+', gpu_ids)]
+        else:
+            indices = list(range(pynvml.nvmlDeviceGetCount()))
+        archs = []
+        for index in indices:
+            if index not in _gpu_arch_cache:
+                handle = pynvml.nvmlDeviceGetHandleByIndex(index)
+                major, minor = pynvml.nvmlDeviceGetCudaComputeCapability(handle)
+                _gpu_arch_cache[index] = f"{major}.{minor}"
+            if _gpu_arch_cache[index] not in archs:
+                archs.append(_gpu_arch_cache[index])
+        return archs
+    except Exception as e:
+        print(f"[Wheel-Compat] GPU architecture detection failed: {e}")
+        return []
+    finally:
+        try:
+            pynvml.nvmlShutdown()
+        except Exception:
+            pass
+
+
+def _version_tuple(version: str | None) -> tuple:
+    """'2.10.0+cu130' -> (2, 10, 0). Returns () if unparsable."""
+    if not version:
+        return ()
+    match = re.match(r'^(\d+)\.(\d+)(?:\.(\d+))?', version)
+    if not match:
+        return ()
+    return tuple(int(p) for p in match.groups() if p is not None)
+
+
+def _cuda_tuple(value: str | None) -> tuple:
+    """Accepts 'cu130', '13.0' or a torch local tag ('2.10.0+cu130'). Returns (13, 0) or ()."""
+    if not value:
+        return ()
+    match = re.search(r'cu(\d+)', value)
+    if match:
+        num = match.group(1)
+        return (int(num[:-1]), int(num[-1])) if len(num) >= 2 else ()
+    return _version_tuple(value)[:2]
+
+
+def stack_scope(torch_version: str | None, cuda_version: str | None) -> str | None:
+    """
+    Wheel index scope of an env: ('2.7.1', 'cu128') -> 'torch2.7-cu12'. Compiled wheels
+    must match the torch major.minor and the CUDA major of the env (see _stack_issues).
+    Returns None if the torch version is unknown.
+    """
+    torch = _version_tuple(torch_version)
+    if len(torch) < 2:
+        return None
+    cuda = _cuda_tuple(cuda_version)
+    return f"torch{torch[0]}.{torch[1]}" + (f"-cu{cuda[0]}" if cuda else "")
+
+
+def parse_stack_scope(scope: str) -> dict | None:
+    """'torch2.7-cu12' -> the torch/CUDA part of an env probe, or None if invalid."""
+    match = _STACK_SCOPE_RE.match(scope)
+    if not match:
+        return None
+    return {"torch_version": match.group(1), "cuda_version": f"{match.group(2)}.0" if match.group(2) else None}
+
+
+def _stack_issues(meta: dict, env: dict) -> tuple:
+    """(errors, warnings) of a wheel's torch and CUDA build versions against an env."""
+    errors, warnings = [], []
+
+    # Torch version the wheel was compiled against
+    wheel_torch = _version_tuple(meta.get("torch_ver"))
+    env_torch = _version_tuple(env.get("torch_version"))
+    if wheel_torch:
+        if not env_torch:
+            errors.append(f"Built against torch {meta.get('torch_ver')}, but torch is not installed in the env.")
+        elif wheel_torch[:2] != env_torch[:2]:
+            errors.append(f"Built against torch {meta.get('torch_ver')}, env has {env.get('torch_version')}.")
+        elif wheel_torch != env_torch:
+            warnings.append(f"Torch patch version differs (built {meta.get('torch_ver')}, env {env.get('torch_version')}).")
+
+    # CUDA major version (minor versions are forward compatible)
+    wheel_cuda = _cuda_tuple(meta.get("cuda_ver")) or _cuda_tuple(meta.get("torch_ver"))
+    env_cuda = _cuda_tuple(env.get("cuda_version"))
+    if wheel_cuda and env_cuda:
+        if wheel_cuda[0] != env_cuda[0]:
+            errors.append(f"Built for CUDA {wheel_cuda[0]}.{wheel_cuda[1]}, env uses CUDA {env.get('cuda_version')}.")
+        elif wheel_cuda != env_cuda:
+            warnings.append(f"CUDA minor version differs (built {wheel_cuda[0]}.{wheel_cuda[1]}, env {env.get('cuda_version')}).")
+    return errors, warnings
+
+
+def is_stack_compatible(meta: dict, scope_env: dict) -> bool:
+    """True unless the wheel was built against another torch major.minor or CUDA major."""
+    errors, _ = _stack_issues(meta, scope_env)
+    return not errors
+
+
+def _python_ok(parsed: dict, env: dict) -> bool:
+    env_tag = env.get("python_tag") or ""
+    env_ver = _version_tuple(env.get("python_version"))
+    abis = parsed["abi_tags"]
+    for tag in parsed["python_tags"]:
+        if tag in (env_tag, "py3", f"py{env_tag[2:]}"):
+            return True
+        # Stable ABI wheels run on any interpreter at least as new as their tag.
+        if "abi3" in abis and tag.startswith("cp3") and env_ver:
+            if (3, int(tag[3:] or 0)) <= env_ver[:2]:
+                return True
+    return False
+
+
+def _platform_ok(parsed: dict, env: dict) -> bool:
+    env_platform = env.get("platform") or ""
+    machine = env_platform.split("-")[-1]
+    for tag in parsed["platform_tags"]:
+        if tag == "any":
+            return True
+        if env_platform.startswith("linux") and tag.startswith(("linux", "manylinux", "musllinux")) and tag.endswith("_" + machine):
+            return True
+    return False
+
+
+def evaluate_wheel(filename: str, meta: dict, env: dict | None, gpu_archs: list) -> dict:
+    """
+    Checks a global wheel against an instance environment.
+
+    Args:
+        filename: The global wheel filename (with its +archX.Y suffix).
+        meta: The builder manifest entry for this wheel (may be empty).
+        env: The env probe result (see env_probe.probe_env), or None if unknown.
+        gpu_archs: The compute capabilities of the instance's GPUs.
+
+    Returns:
+        A dict with 'compatibility' ('compatible', 'partial', 'unknown' or
+        'incompatible') and a list of human-readable 'issues'.
+    """
+    parsed = parse_wheel_filename(filename)
+    if not parsed:
+        return {"compatibility": "unknown", "issues": ["Unrecognized wheel filename."]}
+
+    errors, warnings, unknowns = [], [], []
+
+    # 1. GPU architecture (+archX.Y suffix, manifest as fallback)
+    wheel_archs = parsed["archs"] or parse_arch_list(meta.get("cuda_arch"))
+    if wheel_archs:
+        if not gpu_archs:
+            unknowns.append("GPU architecture could not be detected.")
+        else:
+            missing = [a for a in gpu_archs if a not in wheel_archs]
+            if missing:
+                errors.append(f"Built for sm {', '.join(wheel_archs)}, instance GPUs need {', '.join(missing)}.")
+
+    if env is None:
+        unknowns.append("Environment not probed yet (not installed or not started once).")
+    else:
+        # 2. Python ABI and platform tags
+        if not _python_ok(parsed, env) or not any(a in ("none", "abi3", env.get("abi_tag")) for a in parsed["abi_tags"]):
+            errors.append(f"Python tag {'.'.join(parsed['python_tags'])}-{'.'.join(parsed['abi_tags'])} does not match env {env.get('abi_tag')}.")
+        if not _platform_ok(parsed, env):
+            errors.append(f"Platform {'.'.join(parsed['platform_tags'])} does not match env {env.get('platform')}.")
+
+        # 3. Torch and CUDA versions the wheel was compiled against
+        stack_errors, stack_warnings = _stack_issues(meta, env)
+        errors += stack_errors
+        warnings += stack_warnings
+
+    if errors:
+        status = "incompatible"
+    elif unknowns:
+        status = "unknown"
+    elif warnings:
+        status = "partial"
+    else:
+        status = "compatible"
+    return {"compatibility": status, "issues": errors + unknowns + warnings}
@@ -8,6 +8,7 @@ from ..schemas import instance as schemas
 from ..core.process_manager import INSTANCES_DIR, BLUEPRINTS_DIR, CUSTOM_BLUEPRINTS_DIR
 from ..core.blueprint_parser import get_blueprint_venv_path
 from ..database.session import SessionLocal
+from ..core.disk_usage import disk_index
 import stat
 
 def _on_rm_error(func, path, exc):
@@ -140,10 +141,12 @@ def create_copy_placeholder(db: Session, source_instance_id: int, new_name: str)
     
     return db_instance
 
-def process_background_copy(new_instance_id: int, source_instance_id: int):
+def process_background_copy(new_instance_id: int, source_instance_id: int, job=None):
     """
     STEP 2: Heavy lifting (Filesystem & Conda) running in background.
     Creates its own DB session to avoid DetachedInstanceError.
+    When run as a job (see core/jobs.py), reports progress and honours cancellation;
+    errors are re-raised so the job is marked failed.
     """
     print(f"[Background] Starting copy process for instance ID {new_instance_id}...")
     
@@ -153,7 +156,7 @@ def process_background_copy(new_instance_id: int, source_instance_id: int):
         
         if not new_instance or not source_instance:
             print("[Background] Error: Instance record missing.")
-            return
+            raise ValueError("Instance record missing.")
 
         source_dir = os.path.join(INSTANCES_DIR, source_instance.name)
         clone_dir = os.path.join(INSTANCES_DIR, new_instance.name)
@@ -167,12 +170,32 @@ def process_background_copy(new_instance_id: int, source_instance_id: int):
             print(f"[Background] Copying files from {source_dir} to {clone_dir}...")
             if os.path.exists(clone_dir):
                  shutil.rmtree(clone_dir, onexc=_on_rm_error) # Safety cleanup if retrying
-                 
+
+            # Size estimate from the disk index (no walk), to report progress while copying
+            source_usage = disk_index.get_usage(source_dir)
+            env_usage = disk_index.get_usage(os.path.join(source_dir, venv_dir_name))
+            expected_bytes = max(1, (source_usage["bytes"] if source_usage else 0) - (env_usage["bytes"] if env_usage else 0))
+            copied = {"bytes": 0, "files": 0}
+
+            def _copy_with_progress(src, dst, *, follow_symlinks=True):
+                if job:
+                    job.check_cancelled()
+                result = shutil.copy2(src, dst, follow_symlinks=follow_symlinks)
+                copied["files"] += 1
+                try:
+                    copied["bytes"] += os.lstat(src).st_size
+                except OSError:
+                    pass
+                if job:
+                    job.progress(0.5 * min(1.0, copied["bytes"] / expected_bytes), f"Copying files ({copied['files']} copied)...")
+                return result
+
             shutil.copytree(
                 source_dir, 
                 clone_dir, 
                 ignore=shutil.ignore_patterns(venv_dir_name), 
-                symlinks=True
+                symlinks=True,
+                copy_function=_copy_with_progress
             )
 
             # 3. Clone Conda Environment
@@ -181,11 +204,18 @@ def process_background_copy(new_instance_id: int, source_instance_id: int):
 
             if os.path.isdir(source_env_path):
                 print(f"[Background] Cloning Conda environment...")
-                subprocess.run(["/home/abc/miniconda3/bin/conda", "create", "--prefix", clone_env_path, "--clone", source_env_path, "-y"],
-                    capture_output=True, text=True, check=True
-                )
+                clone_cmd = ["/home/abc/miniconda3/bin/conda", "create", "--prefix", clone_env_path, "--clone", source_env_path, "-y"]
+                if job:
+                    job.progress(0.5, "Cloning Conda environment...", force=True)
+                    result = job.run(clone_cmd)
+                    if result.returncode != 0:
+                        raise subprocess.CalledProcessError(result.returncode, clone_cmd, output=result.stdout)
+                else:
+                    subprocess.run(clone_cmd, capture_output=True, text=True, check=True)
 
             # 4. Update launch.sh
+            if job:
+                job.progress(0.95, "Updating launch.sh...", force=True)
             launch_script_path = os.path.join(clone_dir, "launch.sh")
             if os.path.exists(launch_script_path):
                 with open(launch_script_path, 'r') as f:
@@ -204,16 +234,25 @@ def process_background_copy(new_instance_id: int, source_instance_id: int):
             print(f"[Background] Clone successful for '{new_instance.name}'.")
 
         except Exception as e:
-            print(f"[Background] CRITICAL ERROR cloning instance: {e}")
+            print(f"[Background] CRITICAL ERROR cloning instance: {e!r}")
             traceback.print_exc()
             
-            # FAILURE: Update status to 'error'
+            # FAILURE (or cancellation): Update status to 'error'
             new_instance.status = "error"
             db.commit()
             
             # Cleanup partial files
             if os.path.isdir(clone_dir):
                 shutil.rmtree(clone_dir, onexc=_on_rm_error)
+            raise
+
+def mark_interrupted_copy(new_instance_id: int):
+    """A copy job did not finish (AiKore restarted): flag the half-copied instance as 'error'."""
+    with SessionLocal() as db:
+        new_instance = get_instance(db, new_instance_id)
+        if new_instance and new_instance.status == "installing":
+            new_instance.status = "error"
+            db.commit()
 
 def instantiate_instance(db: Session, source_instance_id: int, new_name: str):
     """
@@ -9,7 +9,7 @@ from .session import SessionLocal, DATABASE_URL, connect_args
 
 # --- AUTOMATED DATABASE MIGRATION LOGIC ---
 
-EXPECTED_DB_VERSION = 6
+EXPECTED_DB_VERSION = 8
 
 def _get_db_version(db_session):
     """Checks the version of the database."""
@@ -419,6 +419,68 @@ def _perform_v5_to_v6_migration():
         print("[DB Migration] Manual inspection of the database is required.", file=sys.stderr)
         sys.exit(1)
 
+def _perform_v6_to_v7_migration():
+    """
+    Migrates the database from schema V6 to V7.
+    V6 -> V7 Change: Adds disk_quota_soft_gb, disk_quota_hard_gb columns.
+    """
+    print("[DB Migration] Starting migration from V6 to V7...")
+    engine = create_engine(DATABASE_URL, connect_args=connect_args)
+
+    try:
+        with engine.connect() as connection:
+            with connection.begin():
+                inspector = inspect(engine)
+                columns = [col['name'] for col in inspector.get_columns('instances')]
+
+                print("[DB Migration] 1. Adding disk quota columns to 'instances' table...")
+                if 'disk_quota_soft_gb' not in columns:
+                    connection.execute(text('ALTER TABLE instances ADD COLUMN disk_quota_soft_gb FLOAT'))
+                if 'disk_quota_hard_gb' not in columns:
+                    connection.execute(text('ALTER TABLE instances ADD COLUMN disk_quota_hard_gb FLOAT'))
+
+                print("[DB Migration] 2. Updating schema version to 7...")
+                with Session(bind=connection) as db:
+                    version_entry = db.query(models.AikoreMeta).filter_by(key="schema_version").first()
+                    if version_entry:
+                        version_entry.value = "7"
+                    else:
+                        db.add(models.AikoreMeta(key="schema_version", value="7"))
+                    db.commit()
+
+        print("[DB Migration] Migration from V6 to V7 complete.")
+    except Exception as e:
+        print(f"[DB Migration] FATAL: Error during V6 to V7 migration: {e}", file=sys.stderr)
+        print("[DB Migration] Manual inspection of the database is required.", file=sys.stderr)
+        sys.exit(1)
+
+def _perform_v7_to_v8_migration():
+    """
+    Migrates the database from schema V7 to V8.
+    V7 -> V8 Change: Adds the `jobs` table (background job framework).
+    """
+    print("[DB Migration] Starting migration from V7 to V8...")
+    engine = create_engine(DATABASE_URL, connect_args=connect_args)
+
+    try:
+        print("[DB Migration] 1. Creating 'jobs' table...")
+        models.Job.__table__.create(bind=engine, checkfirst=True)
+
+        print("[DB Migration] 2. Updating schema version to 8...")
+        with SessionLocal() as db:
+            version_entry = db.query(models.AikoreMeta).filter_by(key="schema_version").first()
+            if version_entry:
+                version_entry.value = "8"
+            else:
+                db.add(models.AikoreMeta(key="schema_version", value="8"))
+            db.commit()
+
+        print("[DB Migration] Migration from V7 to V8 complete.")
+    except Exception as e:
+        print(f"[DB Migration] FATAL: Error during V7 to V8 migration: {e}", file=sys.stderr)
+        print("[DB Migration] Manual inspection of the database is required.", file=sys.stderr)
+        sys.exit(1)
+
 def run_db_migration():
     # This is a hack to get the correct engine for the migration check
     engine = create_engine(DATABASE_URL, connect_args=connect_args)
@@ -433,10 +495,17 @@ def run_db_migration():
         print(f"[DB Init] Database created with schema version {EXPECTED_DB_VERSION}.")
         return
 
-    with SessionLocal() as db:
-        current_version = _get_db_version(db)
+    # Apply the migrations one step at a time until the schema is current
+    previous_version = None
+    while True:
+        with SessionLocal() as db:
+            current_version = _get_db_version(db)
         print(f"[DB Check] Current DB version: {current_version}. Expected version: {EXPECTED_DB_VERSION}.")
-    
+        if current_version == previous_version:
+            print(f"[DB Migration] FATAL: Migration from v{current_version} did not update the schema version.", file=sys.stderr)
+            sys.exit(1)
+        previous_version = current_version
+
         if current_version < EXPECTED_DB_VERSION:
             if current_version == 1:
                 _perform_v1_to_v2_migration()
@@ -448,8 +517,14 @@ def run_db_migration():
                 _perform_v4_to_v5_migration()
             elif current_version == 5:
                 _perform_v5_to_v6_migration()
+            elif current_version == 6:
+                _perform_v6_to_v7_migration()
+            elif current_version == 7:
+                _perform_v7_to_v8_migration()
             else:
                 print(f"[DB Migration] FATAL: Unsupported migration path from v{current_version} to v{EXPECTED_DB_VERSION}.", file=sys.stderr)
                 sys.exit(1)
+            continue
         elif current_version > EXPECTED_DB_VERSION:
-            print(f"[DB Migration] WARNING: Database version ({current_version}) is newer than the application's expected version.", file=sys.stderr)
\ No newline at end of file
+            print(f"[DB Migration] WARNING: Database version ({current_version}) is newer than the application's expected version.", file=sys.stderr)
+        break
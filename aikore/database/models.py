@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import Boolean, Column, Float, Integer, String, Text
 from .session import Base
 
 # NEW: Model for storing application metadata, such as schema version.
@@ -33,6 +33,10 @@ class Instance(Base):
     python_version = Column(String, nullable=True)
     cuda_version = Column(String, nullable=True)
     torch_version = Column(String, nullable=True)
+
+    # Disk quotas in GB (Schema V7 fields): soft warns at start, hard blocks the start
+    disk_quota_soft_gb = Column(Float, nullable=True)
+    disk_quota_hard_gb = Column(Float, nullable=True)
     
     # Possible statuses: 'stopped', 'starting', 'stalled', 'started'
     status = Column(String, default="stopped", nullable=False)
@@ -40,4 +44,24 @@ class Instance(Base):
     pid = Column(Integer, nullable=True)
     port = Column(Integer, nullable=True)
     persistent_port = Column(Integer, nullable=True)
-    persistent_display = Column(Integer, nullable=True)
\ No newline at end of file
+    persistent_display = Column(Integer, nullable=True)
+
+
+class Job(Base):
+    """
+    SQLAlchemy model for a background job (Schema V8). See core/jobs.py.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False, index=True)
+    # Possible statuses: 'queued', 'running', 'succeeded', 'failed', 'cancelled', 'interrupted'
+    status = Column(String, default="queued", nullable=False, index=True)
+    instance_id = Column(Integer, nullable=True, index=True)
+    params = Column(Text, nullable=True)  # JSON
+    progress = Column(Float, default=0.0, nullable=False)
+    message = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(Float, nullable=False)
+    started_at = Column(Float, nullable=True)
+    finished_at = Column(Float, nullable=True)
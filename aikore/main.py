@@ -18,12 +18,16 @@ from .database.session import SessionLocal
 print(f"[Import] Database modules loaded. ({_time.time() - _t_db:.2f}s)")
 
 _t_api = _time.time()
-from .api import instances, system, builder
-from .api.builder import cleanup_stale_builder_envs
+from .api import instances, system, builder, wheel_index, trashcan, jobs, model_library
+from .api.builder import start_builder_env_cleanup, start_build_queue, start_warm_pool, get_builder_env_dirs
 print(f"[Import] API routers loaded. ({_time.time() - _t_api:.2f}s)")
 
 _t_pm = _time.time()
 from .core import process_manager
+from .core.disk_usage import disk_index
+from .core.trashcan import trashcan as trashcan_manager
+from .core.jobs import jobs as job_manager
+from .core.cache_manager import cache_manager
 print(f"[Import] Process manager loaded. ({_time.time() - _t_pm:.2f}s)")
 
 print(f"[Import] Total import time: {_time.time() - _t_import_start:.2f}s")
@@ -31,7 +35,7 @@ print(f"[Import] Total import time: {_time.time() - _t_import_start:.2f}s")
 # --- Run Database Migration Check ---
 migration.run_db_migration()
 
-from .config import INSTANCES_DIR
+from .config import INSTANCES_DIR, OUTPUTS_DIR, TRASH_DIR, TMP_DIR
 
 # --- Request Size Limit Middleware ---
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -75,12 +79,25 @@ async def lifespan(app: FastAPI):
     db = SessionLocal()
     print(f"[Startup] Database session opened. ({__import__('time').time() - _t1:.2f}s)")
     try:
+        # 1b. Background jobs left active by the previous run are marked interrupted
+        # (before the status reset, so their kinds can still recognize what they left behind)
+        print("[Startup] Step 1b: Marking interrupted background jobs...")
+        try:
+            job_manager.mark_interrupted()
+        except Exception as e:
+            print(f"[Startup] [Warning] Could not mark interrupted jobs: {e}")
+
         # 2. Reset instance statuses
         print("[Startup] Step 2: Resetting instance statuses...")
         num_rows_updated = db.query(models.Instance).update({"status": "stopped", "pid": None})
         db.commit()
         print(f"[Startup] Reset status for {num_rows_updated} instances. ({__import__('time').time() - _t1:.2f}s)")
 
+        # 2b. Temp dirs left by the previous run (no instance is running yet)
+        purged_tmp = process_manager.purge_stale_tmp_dirs()
+        if purged_tmp:
+            print(f"[Startup] Step 2b: Scheduled removal of {purged_tmp} stale entries of {TMP_DIR}.")
+
         # 3. Clear old log files (only check direct instance dirs, not deep subtree)
         _t2 = __import__('time').time()
         print("[Startup] Step 3: Clearing old log files...")
@@ -124,12 +141,39 @@ async def lifespan(app: FastAPI):
 
     print(f"[Startup] ✓ Application startup complete. Total: {__import__('time').time() - _t0:.2f}s")
 
-    # 5. Cleanup stale builder Conda environments
-    print("[Startup] Step 5: Cleaning stale builder environments...")
+    # 5. Start the disk usage indexer, then clean stale builder Conda environments (background, idle priority)
+    print("[Startup] Step 5: Starting disk usage indexer and builder environment cleanup...")
+    try:
+        disk_index.start([INSTANCES_DIR, OUTPUTS_DIR, TRASH_DIR] + get_builder_env_dirs())
+        start_builder_env_cleanup()
+    except Exception as e:
+        print(f"[Startup] [Warning] Disk usage indexer or builder environment cleanup could not be started: {e}")
+
+    # 5b. Trashcan retention policy and throttled purger (background, idle priority)
+    try:
+        trashcan_manager.start()
+    except Exception as e:
+        print(f"[Startup] [Warning] Trashcan maintenance could not be started: {e}")
+
+    # 5c. Size caps of the shared caches (LRU eviction, background, idle priority)
+    try:
+        cache_manager.start()
+    except Exception as e:
+        print(f"[Startup] [Warning] Cache manager could not be started: {e}")
+
+    # 6. Resume queued builder jobs
+    print("[Startup] Step 6: Resuming queued builder jobs...")
+    try:
+        start_build_queue()
+    except Exception as e:
+        print(f"[Startup] [Warning] Builder job queue could not be resumed: {e}")
+
+    # 7. Provision the warm builder environments (background, idle priority)
+    print("[Startup] Step 7: Starting warm builder environment pool...")
     try:
-        cleanup_stale_builder_envs()
+        start_warm_pool()
     except Exception as e:
-        print(f"[Startup] [Warning] Builder environment cleanup failed: {e}")
+        print(f"[Startup] [Warning] Warm builder environment pool could not be started: {e}")
 
     yield  # <-- Application runs here
 
@@ -154,6 +198,10 @@ app.add_middleware(RequestSizeLimitMiddleware)
 app.include_router(instances.router)
 app.include_router(system.router)
 app.include_router(builder.router)
+app.include_router(wheel_index.router)
+app.include_router(trashcan.router)
+app.include_router(jobs.router)
+app.include_router(model_library.router)
 
 # Mount the static directory to serve frontend files
 # Serve JS/CSS with no-cache headers to prevent stale cached assets
@@ -17,6 +17,10 @@ class InstanceBase(BaseModel):
     cuda_version: str | None = None
     torch_version: str | None = None
 
+    # --- Disk quotas (GB) ---
+    disk_quota_soft_gb: float | None = None
+    disk_quota_hard_gb: float | None = None
+
 # --- Creation Schema ---
 # Inherits from Base and is used specifically when creating a new instance via the API.
 class InstanceCreate(InstanceBase):
@@ -37,6 +41,8 @@ class InstanceUpdate(BaseModel):
     python_version: str | None = None
     cuda_version: str | None = None
     torch_version: str | None = None
+    disk_quota_soft_gb: float | None = None
+    disk_quota_hard_gb: float | None = None
     port: int | None = None
     persistent_port: int | None = None
     persistent_display: int | None = None
@@ -455,7 +455,6 @@ async function startBuild() {
     const cudaSelect = document.getElementById('builder-cuda');
     const torchSelect = document.getElementById('builder-torch');
     const customUrlInput = document.getElementById('builder-custom-url');
-    const btn = document.getElementById('btn-start-build');
 
     const payload = {
         preset: presetSelect.value,
@@ -466,18 +465,29 @@ async function startBuild() {
         torch_ver: torchSelect.value
     };
 
+    if (builderTerminal) builderTerminal.clear();
+    else initBuilderTerminal();
+
+    attachBuildSocket(payload);
+}
+
+/**
+ * Opens the builder websocket and streams its output to the builder terminal.
+ * The payload is either a build config (submits a new job) or {job_id, offset}
+ * (re-attaches to a job that is still queued or running on the server).
+ */
+function attachBuildSocket(payload) {
+    const btn = document.getElementById('btn-start-build');
     btn.disabled = true;
 
     let dots = 0;
     btn.textContent = "BUILDING";
+    if (builderBtnInterval) clearInterval(builderBtnInterval);
     builderBtnInterval = setInterval(() => {
         dots = (dots + 1) % 4;
         btn.textContent = "BUILDING" + ".".repeat(dots);
     }, 500);
 
-    if (builderTerminal) builderTerminal.clear();
-    else initBuilderTerminal();
-
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
     builderSocket = new WebSocket(`${protocol}//${window.location.host}/api/builder/build`);
 
@@ -486,7 +496,7 @@ async function startBuild() {
     };
 
     builderSocket.onmessage = (event) => {
-        builderTerminal.write(event.data);
+        if (builderTerminal) builderTerminal.write(event.data);
     };
 
     builderSocket.onclose = () => {
@@ -500,6 +510,25 @@ async function startBuild() {
     };
 }
 
+/**
+ * Re-attaches the builder terminal to a job still active on the server,
+ * e.g. after a page reload while a build was running.
+ */
+async function resumeActiveBuild() {
+    if (builderSocket && builderSocket.readyState === WebSocket.OPEN) return;
+    try {
+        const res = await fetch('/api/builder/jobs');
+        if (!res.ok) return;
+        const jobs = await res.json();
+        const active = jobs.find(j => j.status === 'running') || jobs.find(j => j.status === 'queued');
+        if (!active) return;
+        if (builderTerminal) builderTerminal.clear();
+        attachBuildSocket({ job_id: active.id, offset: 0 });
+    } catch (e) {
+        console.error('Failed to check for active builds:', e);
+    }
+}
+
 export async function showBuilderView() {
     // Don't destroy builder terminal if a build is in progress
     const isBuilding = builderSocket && builderSocket.readyState === WebSocket.OPEN;
@@ -699,6 +728,8 @@ export async function showBuilderView() {
             try { builderFitAddon.fit(); } catch (e) { }
         });
     }
+
+    await resumeActiveBuild();
 }
 
 
@@ -720,6 +751,7 @@ export async function showInstanceWheelsManager(instanceId, instanceName) {
                 </div>
                 <div class="toolbar-actions">
                     <button id="btn-wheels-refresh" class="btn-secondary" style="padding: 0.5rem 1rem; cursor:pointer;">Refresh</button>
+                    <button id="btn-wheels-sync-compatible" class="btn-secondary" style="padding: 0.5rem 1rem; cursor:pointer;" title="Install every wheel matching this instance's Python, torch, CUDA and GPU architecture">Sync Compatible</button>
                     <button id="btn-wheels-apply" class="btn-primary" style="padding: 0.5rem 1rem; background-color:#28a745; color:white; border:none; font-weight:bold; border-radius:4px; cursor:pointer;">APPLY CHANGES</button>
                 </div>
             </div>
@@ -765,6 +797,7 @@ export async function showInstanceWheelsManager(instanceId, instanceName) {
         // Event Listeners attached ONCE
         document.getElementById('btn-wheels-refresh').addEventListener('click', () => loadInstanceWheels(state.currentWheelsInstanceId));
         document.getElementById('btn-wheels-apply').addEventListener('click', () => saveInstanceWheels(state.currentWheelsInstanceId));
+        document.getElementById('btn-wheels-sync-compatible').addEventListener('click', () => syncCompatibleWheels(state.currentWheelsInstanceId));
     }
 
     state.currentWheelsInstanceId = instanceId;
@@ -803,6 +836,26 @@ window.toggleWheelState = function (filename, install) {
     }
 };
 
+const WHEEL_COMPAT_COLORS = {
+    compatible: '#28a745',
+    partial: '#e6a700',
+    unknown: '#888',
+    incompatible: '#dc3545'
+};
+
+/** Build the filename cell, colored and annotated with the wheel's compatibility. */
+function createWheelNameCell(w) {
+    const nameTd = document.createElement('td');
+    const badge = document.createElement('span');
+    badge.textContent = '● ';
+    badge.style.color = WHEEL_COMPAT_COLORS[w.compatibility] || WHEEL_COMPAT_COLORS.unknown;
+    nameTd.appendChild(badge);
+    nameTd.appendChild(document.createTextNode(w.filename));
+    const issues = (w.compat_issues || []).join('\n');
+    nameTd.title = `${w.filename}\n[${w.compatibility || 'unknown'}]${issues ? '\n' + issues : ''}`;
+    return nameTd;
+}
+
 function renderManagerTables() {
     const availableBody = document.getElementById('wheels-available-body');
     const installedBody = document.getElementById('wheels-installed-body');
@@ -818,9 +871,7 @@ function renderManagerTables() {
     } else {
         availableWheels.forEach(w => {
             const tr = document.createElement('tr');
-            const nameTd = document.createElement('td');
-            nameTd.textContent = w.filename;
-            nameTd.title = w.filename;
+            const nameTd = createWheelNameCell(w);
             const sizeTd = document.createElement('td');
             sizeTd.style.textAlign = 'right';
             sizeTd.textContent = `${w.size_mb} MB`;
@@ -844,9 +895,7 @@ function renderManagerTables() {
     } else {
         installedWheels.forEach(w => {
             const tr = document.createElement('tr');
-            const nameTd = document.createElement('td');
-            nameTd.textContent = w.filename;
-            nameTd.title = w.filename;
+            const nameTd = createWheelNameCell(w);
             const sizeTd = document.createElement('td');
             sizeTd.style.textAlign = 'right';
             sizeTd.textContent = `${w.size_mb} MB`;
@@ -897,6 +946,26 @@ async function saveInstanceWheels(instanceId) {
     }
 }
 
+async function syncCompatibleWheels(instanceId) {
+    const btn = document.getElementById('btn-wheels-sync-compatible');
+    btn.disabled = true;
+
+    try {
+        const res = await fetch(`/api/instances/${instanceId}/wheels/sync-compatible`, { method: 'POST' });
+        const data = await res.json();
+        if (res.ok) {
+            showToast(`${data.copied.length} compatible wheel(s) installed, ${data.skipped.length} skipped`, "success");
+            await loadInstanceWheels(instanceId);
+        } else {
+            showToast(`Error: ${data.detail}`, "error");
+        }
+    } catch (e) {
+        showToast(`Sync failed: ${e.message}`, "error");
+    } finally {
+        btn.disabled = false;
+    }
+}
+
 export async function showVersionCheckView(instanceId, instanceName) {
     hideAllToolViews();
     DOM.versionCheckContainer.classList.remove('hidden');
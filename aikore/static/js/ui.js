@@ -883,4 +883,16 @@ export async function updateSystemStats(stats) {
     } else {
         DOM.gpuStatsContainer.innerHTML = '<p style="text-align:center;color:#aaa;">No NVIDIA GPUs detected.</p>';
     }
+    updateInstanceDiskUsage(stats.disk);
+}
+
+// Disk usage comes from the backend background index; shown as a tooltip on the name field
+function updateInstanceDiskUsage(disk) {
+    if (!disk || !disk.instances) return;
+    DOM.instancesTable.querySelectorAll('tbody tr[data-id]').forEach(row => {
+        const nameInput = row.querySelector('input[data-field="name"]');
+        if (!nameInput) return;
+        const size = disk.instances[row.dataset.name];
+        nameInput.title = (size === undefined || size === null) ? '' : `Disk usage: ${formatBytes(size)}`;
+    });
 }
\ No newline at end of file
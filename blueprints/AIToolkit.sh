@@ -41,7 +41,7 @@ VENV_DIR="${INSTANCE_CONF_DIR}/env"
 # Install or update the ai-toolkit repository
 if [ ! -d "${TOOLKIT_DIR}/.git" ]; then
     echo "Cloning ai-toolkit repository..."
-    git clone https://github.com/ostris/ai-toolkit.git "${TOOLKIT_DIR}"
+    clone_repo https://github.com/ostris/ai-toolkit.git "${TOOLKIT_DIR}"
 else
     echo "Existing ai-toolkit repository found. Synchronizing..."
     cd "${TOOLKIT_DIR}"
@@ -51,8 +51,8 @@ fi
 # --- Environment Setup ---
 echo "--- Setting up Conda environment ---"
 
-# Clean up conda cache
-conda clean -ya
+# Clear the conda index cache
+conda clean --index-cache -y # Downloaded packages stay in the shared AiKore package cache
 
 # Clean the Conda environment if required by user
 clean_env "${VENV_DIR}"
@@ -80,6 +80,7 @@ pip install torchao==0.10.0
 
 # 3. Install Pre-built Wheels (Custom Modules)
 # This step installs your custom compiled wheels (e.g. SageAttention, FlashAttn)
+use_wheel_index # Let pip also resolve compiled wheels from the AiKore wheel store
 WHEELS_DIR="${INSTANCE_CONF_DIR}/wheels"
 if [ -d "${WHEELS_DIR}" ] && ls "${WHEELS_DIR}"/*.whl 1> /dev/null 2>&1; then
     echo "--- Installing pre-built wheels from ${WHEELS_DIR} ---"
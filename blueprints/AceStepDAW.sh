@@ -35,16 +35,16 @@ VENV_DIR="${INSTANCE_CONF_DIR}/env"
 # 1. Install or update repositories
 if [ ! -d "${BACKEND_DIR}/.git" ]; then
     echo "Cloning Backend..."
-    git clone https://github.com/ace-step/ACE-Step-1.5.git "${BACKEND_DIR}"
+    clone_repo https://github.com/ace-step/ACE-Step-1.5.git "${BACKEND_DIR}"
 fi
 
 if [ ! -d "${FRONTEND_DIR}/.git" ]; then
     echo "Cloning Frontend..."
-    git clone https://github.com/ace-step/ACE-Step-DAW.git "${FRONTEND_DIR}"
+    clone_repo https://github.com/ace-step/ACE-Step-DAW.git "${FRONTEND_DIR}"
 fi
 
 # --- Environment Setup ---
-conda clean -ya
+conda clean --index-cache -y # Downloaded packages stay in the shared AiKore package cache
 clean_env "${VENV_DIR}"
 
 if [ ! -d "${VENV_DIR}" ]; then
@@ -37,44 +37,52 @@ COMFYUI_DIR="${INSTANCE_CONF_DIR}/ComfyUI"
 MANAGER_DIR="${COMFYUI_DIR}/custom_nodes/ComfyUI-Manager"
 VENV_DIR="${INSTANCE_CONF_DIR}/env"
 
-# Install or update the main ComfyUI repository
-if [ ! -d "${COMFYUI_DIR}/.git" ]; then
-    echo "Cloning ComfyUI repository..."
-    git clone https://github.com/comfyanonymous/ComfyUI.git "${COMFYUI_DIR}"
-else
-    echo "Existing ComfyUI repository found. Synchronizing..."
-    cd "${COMFYUI_DIR}"
-    check_remote "GIT_REF"
-fi
-
-# Install or update the ComfyUI-Manager custom node
-if [ ! -d "${MANAGER_DIR}/.git" ]; then
-    echo "Cloning ComfyUI-Manager repository..."
-    git clone https://github.com/Comfy-Org/ComfyUI-Manager.git "${MANAGER_DIR}"
-else
-    echo "Existing ComfyUI-Manager repository found. Synchronizing..."
-    cd "${MANAGER_DIR}"
-    check_remote "GIT_REF"
+# Repository sync is skipped when nothing changed since the last successful start
+if ! aikore_fast_path "repository sync"; then
+    # Install or update the main ComfyUI repository
+    if [ ! -d "${COMFYUI_DIR}/.git" ]; then
+        echo "Cloning ComfyUI repository..."
+        clone_repo https://github.com/comfyanonymous/ComfyUI.git "${COMFYUI_DIR}"
+    else
+        echo "Existing ComfyUI repository found. Synchronizing..."
+        cd "${COMFYUI_DIR}"
+        check_remote "GIT_REF"
+    fi
+
+    # Install or update the ComfyUI-Manager custom node
+    if [ ! -d "${MANAGER_DIR}/.git" ]; then
+        echo "Cloning ComfyUI-Manager repository..."
+        clone_repo https://github.com/Comfy-Org/ComfyUI-Manager.git "${MANAGER_DIR}"
+    else
+        echo "Existing ComfyUI-Manager repository found. Synchronizing..."
+        cd "${MANAGER_DIR}"
+        check_remote "GIT_REF"
+    fi
 fi
 
 # --- Environment Setup ---
 echo "--- Setting up Conda environment ---"
 
-# Clean up conda cache to prevent metadata errors
-conda clean -ya
+if ! aikore_fast_path "environment creation"; then
+    # Clear the conda index cache to prevent metadata errors
+    conda clean --index-cache -y # Downloaded packages stay in the shared AiKore package cache
 
-# Clean the Conda environment if required by user
-clean_env "${VENV_DIR}"
+    # Clean the Conda environment if required by user
+    clean_env "${VENV_DIR}"
 
-# Track whether this is a fresh environment installation
-FRESH_INSTALL=false
+    # Track whether the environment was created from scratch (and can seed the template)
+    NEW_BASE_ENV=false
 
-# Create the Conda environment if it doesn't exist
-if [ ! -d "${VENV_DIR}" ]; then
-    # --- NEW: Dynamic Python version with fallback ---
-    echo "Creating Conda environment with Python ${PYTHON_VERSION:-3.12}..."
-    conda create -p "${VENV_DIR}" python="${PYTHON_VERSION:-3.12}" pip -y
-    FRESH_INSTALL=true
+    # Create the Conda environment if it doesn't exist.
+    # A prebuilt template with the same python/cuda/torch is cloned when available.
+    if [ ! -d "${VENV_DIR}" ]; then
+        if ! clone_env_template "${VENV_DIR}"; then
+            # --- NEW: Dynamic Python version with fallback ---
+            echo "Creating Conda environment with Python ${PYTHON_VERSION:-3.12}..."
+            conda create -p "${VENV_DIR}" python="${PYTHON_VERSION:-3.12}" pip -y
+            NEW_BASE_ENV=true
+        fi
+    fi
 fi
 
 # Activate the environment
@@ -89,79 +97,53 @@ if [ ! -f "${VENV_DIR}/bin/pip" ]; then
 fi
 
 # --- Dependency Installation ---
-echo "--- Installing dependencies ---"
-
-echo "--- Installing PyTorch ---"
-# --- NEW: Let pip resolve torchvision/torchaudio dynamically based on torch version ---
-pip install torch==${TORCH_VERSION} torchvision torchaudio --index-url ${PYTORCH_INDEX_URL}
-pip install torchsde
-
-# 1. Install pre-built performance and utility libraries from wheels first.
-# This ensures our GPU-optimized versions are used.
-WHEELS_DIR="${INSTANCE_CONF_DIR}/wheels"
-echo "--- Checking for pre-built libraries in ${WHEELS_DIR} ---"
-if [ -d "${WHEELS_DIR}" ] && ls "${WHEELS_DIR}"/*.whl 1> /dev/null 2>&1; then
-    echo "Wheel files found, installing..."
-    pip install "${WHEELS_DIR}"/*.whl
-else
-    echo "No wheel files found in ${WHEELS_DIR}, skipping."
-fi
-
-# 2. Prepare a filtered requirements file for ComfyUI
-# We remove packages that we just installed from wheels to avoid conflicts.
-echo "--- Filtering ComfyUI requirements ---"
-# Create a pattern for grep. Note that some packages might be specified with '=='
-# so we match the package name at the beginning of the line.
-# The list should include all packages that are built into wheels.
-PACKAGES_TO_EXCLUDE="torch|torchvision|torchaudio|xformers|bitsandbytes|flash-attn|sageattention|diso|nvdiffrast|kaolin|diff-gaussian-rasterization|vox2seq|auto-gptq|exllamav2"
-
-grep -v -i -E "^(${PACKAGES_TO_EXCLUDE})" "${COMFYUI_DIR}/requirements.txt" > "${COMFYUI_DIR}/requirements-filtered.txt"
-
-echo "--- Installing dependencies from filtered requirements.txt ---"
-pip install -r "${COMFYUI_DIR}/requirements-filtered.txt"
-
-# 3. Install dependencies for ComfyUI-Manager.
-pip install -r "${MANAGER_DIR}/requirements.txt"
-
-# 4. Find and install dependencies for custom nodes (only on fresh install)
-if [ "$FRESH_INSTALL" = true ]; then
-    echo "--- Fresh install: installing custom node dependencies ---"
-    CUSTOM_NODES_DIR="${COMFYUI_DIR}/custom_nodes"
-
-    find "${CUSTOM_NODES_DIR}" -name "requirements.txt" -print0 | while IFS= read -r -d $'\0' req_file; do
-        # Exclude the ComfyUI-Manager's requirements file as we've already installed it
-        if [ "$req_file" != "${MANAGER_DIR}/requirements.txt" ]; then
-            echo "--- Processing custom node requirements: $req_file ---"
-            
-            TEMP_REQ_FILE=$(mktemp)
-            
-            grep -v -i -E "^(${PACKAGES_TO_EXCLUDE})" "$req_file" > "$TEMP_REQ_FILE"
-            
-            # Only run pip if the filtered file is not empty
-            if [ -s "$TEMP_REQ_FILE" ]; then
-                echo "Installing filtered dependencies from $req_file"
-                pip install -r "$TEMP_REQ_FILE"
-            else
-                echo "No dependencies to install from $req_file after filtering."
-            fi
-            
-            rm "$TEMP_REQ_FILE"
-        fi
-    done
-else
-    echo "--- Existing environment: skipping custom node dependency installation ---"
+if ! aikore_fast_path "dependency installation"; then
+    echo "--- Installing dependencies ---"
+
+    echo "--- Installing PyTorch ---"
+    # --- NEW: Let pip resolve torchvision/torchaudio dynamically based on torch version ---
+    pip install torch==${TORCH_VERSION} torchvision torchaudio --index-url ${PYTORCH_INDEX_URL}
+
+    # Python + torch only: save it as the template for the next instances with this triple
+    if [ "$NEW_BASE_ENV" = true ]; then
+        save_env_template "${VENV_DIR}"
+    fi
+
+    pip install torchsde
+
+    # 1. Install pre-built performance and utility libraries from wheels first.
+    # This ensures our GPU-optimized versions are used.
+    use_wheel_index # Let pip also resolve compiled wheels from the AiKore wheel store
+    WHEELS_DIR="${INSTANCE_CONF_DIR}/wheels"
+    echo "--- Checking for pre-built libraries in ${WHEELS_DIR} ---"
+    if [ -d "${WHEELS_DIR}" ] && ls "${WHEELS_DIR}"/*.whl 1> /dev/null 2>&1; then
+        echo "Wheel files found, installing..."
+        pip install "${WHEELS_DIR}"/*.whl
+    else
+        echo "No wheel files found in ${WHEELS_DIR}, skipping."
+    fi
+
+    # 2. Resolve ComfyUI, ComfyUI-Manager and custom node requirements in one pass.
+    # Packages built into wheels are excluded so pip does not replace them. The merged set
+    # is locked and stamped: starts with unchanged requirements skip pip entirely, and
+    # nodes added since the last start are picked up without a fresh install.
+    # Note that some packages might be specified with '==', so the pattern matches the
+    # package name at the beginning of the line.
+    PACKAGES_TO_EXCLUDE="torch|torchvision|torchaudio|xformers|bitsandbytes|flash-attn|sageattention|diso|nvdiffrast|kaolin|diff-gaussian-rasterization|vox2seq|auto-gptq|exllamav2"
+
+    install_requirements "${COMFYUI_DIR}/custom_nodes" "${PACKAGES_TO_EXCLUDE}" "${COMFYUI_DIR}/requirements.txt"
+
+    # 3. Install other packages
+    pip install peft opencv-python nunchaku
+
+    # 4. Install custom user requirements if specified
+    if [ -f "${INSTANCE_CONF_DIR}/requirements.txt" ]; then
+        pip install -r "${INSTANCE_CONF_DIR}/requirements.txt"
+    fi
+
+    echo "--- Dependency installation complete ---"
 fi
 
-# 5. Install other packages
-pip install peft opencv-python nunchaku
-
-# 6. Install custom user requirements if specified
-if [ -f "${INSTANCE_CONF_DIR}/requirements.txt" ]; then
-    pip install -r "${INSTANCE_CONF_DIR}/requirements.txt"
-fi
-
-echo "--- Dependency installation complete ---"
-
 # --- Symlink Setup ---
 echo "--- Setting up model and output symlinks ---"
 # Symlink shared models folders into the ComfyUI directory
@@ -34,7 +34,7 @@ VENV_DIR="${INSTANCE_CONF_DIR}/env"
 # --- 1. Git Clone ---
 if [ ! -d "${APP_DIR}/.git" ]; then
     echo "Cloning Easy Diffusion repository..."
-    git clone https://github.com/easydiffusion/easydiffusion.git "${APP_DIR}"
+    clone_repo https://github.com/easydiffusion/easydiffusion.git "${APP_DIR}"
 else
     echo "Existing repository found. Synchronizing..."
     cd "${APP_DIR}"
@@ -43,7 +43,7 @@ fi
 
 # --- 2. Environment Setup ---
 echo "--- Setting up Conda environment ---"
-conda clean -ya
+conda clean --index-cache -y # Downloaded packages stay in the shared AiKore package cache
 clean_env "${VENV_DIR}"
 
 # Easy Diffusion works well with Python 3.10
@@ -60,6 +60,7 @@ echo "--- Installing dependencies ---"
 echo "--- Installing PyTorch ---"
 pip install torch==${TORCH_VERSION} torchvision torchaudio --index-url ${PYTORCH_INDEX_URL}
 
+use_wheel_index # Let pip also resolve compiled wheels from the AiKore wheel store
 WHEELS_DIR="${INSTANCE_CONF_DIR}/wheels"
 if [ -d "${WHEELS_DIR}" ] && [ "$(ls -A "${WHEELS_DIR}"/*.whl 2>/dev/null)" ]; then
     echo "--- Installing pre-built wheels from ${WHEELS_DIR} ---"
@@ -20,8 +20,8 @@ fi
 
 export PATH="/home/abc/miniconda3/bin:$PATH"
 
-# Clean up conda cache and packages to prevent metadata errors
-conda clean -ya
+# Clear the conda index cache to prevent metadata errors
+conda clean --index-cache -y # Downloaded packages stay in the shared AiKore package cache
 
 # The following variables are provided by the process manager:
 # - INSTANCE_NAME: The unique user-defined name for this instance.
@@ -39,10 +39,10 @@ APP_DIR="${INSTANCE_CONF_DIR}/fluxgym"
 # Install or update the main fluxgym repository
 if [ ! -d "${APP_DIR}/.git" ]; then
     echo "Cloning fluxgym repository..."
-    git clone https://github.com/cocktailpeanut/fluxgym.git "${APP_DIR}"
+    clone_repo https://github.com/cocktailpeanut/fluxgym.git "${APP_DIR}"
     cd "${APP_DIR}"
     echo "Cloning sd-scripts sub-repository for fluxgym..."
-    git clone -b sd3 https://github.com/kohya-ss/sd-scripts
+    clone_repo https://github.com/kohya-ss/sd-scripts sd-scripts -b sd3
 else
     echo "Existing fluxgym repository found. Synchronizing..."
     cd "${APP_DIR}"
@@ -57,7 +57,7 @@ else
     else
     echo "sd-scripts sub-repository not found or not a git repo, attempting to clone..."
     rm -rf sd-scripts
-    git clone -b sd3 https://github.com/kohya-ss/sd-scripts
+    clone_repo https://github.com/kohya-ss/sd-scripts sd-scripts -b sd3
     fi
 fi
 
@@ -82,6 +82,7 @@ echo "--- Installing PyTorch ---"
 pip install torch==${TORCH_VERSION} torchvision torchaudio --index-url ${PYTORCH_INDEX_URL}
 
 # 2. Install our pre-built wheels first
+use_wheel_index # Let pip also resolve compiled wheels from the AiKore wheel store
 WHEELS_DIR="${INSTANCE_CONF_DIR}/wheels"
 if [ -d "${WHEELS_DIR}" ] && ls "${WHEELS_DIR}"/*.whl 1> /dev/null 2>&1; then
     echo "--- Installing pre-built wheels from ${WHEELS_DIR} ---"
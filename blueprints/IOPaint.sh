@@ -44,8 +44,8 @@ VENV_DIR="${INSTANCE_CONF_DIR}/env"
 # --- Environment Setup ---
 echo "--- Setting up Conda environment ---"
 
-# Clean up conda cache
-conda clean -ya
+# Clear the conda index cache
+conda clean --index-cache -y # Downloaded packages stay in the shared AiKore package cache
 
 # Clean the Conda environment if required by user
 clean_env "${VENV_DIR}"
@@ -69,6 +69,7 @@ pip install torch==${TORCH_VERSION} torchvision torchaudio --index-url ${PYTORCH
 
 # 2. Install Pre-built Wheels (Custom Modules)
 # Standard AiKore block to use local compiled wheels if available
+use_wheel_index # Let pip also resolve compiled wheels from the AiKore wheel store
 WHEELS_DIR="${INSTANCE_CONF_DIR}/wheels"
 if [ -d "${WHEELS_DIR}" ] && ls "${WHEELS_DIR}"/*.whl 1> /dev/null 2>&1; then
     echo "--- Installing pre-built wheels from ${WHEELS_DIR} ---"
@@ -33,7 +33,7 @@ VENV_DIR="${INSTANCE_CONF_DIR}/env"
 # Install or update the main JustRayzist repository
 if [ ! -d "${RAYZIST_DIR}/.git" ]; then
     echo "Cloning JustRayzist repository..."
-    git clone https://github.com/MutantSparrow/JustRayzist.git "${RAYZIST_DIR}"
+    clone_repo https://github.com/MutantSparrow/JustRayzist.git "${RAYZIST_DIR}"
 else
     echo "Existing JustRayzist repository found. Synchronizing..."
     cd "${RAYZIST_DIR}"
@@ -43,7 +43,7 @@ fi
 # --- Environment Setup ---
 echo "--- Setting up Conda environment ---"
 
-conda clean -ya
+conda clean --index-cache -y # Downloaded packages stay in the shared AiKore package cache
 clean_env "${VENV_DIR}"
 
 if [ ! -d "${VENV_DIR}" ]; then
@@ -63,6 +63,7 @@ echo "--- Installing JustRayzist package ---"
 cd "${RAYZIST_DIR}"
 pip install -e . --extra-index-url ${PYTORCH_INDEX_URL}
 
+use_wheel_index # Let pip also resolve compiled wheels from the AiKore wheel store
 WHEELS_DIR="${INSTANCE_CONF_DIR}/wheels"
 echo "--- Checking for pre-built libraries in ${WHEELS_DIR} ---"
 if [ -d "${WHEELS_DIR}" ] && ls "${WHEELS_DIR}"/*.whl 1> /dev/null 2>&1; then
@@ -87,7 +88,7 @@ SEEDVR2_RUNTIME_DIR="${RAYZIST_DIR}/models/seedvr2/runtime/ComfyUI-SeedVR2_Video
 if [ ! -d "${SEEDVR2_RUNTIME_DIR}/.git" ]; then
     echo "Cloning SeedVR2 runtime..."
     mkdir -p "${RAYZIST_DIR}/models/seedvr2/runtime"
-    git clone --depth 1 https://github.com/numz/ComfyUI-SeedVR2_VideoUpscaler.git "${SEEDVR2_RUNTIME_DIR}"
+    clone_repo https://github.com/numz/ComfyUI-SeedVR2_VideoUpscaler.git "${SEEDVR2_RUNTIME_DIR}"
 else
     echo "SeedVR2 runtime exists. Pulling latest..."
     cd "${SEEDVR2_RUNTIME_DIR}"
@@ -35,7 +35,7 @@ VENV_DIR="${INSTANCE_CONF_DIR}/env"
 # --- 1. Git Clone ---
 if [ ! -d "${APP_DIR}/.git" ]; then
     echo "Cloning PersonaLive repository..."
-    git clone https://github.com/GVCLab/PersonaLive.git "${APP_DIR}"
+    clone_repo https://github.com/GVCLab/PersonaLive.git "${APP_DIR}"
 else
     echo "Existing PersonaLive repository found. Synchronizing..."
     cd "${APP_DIR}"
@@ -72,6 +72,7 @@ echo "--- Installing TensorRT ---"
 pip install tensorrt
 
 # Install Pre-built Wheels (Custom Modules)
+use_wheel_index # Let pip also resolve compiled wheels from the AiKore wheel store
 WHEELS_DIR="${INSTANCE_CONF_DIR}/wheels"
 if [ -d "${WHEELS_DIR}" ] && ls "${WHEELS_DIR}"/*.whl 1> /dev/null 2>&1; then
     echo "--- Installing pre-built wheels from ${WHEELS_DIR} ---"
@@ -32,7 +32,7 @@ VENV_DIR="${INSTANCE_CONF_DIR}/env"
 # --- 1. Git Clone ---
 if [ ! -d "${APP_DIR}/.git" ]; then
     echo "Cloning Ultimate-TTS-Studio-SUP3R-Edition..."
-    git clone https://github.com/SUP3RMASS1VE/Ultimate-TTS-Studio-SUP3R-Edition.git "${APP_DIR}"
+    clone_repo https://github.com/SUP3RMASS1VE/Ultimate-TTS-Studio-SUP3R-Edition.git "${APP_DIR}"
 else
     echo "Existing repository found. Synchronizing..."
     cd "${APP_DIR}"
@@ -42,8 +42,8 @@ fi
 # --- 2. Environment Setup ---
 echo "--- Setting up Conda environment ---"
 
-# Clean conda cache to prevent metadata errors (same as ComfyUI)
-conda clean -ya
+# Clear the conda index cache to prevent metadata errors (same as ComfyUI)
+conda clean --index-cache -y # Downloaded packages stay in the shared AiKore package cache
 
 # Clean environment if rebuild is requested
 clean_env "${VENV_DIR}"
@@ -79,6 +79,7 @@ echo "--- Installing PyTorch ---"
 pip install torch==${TORCH_VERSION} torchvision==${TORCHVISION_VERSION} torchaudio==${TORCHAUDIO_VERSION} --index-url ${PYTORCH_INDEX_URL}
 
 # 2. Custom Wheels
+use_wheel_index # Let pip also resolve compiled wheels from the AiKore wheel store
 WHEELS_DIR="${INSTANCE_CONF_DIR}/wheels"
 if [ -d "${WHEELS_DIR}" ] && ls "${WHEELS_DIR}"/*.whl 1> /dev/null 2>&1; then
     echo "--- Installing pre-built wheels from ${WHEELS_DIR} ---"
@@ -44,7 +44,7 @@ DATA_DIR="${INSTANCE_CONF_DIR}/data"
 # ============================================================
 if [ ! -d "${VOICEBOX_DIR}/.git" ]; then
     echo "Cloning Voicebox repository..."
-    git clone https://github.com/jamiepine/voicebox.git "${VOICEBOX_DIR}"
+    clone_repo https://github.com/jamiepine/voicebox.git "${VOICEBOX_DIR}"
 else
     echo "Existing Voicebox repository found. Synchronizing..."
     cd "${VOICEBOX_DIR}"
@@ -107,7 +107,7 @@ fi
 # ============================================================
 echo "--- Setting up Conda environment ---"
 
-conda clean -ya
+conda clean --index-cache -y # Downloaded packages stay in the shared AiKore package cache
 
 # Clean the Conda environment if required by user (rebuild trigger)
 clean_env "${VENV_DIR}"
@@ -158,6 +158,7 @@ pip install "numpy>=1.24.0,<2.0"
 # ============================================================
 # 6. INSTALL PRE-BUILT WHEELS (if any custom compiled modules exist)
 # ============================================================
+use_wheel_index # Let pip also resolve compiled wheels from the AiKore wheel store
 WHEELS_DIR="${INSTANCE_CONF_DIR}/wheels"
 if [ -d "${WHEELS_DIR}" ] && ls "${WHEELS_DIR}"/*.whl 1> /dev/null 2>&1; then
     echo "--- Installing pre-built wheels from ${WHEELS_DIR} ---"
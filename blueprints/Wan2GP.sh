@@ -36,7 +36,7 @@ VENV_DIR="${INSTANCE_CONF_DIR}/env"
 # --- 1. Git Clone ---
 if [ ! -d "${APP_DIR}/.git" ]; then
     echo "Cloning Wan2GP repository..."
-    git clone https://github.com/deepbeepmeep/Wan2GP.git "${APP_DIR}"
+    clone_repo https://github.com/deepbeepmeep/Wan2GP.git "${APP_DIR}"
 else
     echo "Existing Wan2GP repository found. Synchronizing..."
     cd "${APP_DIR}"
@@ -62,6 +62,7 @@ echo "--- Installing PyTorch ---"
 pip install torch==${TORCH_VERSION} torchvision torchaudio --index-url ${PYTORCH_INDEX_URL}
 
 # 2. Install Pre-built Wheels (YOUR CUSTOM BUILD)
+use_wheel_index # Let pip also resolve compiled wheels from the AiKore wheel store
 WHEELS_DIR="${INSTANCE_CONF_DIR}/wheels"
 if [ -d "${WHEELS_DIR}" ] && ls "${WHEELS_DIR}"/*.whl 1> /dev/null 2>&1; then
     echo "--- Installing pre-built wheels from ${WHEELS_DIR} ---"
@@ -62,6 +62,130 @@ clean_env() {
     fi
 }
 
+# --- Shared git object store ---
+# Bare mirrors shared by every instance and by the wheel builder (aikore/core/git_mirror.py
+# computes the same mirror names). Checkouts borrow the mirror objects through alternates,
+# so a clone is local and each object is stored once. The mirrors are never evicted:
+# deleting one breaks the checkouts borrowing from it.
+AIKORE_GIT_MIRRORS_DIR="${AIKORE_GIT_MIRRORS_DIR:-/config/cache/git-mirrors}"
+# How long the default branch of a remote is trusted before asking the remote again (seconds)
+AIKORE_GIT_HEAD_TTL="${AIKORE_GIT_HEAD_TTL:-86400}"
+
+# Prints the mirror path of a repository url: '<name>-<first 16 hex of sha1(url)>.git',
+# where the url has no 'git+' prefix, no trailing '/' and no '.git' suffix.
+_git_mirror_path() {
+    local url="${1#git+}"
+    while [[ "$url" == */ ]]; do url="${url%/}"; done
+    url="${url%.git}"
+    local base=$(basename "$url")
+    local digest=$(printf '%s' "$url" | sha1sum | cut -c1-16)
+    echo "${AIKORE_GIT_MIRRORS_DIR}/${base:-repo}-${digest}.git"
+}
+
+# Prints the default branch of a remote. The answer of `git ls-remote --symref` is cached
+# next to the mirror for AIKORE_GIT_HEAD_TTL seconds; a stale value is used when the
+# remote cannot be reached. Prints nothing if the branch is unknown.
+# Arg1: Repository url
+_git_default_branch() {
+    local url="${1#git+}"
+    local cache_file="$(_git_mirror_path "$url").default-branch"
+    if [ -f "$cache_file" ] && [ $(( $(date +%s) - $(stat -c %Y "$cache_file") )) -lt "${AIKORE_GIT_HEAD_TTL}" ]; then
+        cat "$cache_file"
+        return 0
+    fi
+    local branch=$(GIT_TERMINAL_PROMPT=0 git ls-remote --symref "$url" HEAD 2>/dev/null | sed -n 's|^ref: refs/heads/\(.*\)[[:space:]]HEAD$|\1|p')
+    if [ -n "$branch" ]; then
+        mkdir -p "${AIKORE_GIT_MIRRORS_DIR}" && echo "$branch" > "$cache_file" || true
+    elif [ -f "$cache_file" ]; then
+        branch=$(cat "$cache_file")
+    fi
+    if [ -n "$branch" ]; then
+        echo "$branch"
+    fi
+}
+
+# Creates or updates the mirror of a repository, under the same file lock as the wheel
+# builder. A new mirror is seeded from an existing checkout when one is given, so only
+# the objects it lacks are downloaded. Returns 1 if no mirror is available.
+# Args:
+#   $1: Repository url
+#   $2: Optional existing checkout of the same repository
+ensure_git_mirror() {
+    local url="${1#git+}"
+    local seed="$2"
+    local mirror=$(_git_mirror_path "$url")
+    mkdir -p "${AIKORE_GIT_MIRRORS_DIR}" || return 1
+    (
+        flock 9
+        if [ -d "$mirror" ]; then
+            echo "Updating shared mirror $(basename "$mirror")..."
+            git -C "$mirror" remote set-url origin "$url"
+            if ! GIT_TERMINAL_PROMPT=0 git -C "$mirror" fetch --prune --tags origin; then
+                echo "Warning: Mirror update failed, using the cached mirror as-is."
+            fi
+            # Clones check out the mirror HEAD: follow the remote default branch
+            local branch=$(_git_default_branch "$url")
+            if [ -n "$branch" ] && git -C "$mirror" show-ref --verify --quiet "refs/heads/$branch"; then
+                git -C "$mirror" symbolic-ref HEAD "refs/heads/$branch"
+            fi
+        else
+            echo "Creating shared mirror of ${url}..."
+            rm -rf "${mirror}.tmp"
+            local reference=()
+            if [ -n "$seed" ] && [ -d "$seed/.git" ]; then
+                reference=(--reference-if-able "$seed" --dissociate)
+            fi
+            if ! GIT_TERMINAL_PROMPT=0 git clone --mirror "${reference[@]}" "$url" "${mirror}.tmp"; then
+                rm -rf "${mirror}.tmp"
+                exit 1
+            fi
+            # Objects borrowed by checkouts through alternates must never be pruned
+            git -C "${mirror}.tmp" config gc.pruneExpire never
+            mv "${mirror}.tmp" "$mirror"
+        fi
+    ) 9>"${mirror}.lock"
+}
+
+# Makes the current checkout borrow the objects of a mirror through alternates. The first
+# time, the local copies of borrowed objects are dropped (checkouts cloned before the
+# shared store existed), so the checkout only keeps its own commits.
+# Arg1: Mirror path
+_borrow_git_objects() {
+    local mirror="$1"
+    local alternates=$(git rev-parse --git-path objects/info/alternates)
+    if ! grep -qxF "${mirror}/objects" "$alternates" 2>/dev/null; then
+        mkdir -p "$(dirname "$alternates")"
+        echo "${mirror}/objects" >> "$alternates"
+        echo "Repository now borrows objects from the shared mirror. Removing local duplicates..."
+        git repack -a -d -l -q || echo "Warning: Repack failed, local objects are kept."
+    fi
+}
+
+# Clones a repository through its shared mirror (git clone --shared): no network transfer
+# beyond the mirror update and almost no disk. Falls back to a plain clone when no mirror
+# can be created. The checkout's origin is the real remote url.
+# Args:
+#   $1: Repository url
+#   $2: Destination directory
+#   $@: Optional extra 'git clone' arguments (e.g. -b <branch>)
+clone_repo() {
+    local url="$1"
+    local dest="$2"
+    shift 2
+    if ensure_git_mirror "$url"; then
+        local mirror=$(_git_mirror_path "$url")
+        if git clone --shared "$@" "$mirror" "$dest"; then
+            git -C "$dest" remote set-url origin "${url#git+}"
+            return 0
+        fi
+        echo "Warning: Clone from the shared mirror failed, cloning ${url} directly."
+        if [ -d "$dest/.git" ] && [ -z "$(git -C "$dest" rev-parse --verify -q HEAD)" ]; then
+            rm -rf "$dest"
+        fi
+    fi
+    git clone "$@" "${url#git+}" "$dest"
+}
+
 # Fonction pour mettre à jour un dépôt Git vers une référence spécifique
 # ou vers la branche par défaut du remote, en écrasant les modifications locales
 # sur les fichiers suivis, mais en conservant les fichiers ajoutés non suivis.
@@ -84,8 +208,22 @@ sync_repo() {
     fi
     echo "Using remote: $remote_name"
 
-    echo "Fetching latest changes, tags, and pruning from $remote_name..."
-    git fetch "$remote_name" --prune --tags --force # --force peut aider avec certains refs conflictuels
+    # Les dépôts distants passent par le miroir partagé : un seul téléchargement par objet
+    # pour toutes les instances, et le dépôt local emprunte les objets du miroir.
+    local remote_url=$(git remote get-url "$remote_name" 2>/dev/null)
+    local mirror=""
+    if [[ "$remote_url" == *://* || "$remote_url" == *@*:* ]] && ensure_git_mirror "$remote_url" "$(git rev-parse --show-toplevel)"; then
+        mirror=$(_git_mirror_path "$remote_url")
+    fi
+
+    if [ -n "$mirror" ]; then
+        _borrow_git_objects "$mirror"
+        echo "Fetching latest changes and tags from the shared mirror of $remote_name..."
+        git fetch "$mirror" --prune --tags --force "+refs/heads/*:refs/remotes/$remote_name/*"
+    else
+        echo "Fetching latest changes, tags, and pruning from $remote_name..."
+        git fetch "$remote_name" --prune --tags --force # --force peut aider avec certains refs conflictuels
+    fi
 
     local final_target_ref=""
 
@@ -104,7 +242,11 @@ sync_repo() {
     fi
 
     if [ -z "$final_target_ref" ]; then # Soit non spécifié, soit spécifié mais non trouvé
-        local remote_head_branch_name=$(git remote show "$remote_name" | sed -n '/HEAD branch/s/.*: //p')
+        # Branche par défaut mise en cache (AIKORE_GIT_HEAD_TTL) au lieu d'un `git remote show` à chaque démarrage
+        local remote_head_branch_name=""
+        if [ -n "$remote_url" ]; then
+            remote_head_branch_name=$(_git_default_branch "$remote_url")
+        fi
         if [ -z "$remote_head_branch_name" ]; then
             echo "Warning: Could not automatically determine remote HEAD branch. Attempting common names (main, master)."
             if git show-ref --verify --quiet "refs/remotes/$remote_name/main"; then
@@ -196,6 +338,31 @@ sync_repo() {
     echo "Untracked files (newly added local files) have been preserved."
 }
 
+# Returns 0 when the instance is unchanged since its last successful start, so that a
+# blueprint can skip a setup phase (repository sync, env creation, installs...). AiKore
+# compares a fingerprint of launch.sh, aikore_vars.env, the repository HEADs, the
+# requirements files and the env with the stamp of the last good start, and exports
+# the result as AIKORE_START_STAMP_MATCH.
+# Arg1: Optional name of the skipped phase, for the log
+# Usage: if ! aikore_fast_path "dependency installation"; then ... fi
+aikore_fast_path() {
+    if [ "${AIKORE_START_STAMP_MATCH:-0}" = "1" ]; then
+        echo "--- Fast start: skipping ${1:-setup} (unchanged since the last successful start) ---"
+        return 0
+    fi
+    return 1
+}
+
+# Records that a setup phase failed while the script keeps going, so that AiKore does
+# not stamp this start as successful and the next start runs the full setup again.
+# Arg1: Optional name of the failed phase, for the log
+aikore_setup_failed() {
+    echo "!!! Setup phase failed: ${1:-unknown}. The next start will run the full setup."
+    if [ -n "${INSTANCE_CONF_DIR}" ]; then
+        echo "${1:-unknown}" > "${INSTANCE_CONF_DIR}/.aikore_setup_failed"
+    fi
+}
+
 # L'ancienne fonction check_remote est maintenant remplacée en esprit par sync_repo.
 check_remote() {
     # Le premier argument de check_remote doit être le nom de la variable d'env pour la ref Git
@@ -224,25 +391,250 @@ check_remote() {
 #        fi
 #    done
 #}
+# Prints a requirements file ready to be merged with others: comments and blank lines
+# removed, lines matching the exclude pattern (ERE on the line start) dropped, nested
+# -r files inlined (so the excludes apply to them too), relative paths made absolute,
+# and --index-url turned into --extra-index-url (a single node must not replace the
+# index of the whole install).
+_normalize_requirements() {
+    local file="$1"
+    local exclude_pattern="$2"
+    local depth="${3:-0}"
+    local base_dir=$(cd "$(dirname "$file")" && pwd)
+    sed -e 's/\r$//' -e 's/\(^\|[[:space:]]\)#.*$//' -e 's/^[[:space:]]*//' -e 's/[[:space:]]*$//' "$file" \
+        | grep -v '^$' \
+        | { if [ -n "$exclude_pattern" ]; then grep -v -i -E "^(${exclude_pattern})"; else cat; fi; } \
+        | awk -v base="$base_dir" '
+            match($0, /^(-r|--requirement)[ =]+/) {
+                arg = substr($0, RLENGTH + 1)
+                if (arg !~ /^\//) arg = base "/" arg
+                print "-r " arg; next
+            }
+            match($0, /^(-c|-e|--constraint|--editable)[ =]+/) {
+                opt = substr($0, 1, RLENGTH); arg = substr($0, RLENGTH + 1)
+                if (arg !~ /:\/\// && arg !~ /^\//) arg = base "/" arg
+                print opt arg; next
+            }
+            match($0, /^(-i|--index-url)[ =]+/) { print "--extra-index-url " substr($0, RLENGTH + 1); next }
+            /^\.\.?\// { print base "/" $0; next }
+            { print }' \
+        | while IFS= read -r line; do
+            if [[ "$line" == "-r "* ]] && [ "$depth" -lt 5 ] && [ -f "${line#-r }" ]; then
+                _normalize_requirements "${line#-r }" "$exclude_pattern" $((depth + 1))
+            else
+                printf '%s\n' "$line"
+            fi
+        done
+}
+
+# Installs the requirements of a directory and of its first-level subdirectories
+# (e.g. ComfyUI custom nodes), plus any extra requirement files, in one resolver pass.
+# Args:
+#   $1: Directory to scan
+#   $2: Optional exclude pattern (ERE on the package name, e.g. "torch|xformers")
+#   $@: Optional extra requirement files resolved together with the others
+#
+# The merged inputs are hashed (with the Python, torch and index settings). If the
+# stamp in the active env matches, nothing is installed. Otherwise pip resolves all the
+# files together (--dry-run --report), conflicts between files are reported up front,
+# and the versions pip picked are saved as a lock under /config/cache/requirement-locks/<hash>.txt.
+# The lock is only used as a constraints file (pip install -r <merged> -c <lock>): the
+# merged inputs are always installed in full, so an env sharing the lock still gets every
+# package it lacks, whatever the env that created the lock already contained. On a
+# conflict, the files are installed one by one as before. The stamp is only written when
+# every pip call succeeded.
 install_requirements() {
     local directory="$1"
-    local requirements_file="$directory/requirements.txt"
-
-    if [ -f "$requirements_file" ]; then
-        echo "Installation des dépendances dans $directory ..."
-        pip install -r "$requirements_file"
-        echo "Dépendances installées avec succès dans $directory."
-    fi
-
-    # Parcours des sous-dossiers du premier niveau uniquement
-    for subdir in "$directory"/*; do
-        if [ -d "$subdir" ]; then
-            local subdir_requirements_file="$subdir/requirements.txt"
-            if [ -f "$subdir_requirements_file" ]; then
-                echo "Installation des dépendances dans $subdir ..."
-                pip install -r "$subdir_requirements_file"
-                echo "Dépendances installées avec succès dans $subdir."
+    local exclude_pattern="$2"
+    shift $(( $# < 2 ? $# : 2 ))
+
+    local req_files=()
+    [ -f "${directory}/requirements.txt" ] && req_files+=("${directory}/requirements.txt")
+    local subdir
+    for subdir in "${directory}"/*/; do
+        [ -f "${subdir}requirements.txt" ] && req_files+=("${subdir%/}/requirements.txt")
+    done
+    local extra_file
+    for extra_file in "$@"; do
+        [ -f "$extra_file" ] && req_files+=("$extra_file")
+    done
+    if [ ${#req_files[@]} -eq 0 ]; then
+        echo "No requirements found in ${directory}."
+        return 0
+    fi
+
+    local merged=$(mktemp --suffix=.txt)
+    local req_file
+    for req_file in "${req_files[@]}"; do
+        _normalize_requirements "$req_file" "$exclude_pattern" >> "$merged"
+    done
+    sort -u -o "$merged" "$merged"
+
+    local key=$( { cat "$merged"; python -c 'import sys; print(sys.version)'; \
+        echo "${TORCH_VERSION} ${PYTORCH_INDEX_URL} ${PIP_EXTRA_INDEX_URL}"; } | sha256sum | cut -c1-32)
+    local env_prefix=$(python -c 'import sys; print(sys.prefix)')
+    local stamp="${env_prefix}/.aikore-requirements-$(printf '%s' "$directory" | sha1sum | cut -c1-12)"
+    if [ -f "$stamp" ] && [ "$(cat "$stamp")" = "$key" ]; then
+        echo "Requirements unchanged (${#req_files[@]} files in ${directory}), skipping installation."
+        rm -f "$merged"
+        return 0
+    fi
+
+    local lock_dir="/config/cache/requirement-locks"
+    local lock="${lock_dir}/${key}.txt"
+    mkdir -p "$lock_dir"
+
+    local status=0
+    local lock_created=0
+    if [ ! -f "$lock" ] && pip install --help 2>/dev/null | grep -q -- '--report'; then
+        echo "--- Resolving ${#req_files[@]} requirement files together ---"
+        local report=$(mktemp --suffix=.json)
+        local resolve_log=$(mktemp)
+        if pip install --dry-run --quiet --report "$report" -r "$merged" > "$resolve_log" 2>&1; then
+            # Lock = one pin per resolved index package (direct references stay in the inputs,
+            # constraints files cannot hold them)
+            python - "$report" > "${lock}.tmp.$$" <<'PYEOF' && mv "${lock}.tmp.$$" "$lock" && lock_created=1
+import json, sys
+for item in json.load(open(sys.argv[1]))["install"]:
+    if not item.get("is_direct"):
+        print(f"{item['metadata']['name']}=={item['metadata']['version']}")
+PYEOF
+            rm -f "${lock}.tmp.$$"
+        else
+            echo "!!! The requirement files of ${directory} conflict with each other:"
+            sed -n '/The conflict is caused by:/,/^$/p' "$resolve_log"
+            grep -E '^ERROR' "$resolve_log" || true
+            local requested
+            for requested in $(sed -n 's/^ *The user requested \([A-Za-z0-9_.-]*\).*/\1/p' "$resolve_log" | sort -u); do
+                echo "  '${requested}' is required by:"
+                grep -l -i -E "^[[:space:]]*${requested}([^A-Za-z0-9_.-]|$)" "${req_files[@]}" | sed 's/^/    /' || true
+            done
+            echo "Falling back to installing each requirement file separately."
+        fi
+        rm -f "$report" "$resolve_log"
+    fi
+
+    if [ -f "$lock" ]; then
+        echo "--- Installing resolved requirements ($(grep -c . "$lock") pinned packages) ---"
+        if ! pip install -r "$merged" -c "$lock"; then
+            # A lock made by another env can clash with what this env already contains
+            echo "Installation with the requirement lock failed, retrying without it."
+            rm -f "$lock"
+            pip install -r "$merged" || status=$?
+        fi
+    elif pip install --help 2>/dev/null | grep -q -- '--report'; then
+        # Conflicting inputs: same behavior as the per-file installs of older AiKore versions
+        local single_file=$(mktemp --suffix=.txt)
+        for req_file in "${req_files[@]}"; do
+            _normalize_requirements "$req_file" "$exclude_pattern" > "$single_file"
+            if [ -s "$single_file" ]; then
+                echo "Installing dependencies from ${req_file}"
+                pip install -r "$single_file" || status=$?
             fi
+        done
+        rm -f "$single_file"
+    else
+        # pip without --report (< 22.2): a single pass, without a lock
+        pip install -r "$merged" || status=$?
+    fi
+    rm -f "$merged"
+
+    if [ "$status" -ne 0 ]; then
+        # Never keep a lock or a stamp from a failed installation: the next start retries
+        [ "$lock_created" = "1" ] && rm -f "$lock"
+        rm -f "$stamp"
+        aikore_setup_failed "requirements of ${directory} (pip exit code ${status})"
+        return "$status"
+    fi
+    echo "$key" > "$stamp"
+    echo "Requirements of ${directory} installed."
+}
+
+# Adds the AiKore wheel store (a PEP 503 index served by the backend, URL exported as
+# AIKORE_WHEEL_INDEX_URL) as an extra pip index. Requirements naming a compiled module
+# (flash-attn, xformers, ...) then resolve to the prebuilt wheel instead of a source build.
+use_wheel_index() {
+    if [ -z "${AIKORE_WHEEL_INDEX_URL}" ]; then
+        return 0
+    fi
+    if ! curl -sf -o /dev/null "${AIKORE_WHEEL_INDEX_URL}"; then
+        echo "AiKore wheel index not reachable at ${AIKORE_WHEEL_INDEX_URL}, skipping."
+        return 0
+    fi
+    case " ${PIP_EXTRA_INDEX_URL} " in
+        *" ${AIKORE_WHEEL_INDEX_URL} "*) ;;
+        *) export PIP_EXTRA_INDEX_URL="${PIP_EXTRA_INDEX_URL:+${PIP_EXTRA_INDEX_URL} }${AIKORE_WHEEL_INDEX_URL}" ;;
+    esac
+    echo "Using AiKore wheel index: ${AIKORE_WHEEL_INDEX_URL}"
+}
+
+# --- Environment templates ---
+# AiKore exports AIKORE_ENV_TEMPLATE: the path of a prebuilt base env (python + torch) for
+# the instance's (python, cuda, torch) triple, under /config/cache/env-templates. A new env
+# is a hardlink clone of it (cp -al, near instant, no extra disk space) instead of a fresh
+# `conda create` plus a torch download. The first instance of a triple builds its env the
+# normal way and then saves it as the template (save_env_template).
+# pip and conda replace files rather than writing into them, so the clones never alter the
+# template; files embedding the env path are rewritten, which gives them their own copy.
+
+# Replaces an absolute env prefix in the text files of an env.
+# sed -i writes a new file, so a rewritten file stops sharing its inode with the template.
+_rewrite_env_prefix() {
+    local env_dir="$1"
+    local old_prefix="$2"
+    local new_prefix="$3"
+    local old_escaped=$(printf '%s' "${old_prefix}" | sed 's/[][\.*^$|]/\\&/g')
+    local new_escaped=$(printf '%s' "${new_prefix}" | sed 's/[\&|]/\\&/g')
+    grep -rlIF --null -- "${old_prefix}" "${env_dir}" 2>/dev/null \
+        | xargs -0 -r sed -i "s|${old_escaped}|${new_escaped}|g"
+}
+
+# Creates the env at $1 as a hardlink clone of AIKORE_ENV_TEMPLATE.
+# Returns 1 (and creates nothing) if there is no ready template or the clone fails.
+clone_env_template() {
+    local venv_dir="$1"
+    local template="${AIKORE_ENV_TEMPLATE}"
+    if [ -z "${template}" ] || [ ! -f "${template}/.aikore-template-ready" ] || [ -e "${venv_dir}" ]; then
+        return 1
+    fi
+    echo "--- Cloning environment template $(basename "${template}") ---"
+    if ! ( flock -s 9 && cp -al "${template}" "${venv_dir}" ) 9>"${template}.lock"; then
+        echo "Hardlink clone failed (template on another filesystem?), creating the environment from scratch."
+        rm -rf "${venv_dir}"
+        return 1
+    fi
+    rm -f "${venv_dir}/.aikore-template-ready"
+    _rewrite_env_prefix "${venv_dir}" "${template}" "${venv_dir}"
+    touch "${template}/.aikore-template-ready" # Last use, for cache cleanup
+    echo "Environment cloned from template."
+}
+
+# Saves the env at $1 as the template for AIKORE_ENV_TEMPLATE, unless one exists.
+# Call it on a freshly created env, right after python and torch are installed and
+# before any application requirement.
+save_env_template() {
+    local venv_dir="$1"
+    local template="${AIKORE_ENV_TEMPLATE}"
+    if [ -z "${template}" ] || [ -f "${template}/.aikore-template-ready" ] || [ ! -d "${venv_dir}" ]; then
+        return 0
+    fi
+    mkdir -p "$(dirname "${template}")"
+    (
+        # Another instance is already saving this template: nothing to do
+        flock -n 9 || exit 0
+        [ -f "${template}/.aikore-template-ready" ] && exit 0
+        echo "--- Saving environment template $(basename "${template}") ---"
+        local staging="${template}.tmp-$$"
+        rm -rf "${staging}" "${template}"
+        if ! cp -al "${venv_dir}" "${staging}"; then
+            echo "Could not save the environment template, skipping."
+            rm -rf "${staging}"
+            exit 0
         fi
-    done
-}
\ No newline at end of file
+        _rewrite_env_prefix "${staging}" "${venv_dir}" "${template}"
+        touch "${staging}/.aikore-template-ready"
+        mv "${staging}" "${template}"
+        echo "Environment template saved."
+    ) 9>"${template}.lock"
+    return 0
+}
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+AiKore environment version check, run with the instance interpreter.
+
+Everything is read in this single interpreter pass: package versions come from
+importlib.metadata, the PyTorch CUDA version from torch/version.py (torch is never
+imported), and the dependency check walks the installed metadata in-process, the
+way `pip check` does. Output keeps the historical layout, with the pip check after
+the ---AIKORE-SEPARATOR--- line.
+"""
+import os
+import re
+import sys
+import shutil
+import platform
+import subprocess
+import importlib.util
+import importlib.metadata as md
+
+PYTHON_PACKAGES = [
+    "torch", "torchvision", "torchaudio", "xformers", "flash-attn", "sageattention",
+    "accelerate", "bitsandbytes", "triton", "peft", "nunchaku", "numpy", "Pillow",
+    "opencv-python", "transformers", "diffusers",
+]
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def _installed() -> dict:
+    """{normalized name: Distribution} for every installed distribution (first one on sys.path wins)."""
+    dists = {}
+    for dist in md.distributions():
+        name = dist.metadata["Name"]
+        if name:
+            dists.setdefault(_normalize(name), dist)
+    return dists
+
+
+def _read_first(path: str, pattern: str) -> str | None:
+    try:
+        with open(path) as f:
+            for line in f:
+                m = re.match(pattern, line)
+                if m:
+                    return m.group(1).strip()
+    except OSError:
+        pass
+    return None
+
+
+def print_system_info():
+    print("--- System Information ---")
+    os_name = _read_first("/etc/os-release", r'^PRETTY_NAME="?([^"\n]*)"?')
+    print(f"OS: {os_name or platform.platform()}")
+    cpu_name = _read_first("/proc/cpuinfo", r"^model name\s*:\s*(.*)")
+    print(f"CPU: {cpu_name or 'N/A'}")
+    mem_kb = _read_first("/proc/meminfo", r"^MemTotal:\s*(\d+)")
+    print(f"RAM: {round(int(mem_kb) / 1024 / 1024, 1)}Gi" if mem_kb else "RAM: N/A")
+
+    if shutil.which("nvidia-smi"):
+        print("")
+        print("--- GPU & CUDA ---")
+        try:
+            output = subprocess.run(
+                ["nvidia-smi", "--query-gpu=gpu_name,driver_version,memory.total", "--format=csv,noheader,nounits"],
+                capture_output=True, text=True, timeout=10
+            ).stdout
+            for line in output.strip().splitlines():
+                name, driver, memory = [p.strip() for p in line.split(",")]
+                print(f"GPU: {name}\nDriver Version: {driver}\nGPU Memory: {memory} MiB")
+            header = subprocess.run(["nvidia-smi"], capture_output=True, text=True, timeout=10).stdout
+            m = re.search(r"CUDA Version:\s*([\d.]+)", header)
+            print(f"CUDA Version (from nvidia-smi): {m.group(1) if m else 'N/A'}")
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            print("NVIDIA GPU query failed.")
+    else:
+        print("NVIDIA GPU not found or nvidia-smi is not installed.")
+
+
+def print_python_info(dists: dict):
+    print("")
+    print("--- Python & Libraries ---")
+    if os.environ.get("CONDA_PREFIX"):
+        print(f"Active Conda Environment: {os.environ['CONDA_PREFIX']}")
+    else:
+        print("No active Conda environment found. Using system python.")
+    print(f"Python: Python {platform.python_version()}")
+
+    print("Python Libraries:")
+    for package in PYTHON_PACKAGES:
+        dist = dists.get(_normalize(package))
+        print(f"  {package:<17}: {dist.version if dist else 'Not Installed'}")
+
+    spec = importlib.util.find_spec("torch")
+    if spec is not None and spec.origin:
+        cuda = _read_first(os.path.join(os.path.dirname(spec.origin), "version.py"), r"^cuda\b[^=\n]*=\s*['\"]([^'\"]+)['\"]")
+        print(f"CUDA Version (from PyTorch): {cuda or 'N/A'}")
+
+
+def _pip_check_in_process() -> list | None:
+    """Runs pip's own checker on the installed set. Returns the report lines, or None if pip is unavailable."""
+    try:
+        from pip._internal.operations.check import check_package_set, create_package_set_from_installed
+    except Exception:
+        return None
+    package_set, parsing_probs = create_package_set_from_installed()
+    missing, conflicting = check_package_set(package_set)
+    lines = []
+    for project_name in sorted(missing):
+        version = package_set[project_name][0]
+        for dependency in missing[project_name]:
+            lines.append(f"{project_name} {version} requires {dependency[0]}, which is not installed.")
+    for project_name in sorted(conflicting):
+        version = package_set[project_name][0]
+        for dep_name, dep_version, req in conflicting[project_name]:
+            lines.append(f"{project_name} {version} has requirement {req}, but you have {dep_name} {dep_version}.")
+    return lines
+
+
+def print_dependency_check():
+    print("")
+    print("--- Dependency Check (pip check) ---")
+    lines = _pip_check_in_process()
+    if lines is None:
+        # Very old or vendored-out pip: fall back to the CLI
+        result = subprocess.run([sys.executable, "-m", "pip", "check"], capture_output=True, text=True)
+        print((result.stdout + result.stderr).strip())
+    elif lines:
+        print("\n".join(lines))
+    else:
+        print("No broken requirements found.")
+
+
+if __name__ == "__main__":
+    dists = _installed()
+    print_system_info()
+    print_python_info(dists)
+    print("---AIKORE-SEPARATOR---")
+    print_dependency_check()
@@ -0,0 +1,75 @@
+"""Start path of process_manager.start_instance_process with the disk quota states."""
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from aikore.core import disk_usage, process_manager
+
+
+class FakeDB:
+    def commit(self):
+        pass
+
+
+class FakeProcess:
+    pid = 4242
+
+
+@pytest.fixture
+def start_env(tmp_path, monkeypatch):
+    """Points every path of the start path at tmp_path and records the spawned processes."""
+    spawned = []
+    monkeypatch.setattr(process_manager, "INSTANCES_DIR", str(tmp_path / "instances"))
+    monkeypatch.setattr(process_manager, "OUTPUTS_DIR", str(tmp_path / "outputs"))
+    monkeypatch.setattr(process_manager, "TMP_DIR", str(tmp_path / "tmp"))
+    monkeypatch.setattr(process_manager, "ENV_TEMPLATES_DIR", str(tmp_path / "env-templates"))
+    monkeypatch.setattr(process_manager, "NGINX_SITES_AVAILABLE", str(tmp_path / "nginx"))
+    monkeypatch.setattr(process_manager, "_reload_nginx", lambda: None)
+    monkeypatch.setattr(process_manager.wheel_compat, "get_gpu_archs", lambda gpu_ids: [])
+    monkeypatch.setattr(process_manager, "monitor_instance_thread", lambda *args, **kwargs: None)
+    monkeypatch.setattr(process_manager, "prewarm_manager", SimpleNamespace(start=lambda *args: None))
+    monkeypatch.setattr(process_manager.subprocess, "Popen", lambda *args, **kwargs: spawned.append(args) or FakeProcess())
+
+    instance = SimpleNamespace(
+        id=1, name="quota-test", port=19001, persistent_mode=False, persistent_port=None,
+        persistent_display=None, parent_instance_id=None, output_path=None, base_blueprint="ComfyUI.sh",
+        python_version=None, cuda_version=None, torch_version=None, gpu_ids="", status="stopped", pid=None,
+    )
+    conf_dir = tmp_path / "instances" / instance.name
+    conf_dir.mkdir(parents=True)
+    (conf_dir / "launch.sh").write_text("#!/bin/bash\n")
+
+    def set_quota_state(state):
+        usage = {"total": 3 * 1024 ** 3, "outputs": 0, "quota": {"soft_gb": 1.0, "hard_gb": 2.0, "state": state}}
+        monkeypatch.setattr(process_manager, "get_instance_disk_usage", lambda db, inst: usage)
+
+    yield instance, conf_dir, spawned, set_quota_state
+    process_manager.running_instances.pop(instance.id, None)
+
+
+def test_start_within_quota(start_env):
+    instance, conf_dir, spawned, set_quota_state = start_env
+    set_quota_state("ok")
+    process_manager.start_instance_process(FakeDB(), instance)
+    assert len(spawned) == 1
+    assert instance.status == "starting"
+    assert "WARNING" not in (conf_dir / "output.log").read_text()
+
+
+def test_soft_quota_writes_warning(start_env):
+    instance, conf_dir, spawned, set_quota_state = start_env
+    set_quota_state("soft")
+    process_manager.start_instance_process(FakeDB(), instance)
+    assert len(spawned) == 1
+    assert "exceeds the soft quota of 1.0 GB" in (conf_dir / "output.log").read_text()
+
+
+def test_hard_quota_blocks_start(start_env):
+    instance, conf_dir, spawned, set_quota_state = start_env
+    set_quota_state("hard")
+    with pytest.raises(disk_usage.DiskQuotaExceeded):
+        process_manager.start_instance_process(FakeDB(), instance)
+    assert spawned == []
+    assert not os.path.exists(conf_dir / "output.log")
+    assert instance.id not in process_manager.running_instances